@@ -0,0 +1,235 @@
+"""Per-user, per-(app, permission) log totals behind the student wellbeing and
+permission-audit pages.
+
+Ingest adds each log to its row with `record_user_logs` in the same
+transaction, so the pages read a few rows per user instead of grouping the
+user's whole history. Writes that bypass ingest (seeding, manual SQL) leave
+the table stale until it is rebuilt:
+
+    python -m app.aggregates check              # exit 1 if any user's totals drifted
+    python -m app.aggregates rebuild            # recompute every user
+    python -m app.aggregates rebuild --user ID  # recompute one user
+
+Both recompute from the hourly summaries plus the raw logs they do not cover
+yet, since raw logs past the retention window are gone (see app/retention.py).
+"""
+import argparse
+import asyncio
+import logging
+import random
+import sys
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import DateTime, case, delete, func, literal, select, union_all
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database import async_session, create_tables, engine
+from app.models import BehaviorLog, BehaviorLogHourly, User, UserLogAggregate
+from app.rollups import next_hour
+
+logger = logging.getLogger(__name__)
+
+TOTAL_FIELDS = ("log_count", "anomaly_count", "network_sum")
+KEY_FIELDS = ("user_id", "app_name", "permission_requested")
+REBUILD_CHUNK = 500  # users recomputed per transaction
+REBUILD_ATTEMPTS = 5  # per chunk on Postgres, when concurrent ingest forces a retry; then the chunk is halved
+RETRYABLE_SQLSTATES = {"40001", "40P01"}  # serialization failure, deadlock
+NETWORK_TOLERANCE = 1e-3  # float sums differ slightly with summation order
+
+
+def _insert(dialect_name: str):
+    return (postgresql if dialect_name == "postgresql" else sqlite).insert(UserLogAggregate)
+
+
+def _add_on_conflict(stmt):
+    set_ = {name: getattr(UserLogAggregate, name) + getattr(stmt.excluded, name) for name in TOTAL_FIELDS}
+    return stmt.on_conflict_do_update(index_elements=list(KEY_FIELDS), set_=set_)
+
+
+async def record_user_logs(db: AsyncSession, logs: Iterable[dict]):
+    """Add new behavior logs (dicts with the BehaviorLog column names) to their users' totals, in the caller's transaction."""
+    merged: Dict[tuple, dict] = {}
+    for log in logs:
+        key = (log["user_id"], log.get("app_name") or "", log.get("permission_requested") or "")
+        row = merged.setdefault(key, {**dict(zip(KEY_FIELDS, key)), "log_count": 0, "anomaly_count": 0, "network_sum": 0.0})
+        row["log_count"] += 1
+        row["anomaly_count"] += int(bool(log.get("anomaly_flag")))
+        row["network_sum"] += log.get("network_activity_level") or 0.0
+    if not merged:
+        return
+    # Sorted so concurrent batches touching the same users lock rows in the same order
+    rows = [merged[key] for key in sorted(merged)]
+    await db.execute(_add_on_conflict(_insert(db.bind.dialect.name)), rows)
+
+
+async def user_log_totals(db: AsyncSession, user_id: str) -> Dict[Tuple[str, str], Dict[str, float]]:
+    """A user's all-time log totals per (app, permission)."""
+    A = UserLogAggregate
+    result = await db.execute(
+        select(A.app_name, A.permission_requested, A.log_count, A.anomaly_count, A.network_sum).where(A.user_id == user_id)
+    )
+    return {
+        (app, permission): {"log_count": logs, "anomaly_count": anomalies, "network_sum": network}
+        for app, permission, logs, anomalies, network in result.all()
+    }
+
+
+def recomputed_totals(dialect_name: str, user_ids: Optional[List[str]] = None):
+    """Totals recomputed from hourly summaries plus the unsummarized raw tail, as one statement.
+
+    Reading both sides in one statement gives them one snapshot, so a
+    summarization run moving the watermark cannot count an hour twice or not at all.
+    """
+    H = BehaviorLogHourly
+    summaries = select(H.user_id, H.app_name, H.permission_requested, H.log_count, H.anomaly_count, H.network_sum)
+    last_hour = select(func.max(H.hour)).scalar_subquery()
+    tail = (
+        select(
+            BehaviorLog.user_id,
+            func.coalesce(BehaviorLog.app_name, "").label("app_name"),
+            func.coalesce(BehaviorLog.permission_requested, "").label("permission_requested"),
+            literal(1).label("log_count"),
+            case((BehaviorLog.anomaly_flag == True, 1), else_=0).label("anomaly_count"),
+            func.coalesce(BehaviorLog.network_activity_level, 0.0).label("network_sum"),
+        )
+        # Bare column against the watermark (no OR), so Postgres prunes summarized months' partitions
+        .where(BehaviorLog.timestamp >= func.coalesce(next_hour(last_hour, dialect_name), literal(datetime.min, DateTime)))
+    )
+    if user_ids is not None:
+        summaries = summaries.where(H.user_id.in_(user_ids))
+        tail = tail.where(BehaviorLog.user_id.in_(user_ids))
+    sources = union_all(summaries, tail).subquery()
+    keys = [sources.c.user_id, sources.c.app_name, sources.c.permission_requested]
+    return select(
+        *keys,
+        func.sum(sources.c.log_count).label("log_count"),
+        func.sum(sources.c.anomaly_count).label("anomaly_count"),
+        func.sum(sources.c.network_sum).label("network_sum"),
+    ).group_by(*keys)
+
+
+async def _user_chunks(user_ids: Optional[List[str]]):
+    if user_ids is not None:
+        yield user_ids
+        return
+    async with async_session() as db:
+        ids = list((await db.execute(select(User.id).order_by(User.id))).scalars())
+    for start in range(0, len(ids), REBUILD_CHUNK):
+        yield ids[start:start + REBUILD_CHUNK]
+
+
+async def _rebuild_chunk(user_ids: List[str]) -> int:
+    async with async_session() as db:
+        dialect_name = db.bind.dialect.name
+        A = UserLogAggregate
+        query = recomputed_totals(dialect_name, user_ids)
+        if dialect_name == "postgresql":
+            await db.connection(execution_options={"isolation_level": "REPEATABLE READ"})
+            # Lock and insert in record_user_logs' (code point) key order, which "C" collation matches
+            await db.execute(
+                select(A.user_id).where(A.user_id.in_(user_ids))
+                .order_by(*(getattr(A, name).collate("C") for name in KEY_FIELDS))
+                .with_for_update()
+            )
+            query = query.order_by(*(query.selected_columns[name].collate("C") for name in KEY_FIELDS))
+        await db.execute(delete(A).where(A.user_id.in_(user_ids)))
+        stmt = _insert(dialect_name).from_select(list(KEY_FIELDS + TOTAL_FIELDS), query)
+        result = await db.execute(_add_on_conflict(stmt))
+        await db.commit()
+    return max(result.rowcount, 0)
+
+
+async def rebuild(user_ids: Optional[List[str]] = None) -> int:
+    """Recompute totals for `user_ids` (default: every user), a chunk of users per transaction.
+
+    Concurrent ingest is safe: a log committed before the recompute's snapshot
+    is in the recomputed totals, and one committed after it adds itself on top
+    (hence the recomputed rows are added to, not inserted over, any row such
+    a log created in the meantime). On Postgres each chunk reads one snapshot
+    (REPEATABLE READ) from its first statement on, so an ingest committing
+    between the delete and the recompute cannot be counted twice; the chunk
+    fails with a serialization error instead, and is retried (after a few
+    attempts, as two smaller chunks).
+    """
+    rows = 0
+    async for chunk in _user_chunks(user_ids):
+        pending = [chunk]
+        while pending:
+            ids = pending.pop()
+            for attempt in range(REBUILD_ATTEMPTS):
+                try:
+                    rows += await _rebuild_chunk(ids)
+                    break
+                except DBAPIError as e:
+                    if getattr(e.orig, "sqlstate", None) not in RETRYABLE_SQLSTATES:
+                        raise
+                    if attempt == REBUILD_ATTEMPTS - 1:
+                        if len(ids) == 1:
+                            raise
+                        # Busy users keep invalidating the snapshot: fewer users per transaction
+                        logger.info(f"Aggregate rebuild of {len(ids)} users kept racing with ingest, splitting it")
+                        half = len(ids) // 2
+                        pending += [ids[:half], ids[half:]]
+                        break
+                    await asyncio.sleep(random.uniform(0, 0.05 * 2 ** attempt))
+    return rows
+
+
+async def check(user_ids: Optional[List[str]] = None) -> List[dict]:
+    """Rows whose stored totals differ from the recomputed ones, with stored minus recomputed per field."""
+    mismatches = []
+    async for chunk in _user_chunks(user_ids):
+        async with async_session() as db:
+            A = UserLogAggregate
+            stored = select(A.user_id, A.app_name, A.permission_requested, A.log_count, A.anomaly_count, A.network_sum)
+            stored = stored.where(A.user_id.in_(chunk))
+            source = recomputed_totals(db.bind.dialect.name, chunk).subquery()
+            recomputed = select(
+                source.c.user_id, source.c.app_name, source.c.permission_requested,
+                -source.c.log_count, -source.c.anomaly_count, -source.c.network_sum,
+            )
+            # Stored rows minus recomputed rows in one statement, so both sides see the same snapshot
+            both = union_all(stored, recomputed).subquery()
+            keys = [both.c.user_id, both.c.app_name, both.c.permission_requested]
+            logs, anomalies, network = func.sum(both.c.log_count), func.sum(both.c.anomaly_count), func.sum(both.c.network_sum)
+            result = await db.execute(
+                select(*keys, logs, anomalies, network)
+                .group_by(*keys)
+                .having((logs != 0) | (anomalies != 0) | (func.abs(network) > NETWORK_TOLERANCE))
+            )
+            # Postgres sums integers to numeric, hence the casts
+            mismatches.extend(
+                {"user_id": user_id, "app_name": app, "permission_requested": permission,
+                 "log_count": int(logs), "anomaly_count": int(anomalies), "network_sum": float(network)}
+                for user_id, app, permission, logs, anomalies, network in result.all()
+            )
+    return mismatches
+
+
+async def main(args) -> int:
+    await create_tables()
+    user_ids = [args.user] if args.user else None
+    if args.command == "rebuild":
+        rows = await rebuild(user_ids)
+        print(f"Rebuilt {rows} aggregate rows")
+        status = 0
+    else:
+        mismatches = await check(user_ids)
+        for row in mismatches[:20]:
+            print(
+                f"{row['user_id']}  {row['app_name'] or '-'} / {row['permission_requested'] or '-'}: "
+                f"logs {row['log_count']:+d}, anomalies {row['anomaly_count']:+d}, network {row['network_sum']:+.1f}"
+            )
+        users = len({row["user_id"] for row in mismatches})
+        print(f"{len(mismatches)} mismatched rows across {users} users" + (" (run rebuild)" if mismatches else ""))
+        status = 1 if mismatches else 0
+    await engine.dispose()
+    return status
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check or rebuild the per-user log aggregates")
+    parser.add_argument("command", choices=["check", "rebuild"])
+    parser.add_argument("--user", help="only this user id")
+    sys.exit(asyncio.run(main(parser.parse_args())))
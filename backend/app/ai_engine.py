@@ -1,5 +1,6 @@
 import logging
-from typing import Optional, Dict, Any, List
+from collections import deque
+from typing import Optional, Dict, List, Union
 
 logger = logging.getLogger(__name__)
 
@@ -17,8 +18,74 @@ except ImportError:
     HAS_SKLEARN = False
     logger.info("scikit-learn not available, using rule-based scoring only")
 
-_model = None
-_is_fitted = False
+class LogAggregate:
+    """Running totals over a window of behavior logs.
+
+    `add`/`remove` are O(1), so a sliding window can keep its aggregate current
+    as events enter and leave instead of rescanning the list. `remove` drops the
+    oldest log, as a sliding window does. The network levels are kept in window
+    order and summed on read, so the average matches a rescan of the logs bit
+    for bit instead of drifting with repeated add/remove.
+    """
+
+    __slots__ = ("n", "perm_count", "nets", "bg_count", "anomaly_count")
+
+    def __init__(self):
+        self.n = 0
+        self.perm_count = 0
+        self.nets: deque = deque()
+        self.bg_count = 0
+        self.anomaly_count = 0
+
+    @classmethod
+    def from_logs(cls, logs: list[dict]) -> "LogAggregate":
+        agg = cls()
+        for log in logs:
+            agg.add(log)
+        return agg
+
+    def _apply(self, log: dict, sign: int):
+        self.n += sign
+        if log.get("permission_requested", "none") != "none":
+            self.perm_count += sign
+        if sign > 0:
+            self.nets.append(float(log.get("network_activity_level", 0.0)))
+        else:
+            self.nets.popleft()
+        if log.get("background_process_flag", False):
+            self.bg_count += sign
+        if log.get("anomaly_flag", False):
+            self.anomaly_count += sign
+
+    def add(self, log: dict):
+        self._apply(log, 1)
+
+    def remove(self, log: dict):
+        self._apply(log, -1)
+
+    def copy(self) -> "LogAggregate":
+        agg = LogAggregate()
+        agg.n = self.n
+        agg.perm_count = self.perm_count
+        agg.nets = self.nets.copy()
+        agg.bg_count = self.bg_count
+        agg.anomaly_count = self.anomaly_count
+        return agg
+
+    @property
+    def net_sum(self) -> float:
+        return sum(self.nets)
+
+    @property
+    def net_avg(self) -> float:
+        return self.net_sum / self.n if self.n else 0.0
+
+
+LogsOrAggregate = Union[list[dict], LogAggregate]
+
+
+def _as_aggregate(logs: LogsOrAggregate) -> LogAggregate:
+    return logs if isinstance(logs, LogAggregate) else LogAggregate.from_logs(logs)
 
 
 def extract_features(logs: list[dict]) -> list[list[float]]:
@@ -51,76 +118,57 @@ def compute_baseline(logs: list[dict]) -> Dict[str, float]:
     }
 
 
-def calculate_risk_score_ml(logs: list[dict], baseline: Optional[Dict[str, float]] = None) -> float:
-    """Use Isolation Forest if available, adjusting via baseline deviation. Returns 0-100."""
-    global _model, _is_fitted
+def baseline_deviation_penalty(agg: LogAggregate, baseline: Dict[str, float], net_divisor: float) -> float:
+    """Extra risk points for permission/network usage above the user's baseline."""
+    recent_perm = agg.perm_count / max(agg.n, 1)
+    perm_diff = max(0, recent_perm - baseline.get("avg_permission_usage", 0.0))
+    net_diff = max(0, agg.net_avg - baseline.get("avg_network_activity", 0.0))
+    return (perm_diff * 10) + (net_diff / net_divisor)
 
-    if not HAS_SKLEARN or not HAS_NUMPY or len(logs) < 5:
-        return calculate_risk_score_rules(logs, baseline)
 
-    import numpy as np
-    features = np.array(extract_features(logs))
-    if features.shape[0] == 0:
-        return 0.0
+def fit_isolation_forest(features) -> "IsolationForest":
+    """Fit a cohort model. Scoring with it stays single-threaded (n_jobs=1) on the request path."""
+    model = IsolationForest(
+        n_estimators=100, contamination=0.15, random_state=42, n_jobs=1
+    )
+    model.fit(features)
+    return model
 
-    try:
-        if _model is None:
-            _model = IsolationForest(
-                n_estimators=100, contamination=0.15, random_state=42, n_jobs=-1
-            )
 
-        if not _is_fitted:
-            _model.fit(features)
-            _is_fitted = True
+def calculate_risk_score_ml(
+    logs: list[dict],
+    baseline: Optional[Dict[str, float]] = None,
+    aggregate: Optional[LogAggregate] = None,
+    model=None,
+) -> float:
+    """Score with an already fitted Isolation Forest, adjusting via baseline deviation. Returns 0-100.
 
-        scores = _model.score_samples(features)
-        avg_score = float(np.mean(scores))
-        
-        # Base risk from Isolation Forest
-        risk = max(0, min(100, (0.5 - avg_score) * 100))
-        
-        # Adjust based on baseline deviation if available
-        if baseline:
-            # Simple Z-score like heuristic for demo purposes
-            recent_perm = sum(1 for l in logs if l.get("permission_requested", "none") != "none") / len(logs)
-            recent_net = sum(float(l.get("network_activity_level", 0.0)) for l in logs) / len(logs)
-            
-            perm_diff = max(0, recent_perm - baseline.get("avg_permission_usage", 0.0))
-            net_diff = max(0, recent_net - baseline.get("avg_network_activity", 0.0))
-            
-            # Add up to 20 points for deviation
-            deviation_penalty = (perm_diff * 10) + (net_diff / 10)
-            risk = min(100, risk + deviation_penalty)
-            
-        return round(risk, 1)
-    except Exception as e:
-        logger.warning(f"ML scoring failed, falling back to rules: {e}")
-        return calculate_risk_score_rules(logs, baseline)
-
-
-def calculate_risk_score_rules(logs: list[dict], baseline: Optional[Dict[str, float]] = None) -> float:
+    Falls back to the rules when no fitted model is available for the user's cohort.
+    """
+    agg = aggregate if aggregate is not None else LogAggregate.from_logs(logs)
+    [risk] = _ml_risks([logs], [agg], [baseline], [model])
+    return risk if risk is not None else calculate_risk_score_rules(agg, baseline)
+
+
+def calculate_risk_score_rules(logs: LogsOrAggregate, baseline: Optional[Dict[str, float]] = None) -> float:
     """Rule-based risk scoring with optional baseline deviation penalty. Returns 0-100."""
-    if not logs:
+    agg = _as_aggregate(logs)
+    if not agg.n:
         return 0.0
 
-    n = len(logs)
+    n = agg.n
 
     # Permission anomaly
-    perm_count = sum(1 for l in logs if l.get("permission_requested", "none") != "none")
-    perm_score = min(100, (perm_count / max(n, 1)) * 100)
+    perm_score = min(100, (agg.perm_count / max(n, 1)) * 100)
 
     # Network anomaly
-    net_levels = [float(l.get("network_activity_level", 0.0)) for l in logs]
-    net_avg = sum(net_levels) / len(net_levels) if net_levels else 0.0
-    net_score = min(100, net_avg)
+    net_score = min(100, agg.net_avg)
 
     # Background process anomaly
-    bg_count = sum(1 for l in logs if l.get("background_process_flag", False))
-    bg_score = min(100, (bg_count / max(n, 1)) * 100)
+    bg_score = min(100, (agg.bg_count / max(n, 1)) * 100)
 
     # Suspicious domain / anomaly flag
-    anomaly_count = sum(1 for l in logs if l.get("anomaly_flag", False))
-    domain_score = min(100, (anomaly_count / max(n, 1)) * 100)
+    domain_score = min(100, (agg.anomaly_count / max(n, 1)) * 100)
 
     # Weighted formula
     risk = (
@@ -132,12 +180,7 @@ def calculate_risk_score_rules(logs: list[dict], baseline: Optional[Dict[str, fl
     
     # Apply baseline penalty
     if baseline:
-        recent_perm = perm_count / max(n, 1)
-        recent_net = net_avg
-        perm_diff = max(0, recent_perm - baseline.get("avg_permission_usage", 0.0))
-        net_diff = max(0, recent_net - baseline.get("avg_network_activity", 0.0))
-        deviation_penalty = (perm_diff * 10) + (net_diff / 5)
-        risk = min(100, risk + deviation_penalty)
+        risk = min(100, risk + baseline_deviation_penalty(agg, baseline, net_divisor=5))
 
     return round(max(0, min(100, risk)), 1)
 
@@ -151,29 +194,48 @@ def get_risk_level(score: float) -> str:
         return "high"
 
 
-def generate_explanation(logs: list[dict], risk_score: float) -> str:
+def generate_explanation(logs: LogsOrAggregate, risk_score: float) -> str:
     """Generate a natural language explanation for why the risk score is high."""
-    if not logs:
+    agg = _as_aggregate(logs)
+    if not agg.n:
         return "No recent activity logs available to explain."
-        
-    explanations = []
-    
-    n = len(logs)
-    perm_count = sum(1 for l in logs if l.get("permission_requested", "none") != "none")
-    net_avg = sum(float(l.get("network_activity_level", 0.0)) for l in logs) / n
-    bg_count = sum(1 for l in logs if l.get("background_process_flag", False))
-    anomaly_count = sum(1 for l in logs if l.get("anomaly_flag", False))
+
+    n = agg.n
+    perm_count = agg.perm_count
+    net_avg = agg.net_avg
+    bg_count = agg.bg_count
+    anomaly_count = agg.anomaly_count
     
+    return _compose_explanation(
+        anomaly_count,
+        net_avg,
+        many_permissions=perm_count > (n * 0.5),
+        heavy_network=net_avg > 60,
+        many_background=bg_count > (n * 0.4),
+        risk_score=risk_score,
+    )
+
+
+def _compose_explanation(
+    anomaly_count: int,
+    net_avg: float,
+    many_permissions: bool,
+    heavy_network: bool,
+    many_background: bool,
+    risk_score: float,
+) -> str:
+    explanations = []
+
     if anomaly_count > 0:
         explanations.append(f"Detected {anomaly_count} known suspicious activities or domains.")
     
-    if perm_count > (n * 0.5):
+    if many_permissions:
         explanations.append("Unusually high rate of sensitive permission requests.")
         
-    if net_avg > 60:
+    if heavy_network:
         explanations.append(f"Heavy network utilization detected (avg {net_avg:.1f}%).")
         
-    if bg_count > (n * 0.4):
+    if many_background:
         explanations.append("Excessive background processes running stealthily.")
         
     if not explanations:
@@ -193,17 +255,23 @@ def generate_recommendation(severity: str) -> str:
         return "Monitor the app's activity. Ensure it only has access to necessary permissions."
 
 
-def calculate_risk(logs: list[dict], baseline: Optional[Dict[str, float]] = None) -> dict:
-    """Main entry point: calculate risk score, level, explanation, and recommendation."""
-    try:
-        score = calculate_risk_score_ml(logs, baseline)
-    except Exception:
-        score = calculate_risk_score_rules(logs, baseline)
+def calculate_risk(
+    logs: list[dict],
+    baseline: Optional[Dict[str, float]] = None,
+    aggregate: Optional[LogAggregate] = None,
+    model=None,
+) -> dict:
+    """Main entry point: calculate risk score, level, explanation, and recommendation.
+
+    Pass the window's running `aggregate` when one is maintained to skip rescanning `logs`,
+    and the cohort's fitted `model` (see model_registry) to enable the ML layer.
+    """
+    return calculate_risk_batch([logs], [baseline], [aggregate], [model])[0]
 
+
+def _risk_result(score: float, explanation: str) -> dict:
     level = get_risk_level(score)
     severity = "critical" if score >= 85 else "high" if score > 70 else level
-    
-    explanation = generate_explanation(logs, score)
     recommendation = generate_recommendation(severity)
     
     return {
@@ -213,3 +281,100 @@ def calculate_risk(logs: list[dict], baseline: Optional[Dict[str, float]] = None
         "recommendation": recommendation,
         "severity": severity
     }
+
+
+# ──── Batch scoring ────
+# Row tuples from database queries (model training), in extract_features column order.
+FEATURE_FIELDS = ("permission_requested", "network_activity_level", "background_process_flag", "anomaly_flag")
+
+
+def features_from_rows(rows: list[tuple], dtype=None) -> "np.ndarray":
+    """Build an (n, 4) feature matrix straight from row tuples ordered as FEATURE_FIELDS."""
+    dtype = dtype or np.float32
+    n = len(rows)
+    features = np.zeros((n, 4), dtype=dtype)
+    if not n:
+        return features
+    perms, nets, bgs, anomalies = zip(*rows)
+    features[:, 0] = np.fromiter((p != "none" for p in perms), dtype=bool, count=n)
+    features[:, 1] = np.fromiter(nets, dtype=np.float64, count=n)
+    features[:, 2] = np.fromiter((bool(b) for b in bgs), dtype=bool, count=n)
+    features[:, 3] = np.fromiter((bool(a) for a in anomalies), dtype=bool, count=n)
+    return features
+
+
+def features_from_logs(logs: list[dict], dtype=None) -> "np.ndarray":
+    """The extract_features matrix, filled column by column straight from the log dicts."""
+    dtype = dtype or np.float32
+    n = len(logs)
+    features = np.empty((n, 4), dtype=dtype)
+    features[:, 0] = np.fromiter((l.get("permission_requested", "none") != "none" for l in logs), dtype=bool, count=n)
+    features[:, 1] = np.fromiter((float(l.get("network_activity_level", 0.0)) for l in logs), dtype=np.float64, count=n)
+    features[:, 2] = np.fromiter((bool(l.get("background_process_flag", False)) for l in logs), dtype=bool, count=n)
+    features[:, 3] = np.fromiter((bool(l.get("anomaly_flag", False)) for l in logs), dtype=bool, count=n)
+    return features
+
+
+def _ml_risks(
+    logs_batch: list[list[dict]],
+    aggregates: list[LogAggregate],
+    baselines: list[Optional[Dict[str, float]]],
+    models: list,
+) -> list[Optional[float]]:
+    """Isolation Forest risk per window, None where the rules apply.
+
+    Windows sharing a model are scored with a single score_samples call;
+    each window's mean is then taken over its own slice, so the result does
+    not depend on what else is in the batch.
+    """
+    risks: list[Optional[float]] = [None] * len(logs_batch)
+    if not HAS_SKLEARN or not HAS_NUMPY:
+        return risks
+    by_model: Dict[int, List[int]] = {}
+    for i, (logs, model) in enumerate(zip(logs_batch, models)):
+        if model is not None and len(logs) >= 5:
+            by_model.setdefault(id(model), []).append(i)
+
+    for indices in by_model.values():
+        try:
+            matrices = [features_from_logs(logs_batch[i]) for i in indices]
+            scores = models[indices[0]].score_samples(np.concatenate(matrices))
+        except Exception as e:
+            logger.warning(f"ML scoring failed, falling back to rules: {e}")
+            continue
+        start = 0
+        for i, matrix in zip(indices, matrices):
+            avg_score = float(np.mean(scores[start:start + len(matrix)]))
+            start += len(matrix)
+            # Base risk from Isolation Forest
+            risk = max(0, min(100, (0.5 - avg_score) * 100))
+            # Adjust based on baseline deviation if available
+            if baselines[i]:
+                risk = min(100, risk + baseline_deviation_penalty(aggregates[i], baselines[i], net_divisor=10))
+            risks[i] = round(risk, 1)
+    return risks
+
+
+def calculate_risk_batch(
+    logs_batch: list[list[dict]],
+    baselines: list[Optional[Dict[str, float]]],
+    aggregates: Optional[list[Optional[LogAggregate]]] = None,
+    models: Optional[list] = None,
+) -> list[dict]:
+    """Score many windows at once; `calculate_risk` is this with a batch of one.
+
+    Rule scores and explanations come from each window's running aggregate
+    (built from the logs when None), so they cost O(1) per window. The ML
+    layer scores every window that shares a cohort model in one call. A
+    window gets the same result whatever batch it is scored in.
+    """
+    aggregates = aggregates if aggregates is not None else [None] * len(logs_batch)
+    models = models if models is not None else [None] * len(logs_batch)
+    aggs = [agg if agg is not None else LogAggregate.from_logs(logs) for logs, agg in zip(logs_batch, aggregates)]
+    ml = _ml_risks(logs_batch, aggs, baselines, models)
+
+    results = []
+    for agg, baseline, risk in zip(aggs, baselines, ml):
+        score = risk if risk is not None else calculate_risk_score_rules(agg, baseline)
+        results.append(_risk_result(score, generate_explanation(agg, score)))
+    return results
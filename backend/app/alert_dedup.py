@@ -0,0 +1,230 @@
+"""Alert deduplication and coalescing.
+
+A compromised device keeps scoring above the alert threshold, and used to
+produce one alert row and one WebSocket push per event. Alerts are now keyed
+by (user, device, app, alert_type): while an unresolved alert for the key is
+younger than ALERT_SUPPRESSION_SECONDS, a repeat bumps its `occurrences` and
+`last_seen_at` instead of inserting a row. The window is anchored at the
+alert's creation, so a burst that keeps going opens a fresh alert once per
+window.
+
+Clients get the new alert straight away as before. Repeats are not pushed one
+by one: once the alert's window closes, this worker sends one `alert_update`
+with the final count. Two workers may each open an alert for the same key
+when their first repeats race; later repeats fold into one of them.
+"""
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, List, NamedTuple, Optional, Tuple
+from sqlalchemy import Select, bindparam, event, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from app.config import get_settings
+from app.database import async_session
+from app.models import Alert
+from app.websocket_manager import manager
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+_PENDING_KEY = "alert_dedup_pending"
+FLUSH_INTERVAL_SECONDS = 5
+
+
+class AlertCandidate(NamedTuple):
+    user_id: str
+    device_id: Optional[str]
+    app_name: Optional[str]
+    alert_type: str
+    severity: str
+    message: str
+    explanation_text: Optional[str]
+    recommendation: Optional[str]
+    confidence_score: float
+    risk_score: float
+
+    @property
+    def key(self) -> tuple:
+        return self.user_id, self.alert_type, self.app_name, self.device_id
+
+
+class RaisedAlert(NamedTuple):
+    id: int
+    new: bool  # False: folded into an open alert
+    candidate: AlertCandidate
+
+
+def alert_message(alert_id: int, candidate: AlertCandidate, timestamp: datetime) -> dict:
+    """WebSocket payload announcing a new alert."""
+    return {
+        "type": "alert",
+        "alert_id": alert_id,
+        "alert_type": candidate.alert_type,
+        "severity": candidate.severity,
+        "message": candidate.message,
+        "recommendation": candidate.recommendation,
+        "timestamp": timestamp.isoformat(),
+        "risk_score": candidate.risk_score,
+    }
+
+
+def open_alerts_query(user_ids, alert_types, since: datetime) -> Select:
+    """Unresolved alerts of these users and types raised since `since`, oldest first."""
+    return (
+        select(Alert.id, Alert.user_id, Alert.alert_type, Alert.app_name, Alert.device_id, Alert.created_at)
+        .where(
+            Alert.user_id.in_(user_ids),
+            Alert.alert_type.in_(alert_types),
+            Alert.created_at >= since,
+            Alert.resolved == False,
+        )
+        .order_by(Alert.created_at)
+    )
+
+
+class AlertAggregator:
+    def __init__(self, window_seconds: int):
+        self.window = timedelta(seconds=window_seconds)
+        # alert_id -> (user_id, window end (naive UTC), latest risk score) awaiting an alert_update
+        self.pending: Dict[int, Tuple[str, datetime, float]] = {}
+        self.inserted = 0
+        self.suppressed = 0
+        self.updates_sent = 0
+        self._task: Optional[asyncio.Task] = None
+
+    async def raise_alerts(self, db: AsyncSession, candidates: List[AlertCandidate]) -> List[RaisedAlert]:
+        """Insert or fold `candidates` in the caller's transaction; one RaisedAlert per candidate, in order."""
+        if not candidates:
+            return []
+        now = datetime.utcnow()
+        result = await db.execute(open_alerts_query(
+            {c.user_id for c in candidates}, {c.alert_type for c in candidates}, now - self.window,
+        ))
+        open_alerts = {(user_id, alert_type, app, device): (alert_id, created_at)
+                       for alert_id, user_id, alert_type, app, device, created_at in result.all()}
+
+        # Repeats within the batch fold together too
+        groups: Dict[tuple, List[AlertCandidate]] = {}
+        for candidate in candidates:
+            groups.setdefault(candidate.key, []).append(candidate)
+        bumps = {key: group for key, group in groups.items() if key in open_alerts}
+        fresh = [group for key, group in groups.items() if key not in open_alerts]
+
+        ids: Dict[tuple, Tuple[int, bool]] = {}
+        pending = db.sync_session.info.setdefault(_PENDING_KEY, {})
+        if bumps:
+            await db.execute(
+                update(Alert.__table__)
+                .where(Alert.id == bindparam("b_id"))
+                .values(occurrences=Alert.occurrences + bindparam("b_count"), last_seen_at=now),
+                [{"b_id": open_alerts[key][0], "b_count": len(group)} for key, group in bumps.items()],
+            )
+            for key, group in bumps.items():
+                alert_id, created_at = open_alerts[key]
+                ids[key] = (alert_id, False)
+                pending[alert_id] = (key[0], created_at + self.window, group[-1].risk_score)
+        if fresh:
+            rows = [
+                {
+                    "user_id": c.user_id, "device_id": c.device_id, "app_name": c.app_name, "alert_type": c.alert_type,
+                    "severity": c.severity, "message": c.message, "explanation_text": c.explanation_text,
+                    "recommendation": c.recommendation, "confidence_score": c.confidence_score,
+                    "occurrences": len(group), "created_at": now, "last_seen_at": now,
+                }
+                for group in fresh for c in group[:1]
+            ]
+            result = await db.execute(insert(Alert).returning(Alert.id, sort_by_parameter_order=True), rows)
+            for group, alert_id in zip(fresh, result.scalars()):
+                ids[group[0].key] = (alert_id, True)
+                if len(group) > 1:
+                    pending[alert_id] = (group[0].user_id, now + self.window, group[-1].risk_score)
+
+        raised, announced = [], set()
+        for candidate in candidates:
+            alert_id, new = ids[candidate.key]
+            # Only the first candidate of a new alert announces it; the rest are repeats
+            raised.append(RaisedAlert(alert_id, new and alert_id not in announced, candidate))
+            announced.add(alert_id)
+        self.inserted += len(fresh)
+        self.suppressed += len(candidates) - len(fresh)
+        return raised
+
+    # ──── Coalesced updates ────
+    def after_commit(self, session: Session):
+        pending = session.info.pop(_PENDING_KEY, None)
+        if pending:
+            self.pending.update(pending)
+
+    def after_rollback(self, session: Session):
+        session.info.pop(_PENDING_KEY, None)
+
+    async def flush(self, now: Optional[datetime] = None):
+        """Send one alert_update for each folded-into alert whose window has closed."""
+        now = now or datetime.utcnow()
+        due = {alert_id: entry for alert_id, entry in self.pending.items() if entry[1] <= now}
+        if not due:
+            return
+        for alert_id in due:
+            del self.pending[alert_id]
+        async with async_session() as db:
+            result = await db.execute(
+                select(Alert.id, Alert.alert_type, Alert.severity, Alert.message, Alert.occurrences,
+                       Alert.created_at, Alert.last_seen_at)
+                .where(Alert.id.in_(list(due)))
+            )
+            rows = result.all()
+        for alert_id, alert_type, severity, message, occurrences, created_at, last_seen_at in rows:
+            user_id, _, risk_score = due[alert_id]
+            await manager.send_to_user(str(user_id), {
+                "type": "alert_update",
+                "alert_id": alert_id,
+                "alert_type": alert_type,
+                "severity": severity,
+                "message": message,
+                "occurrences": occurrences,
+                "first_seen": created_at.isoformat(),
+                "last_seen": last_seen_at.isoformat(),
+                "risk_score": risk_score,
+            })
+            self.updates_sent += 1
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(FLUSH_INTERVAL_SECONDS)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Alert update flush failed: {e}")
+
+    async def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self.pending:
+            # Windows still open: report the counts so far rather than never
+            try:
+                await self.flush(now=datetime.max)
+            except Exception as e:
+                logger.error(f"Alert update flush on shutdown failed: {e}")
+
+    def stats(self) -> dict:
+        events = self.inserted + self.suppressed
+        return {
+            "window_seconds": int(self.window.total_seconds()),
+            "inserted": self.inserted,
+            "suppressed": self.suppressed,
+            "suppression_rate": round(self.suppressed / events, 3) if events else None,
+            "pending_updates": len(self.pending),
+            "updates_sent": self.updates_sent,
+        }
+
+
+alert_aggregator = AlertAggregator(window_seconds=settings.ALERT_SUPPRESSION_SECONDS)
+
+event.listen(Session, "after_commit", alert_aggregator.after_commit)
+event.listen(Session, "after_rollback", alert_aggregator.after_rollback)
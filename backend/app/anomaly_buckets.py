@@ -0,0 +1,193 @@
+"""Per-user anomaly timeline and hour-of-day heatmap, bucketed in SQL.
+
+Both read the hourly summaries plus the raw logs not summarized yet (see
+app/retention.py), so a 90-day range costs a few thousand summary rows
+instead of every raw log. Completed buckets are cached per user: ingest only
+ever writes into the current bucket, so a bucket that ended before
+SUMMARY_GRACE ago can no longer change and is served from memory until
+evicted. Only the still-open bucket is queried on every request.
+"""
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Dict, Hashable, List, Optional, Tuple
+from sqlalchemy import DateTime, case, func, literal, select, union_all
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.config import get_settings
+from app.models import BehaviorLog, BehaviorLogHourly
+from app.retention import SUMMARY_GRACE, utc_now
+from app.rollups import hour_of_day, next_hour, time_bucket
+
+settings = get_settings()
+
+BUCKET_HOURS = (1, 2, 3, 4, 6, 8, 12, 24)  # widths that tile a day, so buckets align to midnight UTC
+
+
+class BucketCache:
+    """LRU of completed buckets, keyed by (user_id, kind, bucket start)."""
+
+    def __init__(self, max_buckets: int):
+        self.max_buckets = max_buckets
+        self.buckets: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key) -> Optional[tuple]:
+        value = self.buckets.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self.buckets.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value: tuple):
+        self.buckets[key] = value
+        self.buckets.move_to_end(key)
+        while len(self.buckets) > self.max_buckets:
+            self.buckets.popitem(last=False)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "buckets": len(self.buckets),
+            "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+        }
+
+
+bucket_cache = BucketCache(max_buckets=settings.ANOMALY_CACHE_MAX_BUCKETS)
+
+
+def floor_bucket(value: datetime, hours: int) -> datetime:
+    return value.replace(hour=value.hour // hours * hours, minute=0, second=0, microsecond=0)
+
+
+def _as_datetime(value) -> datetime:
+    # SQLite returns the bucket as text
+    return datetime.fromisoformat(value) if isinstance(value, str) else value
+
+
+def log_sources(user_id: str, since: datetime, dialect_name: str):
+    """A user's logs from `since` on: hourly summary rows plus raw logs after the summary watermark."""
+    H = BehaviorLogHourly
+    summaries = (
+        select(
+            H.hour.label("ts"), H.log_count.label("log_count"), H.anomaly_count.label("anomaly_count"),
+            H.anomaly_score_sum.label("score_sum"),
+        )
+        .where(H.user_id == user_id, H.hour >= since)
+    )
+    # Watermark read in the same statement, so a concurrent summarize run cannot count an hour twice
+    last_hour = select(func.max(H.hour)).scalar_subquery()
+    tail = (
+        select(
+            BehaviorLog.timestamp.label("ts"),
+            literal(1).label("log_count"),
+            case((BehaviorLog.anomaly_flag == True, 1), else_=0).label("anomaly_count"),
+            func.coalesce(BehaviorLog.anomaly_score, 0.0).label("score_sum"),
+        )
+        .where(
+            BehaviorLog.user_id == user_id,
+            BehaviorLog.timestamp >= since,
+            # Bare column against the next hour (no watermark: all), so the index and partition pruning apply
+            BehaviorLog.timestamp >= func.coalesce(next_hour(last_hour, dialect_name), literal(datetime.min, DateTime)),
+        )
+    )
+    return union_all(summaries, tail).subquery()
+
+
+def timeline_query(user_id: str, since: datetime, bucket_hours: int, dialect_name: str):
+    sources = log_sources(user_id, since, dialect_name)
+    bucket = time_bucket(sources.c.ts, dialect_name, bucket_hours).label("bucket")
+    return (
+        select(bucket, func.sum(sources.c.log_count), func.sum(sources.c.anomaly_count), func.sum(sources.c.score_sum))
+        .group_by(bucket)
+    )
+
+
+def heatmap_query(user_id: str, since: datetime, dialect_name: str):
+    sources = log_sources(user_id, since, dialect_name)
+    day = time_bucket(sources.c.ts, dialect_name, 24).label("day")
+    hour = hour_of_day(sources.c.ts, dialect_name).label("hour")
+    return (
+        select(day, hour, func.sum(sources.c.anomaly_count))
+        .where(sources.c.anomaly_count > 0)
+        .group_by(day, hour)
+    )
+
+
+def _bucket_starts(hours: int, bucket_hours: int) -> Tuple[List[datetime], datetime]:
+    """Bucket starts covering the last `hours` (oldest first), and the end of the last completed bucket."""
+    now = utc_now()
+    width = timedelta(hours=bucket_hours)
+    last = floor_bucket(now, bucket_hours)
+    first = floor_bucket(now - timedelta(hours=hours), bucket_hours) + width
+    starts = []
+    start = first
+    while start <= last:
+        starts.append(start)
+        start += width
+    return starts, floor_bucket(now - SUMMARY_GRACE, bucket_hours)
+
+
+async def _cached_buckets(
+    db: AsyncSession, user_id: str, kind: str, starts: List[datetime], complete_before: datetime, load,
+) -> Dict[datetime, tuple]:
+    """Values for every start: cached complete buckets, the rest from one query via `load(db, since)`."""
+    values: Dict[datetime, tuple] = {}
+    missing = None
+    for start in starts:
+        cached = bucket_cache.get((user_id, kind, start)) if start < complete_before else None
+        if cached is None:
+            missing = start
+            break
+        values[start] = cached
+    if missing is not None:
+        loaded = await load(db, missing)
+        for start in starts:
+            if start < missing:
+                continue
+            values[start] = loaded.get(start) or ()
+            if start < complete_before:
+                bucket_cache.put((user_id, kind, start), values[start])
+    return values
+
+
+async def anomaly_timeline(db: AsyncSession, user_id: str, hours: int, bucket_hours: int) -> List[dict]:
+    """One point per bucket over the last `hours`: logs, anomalies and mean anomaly score (missing scores count as 0)."""
+    starts, complete_before = _bucket_starts(hours, bucket_hours)
+    dialect_name = db.bind.dialect.name
+
+    async def load(db: AsyncSession, since: datetime) -> Dict[datetime, tuple]:
+        result = await db.execute(timeline_query(user_id, since, bucket_hours, dialect_name))
+        return {_as_datetime(bucket): (int(logs), int(anomalies), float(score_sum)) for bucket, logs, anomalies, score_sum in result.all()}
+
+    values = await _cached_buckets(db, user_id, f"timeline:{bucket_hours}", starts, complete_before, load)
+    points = []
+    for start in starts:
+        logs, anomalies, score_sum = values[start] or (0, 0, 0.0)
+        points.append({
+            "start": start,
+            "log_count": logs,
+            "anomaly_count": anomalies,
+            "avg_score": score_sum / logs if logs else 0.0,
+        })
+    return points
+
+
+async def anomaly_heatmap(db: AsyncSession, user_id: str, days: int) -> List[int]:
+    """Anomalies per UTC hour of day (index 0-23) over the last `days` days, today included."""
+    starts, complete_before = _bucket_starts(days * 24, 24)
+    dialect_name = db.bind.dialect.name
+
+    async def load(db: AsyncSession, since: datetime) -> Dict[datetime, tuple]:
+        by_day: Dict[datetime, List[int]] = {}
+        for day, hour, anomalies in (await db.execute(heatmap_query(user_id, since, dialect_name))).all():
+            by_day.setdefault(_as_datetime(day), [0] * 24)[hour] = int(anomalies)
+        return {day: tuple(counts) for day, counts in by_day.items()}
+
+    values = await _cached_buckets(db, user_id, "heatmap", starts, complete_before, load)
+    totals = [0] * 24
+    for counts in values.values():
+        for hour, count in enumerate(counts):
+            totals[hour] += count
+    return totals
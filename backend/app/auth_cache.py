@@ -0,0 +1,122 @@
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, Hashable, Optional
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.auth import decode_token
+from app.config import get_settings
+from app.models import User
+
+settings = get_settings()
+
+
+@dataclass(frozen=True)
+class TokenUser:
+    """Who a request is from, taken from the access token alone (no database read)."""
+    id: str
+    role: Optional[str]
+
+
+@dataclass(frozen=True)
+class CurrentUser:
+    """Read-only snapshot of the authenticated user's row. Load the `User` row to change it."""
+    id: str
+    name: str
+    email: str
+    college: str
+    role: str
+    consent_given: bool
+    created_at: datetime
+
+    @classmethod
+    def from_user(cls, user: User) -> "CurrentUser":
+        return cls(
+            id=user.id, name=user.name, email=user.email, college=user.college,
+            role=user.role, consent_given=bool(user.consent_given), created_at=user.created_at,
+        )
+
+
+class TTLCache:
+    """LRU dict whose entries also expire `ttl` seconds after insertion (or at an explicit deadline)."""
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key) -> Any:
+        entry = self.entries.get(key)
+        if entry is None or entry[0] <= time.monotonic():
+            if entry is not None:
+                del self.entries[key]
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, key, value, expires_at: Optional[float] = None):
+        deadline = time.monotonic() + self.ttl
+        self.entries[key] = (min(deadline, expires_at) if expires_at is not None else deadline, value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def pop(self, key):
+        self.entries.pop(key, None)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {"entries": len(self.entries), "hit_rate": round(self.hits / lookups, 3) if lookups else None}
+
+
+class AuthCache:
+    """Decoded access-token claims and user snapshots for `deps`.
+
+    Claims are cached per token until the token expires. User snapshots live
+    for `user_ttl` seconds, and this worker drops one as soon as it changes
+    the row (`invalidate`). Other workers can serve a snapshot up to
+    `user_ttl` old, so the dependencies re-read the row before refusing a
+    request on the strength of a cached role or consent flag.
+    """
+
+    def __init__(self, max_entries: int, user_ttl: float):
+        self.claims = TTLCache(max_entries, ttl=float("inf"))
+        self.users = TTLCache(max_entries, ttl=user_ttl)
+
+    def decode(self, token: str) -> Optional[Dict[str, Any]]:
+        payload = self.claims.get(token)
+        if payload is None:
+            payload = decode_token(token)
+            if payload is None:
+                return None
+            # `exp` is wall-clock seconds; the cache runs on the monotonic clock
+            expires_at = time.monotonic() + (payload.get("exp", 0) - time.time())
+            self.claims.put(token, payload, expires_at=expires_at)
+        elif payload.get("exp", 0) <= time.time():
+            return None
+        return payload
+
+    async def user(self, db: AsyncSession, user_id: str, refresh: bool = False) -> Optional[CurrentUser]:
+        snapshot = None if refresh else self.users.get(user_id)
+        if snapshot is None:
+            row = (await db.execute(select(User).where(User.id == user_id))).scalar_one_or_none()
+            if row is None:
+                self.users.pop(user_id)
+                return None
+            snapshot = CurrentUser.from_user(row)
+            self.users.put(user_id, snapshot)
+        return snapshot
+
+    def invalidate(self, user_id: str):
+        self.users.pop(user_id)
+
+    def stats(self) -> dict:
+        return {"claims": self.claims.stats(), "users": self.users.stats()}
+
+
+auth_cache = AuthCache(max_entries=settings.AUTH_CACHE_MAX_ENTRIES, user_ttl=settings.AUTH_CACHE_USER_TTL_SECONDS)
@@ -4,6 +4,7 @@ import os
 
 # On Vercel, filesystem is read-only except /tmp
 _default_db = "sqlite+aiosqlite:////tmp/sentinelai.db" if os.environ.get("VERCEL") else "sqlite+aiosqlite:///./sentinelai.db"
+_default_model_dir = "/tmp/sentinelai-models" if os.environ.get("VERCEL") else "./models"
 
 
 class Settings(BaseSettings):
@@ -12,6 +13,19 @@ class Settings(BaseSettings):
 
     # Database — defaults to SQLite for easy local dev
     DATABASE_URL: str = _default_db
+    # Connection pool, per engine and per worker: at most size + overflow connections each
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT_SECONDS: int = 30  # wait for a free connection before failing the request
+    DB_POOL_RECYCLE_SECONDS: int = 1800
+    DB_POOL_PRE_PING: bool = True
+    DB_STATEMENT_CACHE_SIZE: int = 100  # prepared statements cached per connection
+    # Read replica for read-only endpoints and background readers (empty: the primary;
+    # on a SQLite file, a pool of query-only connections to it)
+    DATABASE_READ_URL: str = ""
+    DB_READ_POOL_SIZE: int = 5
+    # After a user's own ingest, their reads stay on the primary this long (keep above replica lag)
+    READ_YOUR_WRITES_SECONDS: int = 5
 
     # Redis
     REDIS_URL: str = "redis://localhost:6379/0"
@@ -22,6 +36,15 @@ class Settings(BaseSettings):
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
     REFRESH_TOKEN_EXPIRE_DAYS: int = 7
+    # Decoded tokens and user rows cached per worker for request auth
+    AUTH_CACHE_MAX_ENTRIES: int = 10000
+    AUTH_CACHE_USER_TTL_SECONDS: int = 30
+
+    # Password hashing: bcrypt cost, and the pool that keeps it off the event loop (inline | thread | process)
+    BCRYPT_ROUNDS: int = 12
+    PASSWORD_HASH_EXECUTOR: str = "thread"
+    PASSWORD_HASH_WORKERS: int = 2
+    PASSWORD_HASH_MAX_QUEUE: int = 64  # hashes waiting for a worker beyond this are refused with 503
 
     # CORS
     CORS_ORIGINS: str = "http://localhost:3000,http://localhost:3001,http://localhost:80,http://localhost,https://frontend-gray-rho-42.vercel.app,https://*.vercel.app"
@@ -29,9 +52,79 @@ class Settings(BaseSettings):
     # Simulator
     SIMULATOR_ENABLED: bool = True
     SIMULATOR_INTERVAL_SECONDS: int = 30
+    SIMULATOR_CHUNK_SIZE: int = 500  # students per transaction
+    SIMULATOR_CONCURRENCY: int = 4  # chunks in flight at once (always 1 on SQLite: single writer)
+
+    # Rolling risk window (per-user ring buffer of recent logs)
+    ROLLING_WINDOW_SIZE: int = 50
+    ROLLING_WINDOW_MAX_USERS: int = 10000  # memory cap: ~50 small dicts per cached user
+    ROLLING_WINDOW_IDLE_SECONDS: int = 900
+    ROLLING_WINDOW_REFRESH_SECONDS: int = 300
+
+    # Anomaly model registry (Isolation Forest per college / per user)
+    MODEL_DIR: str = _default_model_dir
+    MODEL_MIN_USER_LOGS: int = 200  # history needed before a user gets a personal model
+    MODEL_RETRAIN_AFTER_LOGS: int = 500
+    MODEL_RETRAIN_INTERVAL_SECONDS: int = 3600
+    MODEL_RELOAD_INTERVAL_SECONDS: int = 60
+    MODEL_MAX_TRAINING_SAMPLES: int = 5000
+    MODEL_MAX_USER_MODELS: int = 2000  # per-user models kept in MODEL_DIR (~2 MB each); oldest deleted first
+    MODEL_CACHED_USER_MODELS: int = 200  # per-user models held in memory per worker (LRU)
+    MODEL_FIT_QUEUE_SIZE: int = 100  # cohorts waiting for a fit on the leader, fitted one at a time
+
+    # Risk scoring executor: inline | thread | process
+    SCORING_EXECUTOR: str = "thread"
+    SCORING_WORKERS: int = 2
+    SCORING_BATCH_SIZE: int = 64
+    SCORING_BATCH_WAIT_MS: int = 2
+
+    # WebSocket delivery
+    WS_SEND_QUEUE_SIZE: int = 100
+    WS_SLOW_CONSUMER_POLICY: str = "drop_oldest"  # drop_oldest | coalesce | disconnect
+    WS_SEND_TIMEOUT_SECONDS: float = 10.0
+
+    # Repeat alerts for the same (user, device, app, alert type) fold into the open alert
+    # for this long after it was raised; one alert_update per window carries the count
+    ALERT_SUPPRESSION_SECONDS: int = 600
+
+    # Admin dashboard totals are served from memory and re-counted at least this often
+    ADMIN_STATS_MAX_STALENESS_SECONDS: int = 10
+
+    # Student leaderboard ranks are served from memory and reloaded this often
+    # (picks up other workers' score changes)
+    LEADERBOARD_RESYNC_SECONDS: int = 60
+
+    # Daily rollups behind /api/admin/trends: nightly recount window, and backfill when empty
+    ROLLUP_COMPACTION_DAYS: int = 2
+    ROLLUP_BACKFILL_DAYS: int = 90  # capped at LOG_RETENTION_DAYS
+
+    # Admin exports stream rows from the database in chunks of this size
+    EXPORT_CHUNK_ROWS: int = 1000
+
+    # Behavior log storage: raw logs are summarized per user and hour, and whole
+    # months of raw logs older than the retention are dropped (monthly partitions on Postgres)
+    LOG_RETENTION_DAYS: int = 90
+    LOG_SUMMARY_INTERVAL_SECONDS: int = 300
+    LOG_PARTITIONS_AHEAD: int = 2  # Postgres: future monthly partitions kept ready
+
+    # Anomaly timeline/heatmap buckets cached in memory per user, once complete (LRU bound)
+    ANOMALY_CACHE_MAX_BUCKETS: int = 100000
+
+    # Leader election (one worker runs the simulator and periodic jobs): auto | redis | postgres | file
+    LEADER_BACKEND: str = "auto"
+    LEADER_LOCK_FILE: str = ""  # file backend; defaults to <tmpdir>/sentinelai-leader.lock
+    LEADER_RENEW_SECONDS: int = 5
+    LEADER_TTL_SECONDS: int = 15  # redis backend; a dead leader is replaced after at most this long
 
-    # Rate limiting
-    RATE_LIMIT: str = "60/minute"
+    # Rate limiting: token buckets per user (client IP when anonymous), shared by all workers
+    RATE_LIMIT_ENABLED: bool = True
+    RATE_LIMIT: str = "60/minute"  # every API endpoint except ingest and /api/health
+    RATE_LIMIT_INGEST: str = "120/minute"  # POST /api/logs and /api/logs/batch
+    RATE_LIMIT_BACKEND: str = "auto"  # auto | redis | local (memory-mapped table shared by this host's workers)
+    RATE_LIMIT_FILE: str = ""  # local backend; defaults to <tmpdir>/sentinelai-ratelimit.bin
+    RATE_LIMIT_TABLE_SLOTS: int = 65536  # local backend: buckets kept (24 bytes each)
+    # Proxies (IPs or CIDRs, comma-separated) whose X-Forwarded-For is believed for anonymous clients
+    TRUSTED_PROXIES: str = "127.0.0.1,::1"
 
     class Config:
         env_file = ".env"
@@ -0,0 +1,190 @@
+import asyncio
+import logging
+import time
+from collections import Counter
+from typing import Dict, Optional
+from sqlalchemy import event, func, case, inspect, select, true
+from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.config import get_settings
+from app.database import async_session
+from app.models import User, RiskScore, Alert
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+COUNTER_KEYS = (
+    "total_users", "total_students", "total_admins",
+    "high_risk_count", "medium_risk_count", "low_risk_count",
+    "total_alerts", "unresolved_alerts",
+)
+_ROLE_KEYS = {"student": "total_students", "admin": "total_admins"}
+_LEVEL_KEYS = {"high": "high_risk_count", "medium": "medium_risk_count", "low": "low_risk_count"}
+_DELTA_KEY = "admin_stats_delta"
+
+
+def stats_query():
+    """All admin dashboard totals in one statement: one conditional aggregate per table, cross-joined."""
+    users = select(
+        func.count(User.id).label("total_users"),
+        func.count(case((User.role == "student", 1))).label("total_students"),
+        func.count(case((User.role == "admin", 1))).label("total_admins"),
+    ).subquery()
+    risks = select(
+        func.count(case((RiskScore.risk_level == "high", 1))).label("high_risk_count"),
+        func.count(case((RiskScore.risk_level == "medium", 1))).label("medium_risk_count"),
+        func.count(case((RiskScore.risk_level == "low", 1))).label("low_risk_count"),
+    ).subquery()
+    alerts = select(
+        func.count(Alert.id).label("total_alerts"),
+        func.count(case((Alert.resolved == False, 1))).label("unresolved_alerts"),
+    ).subquery()
+    return select(users, risks, alerts).select_from(users.join(risks, true()).join(alerts, true()))
+
+
+_TRACKED = {User: "role", RiskScore: "risk_level", Alert: "resolved"}
+
+
+def _bucket_delta(model, value, sign: int, delta: Counter):
+    """Add (sign=1) or remove (sign=-1) one row's contribution, given its tracked column value."""
+    if model is User:
+        delta["total_users"] += sign
+        if value in _ROLE_KEYS:
+            delta[_ROLE_KEYS[value]] += sign
+    elif model is RiskScore:
+        if value in _LEVEL_KEYS:
+            delta[_LEVEL_KEYS[value]] += sign
+    elif model is Alert:
+        delta["total_alerts"] += sign
+        if not value:
+            delta["unresolved_alerts"] += sign
+
+
+def _column_default(model, attr: str):
+    default = model.__table__.c[attr].default
+    return default.arg if default is not None and default.is_scalar else None
+
+
+class AdminStatsCounters:
+    """In-memory totals behind `/api/admin/stats`.
+
+    ORM flushes and ORM bulk INSERTs of users, risk scores and alerts are
+    turned into deltas that are applied when their transaction commits, so
+    this worker's own writes show up immediately. Writes the events cannot see
+    (core UPDATEs, other workers) are picked up by reconciling against the
+    database with `stats_query`; a snapshot is never served older than
+    `max_staleness` seconds.
+    """
+
+    def __init__(self, max_staleness: float):
+        self.max_staleness = max_staleness
+        self.counts: Dict[str, int] = {}
+        self.reconciled_at: Optional[float] = None
+        self.reconciliations = 0
+        self.drift = 0
+        self._task: Optional[asyncio.Task] = None
+
+    # ──── Session events ────
+    def _pending(self, session: Session) -> Counter:
+        return session.info.setdefault(_DELTA_KEY, Counter())
+
+    def after_flush(self, session: Session, flush_context):
+        delta = self._pending(session)
+        for sign, objects in ((1, session.new), (-1, session.deleted)):
+            for obj in objects:
+                attr = _TRACKED.get(type(obj))
+                if attr:
+                    value = getattr(obj, attr)
+                    if value is None:
+                        value = _column_default(type(obj), attr)
+                    _bucket_delta(type(obj), value, sign, delta)
+        for obj in session.dirty:
+            attr = _TRACKED.get(type(obj))
+            if not attr:
+                continue
+            # Move the row from its old bucket to the new one
+            history = inspect(obj).attrs[attr].history
+            if history.deleted:
+                _bucket_delta(type(obj), history.deleted[0], -1, delta)
+                _bucket_delta(type(obj), getattr(obj, attr), 1, delta)
+
+    def do_orm_execute(self, state):
+        # insert(Alert) / insert(RiskScore) with a list of rows skips the flush entirely
+        if not state.is_insert or not isinstance(state.parameters, list):
+            return
+        model = state.bind_mapper.class_ if state.bind_mapper is not None else None
+        attr = _TRACKED.get(model)
+        if not attr:
+            return
+        default = _column_default(model, attr)
+        delta = self._pending(state.session)
+        for params in state.parameters:
+            _bucket_delta(model, params.get(attr, default), 1, delta)
+
+    def record_change(self, session: Session, model, old_value, new_value):
+        """Report an update made with a core UPDATE, which the flush events cannot see."""
+        delta = self._pending(session)
+        _bucket_delta(model, old_value, -1, delta)
+        _bucket_delta(model, new_value, 1, delta)
+
+    def after_commit(self, session: Session):
+        delta = session.info.pop(_DELTA_KEY, None)
+        if delta and self.counts:
+            for key, value in delta.items():
+                self.counts[key] += value
+
+    def after_rollback(self, session: Session):
+        session.info.pop(_DELTA_KEY, None)
+
+    # ──── Reconciliation ────
+    async def reconcile(self, db: Optional[AsyncSession] = None):
+        if db is None:
+            async with async_session() as session:
+                row = (await session.execute(stats_query())).one()
+        else:
+            row = (await db.execute(stats_query())).one()
+        fresh = {key: getattr(row, key) or 0 for key in COUNTER_KEYS}
+        if self.counts:
+            self.drift = sum(abs(fresh[key] - self.counts.get(key, 0)) for key in COUNTER_KEYS)
+        self.counts = fresh
+        self.reconciled_at = time.monotonic()
+        self.reconciliations += 1
+
+    async def snapshot(self, db: AsyncSession) -> Dict[str, int]:
+        if self.reconciled_at is None or time.monotonic() - self.reconciled_at > self.max_staleness:
+            await self.reconcile(db)
+        return dict(self.counts)
+
+    async def _run(self):
+        # Reconcile at half the bound so request-path reads rarely have to
+        while True:
+            await asyncio.sleep(self.max_staleness / 2)
+            try:
+                await self.reconcile()
+            except Exception as e:
+                logger.error(f"Admin stats reconciliation failed: {e}")
+
+    async def start(self):
+        await self.reconcile()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def stats(self) -> dict:
+        return {
+            "age_seconds": round(time.monotonic() - self.reconciled_at, 1) if self.reconciled_at else None,
+            "reconciliations": self.reconciliations,
+            "last_drift": self.drift,
+        }
+
+
+admin_stats = AdminStatsCounters(max_staleness=settings.ADMIN_STATS_MAX_STALENESS_SECONDS)
+
+event.listen(Session, "after_flush", admin_stats.after_flush)
+event.listen(Session, "do_orm_execute", admin_stats.do_orm_execute)
+event.listen(Session, "after_commit", admin_stats.after_commit)
+event.listen(Session, "after_rollback", admin_stats.after_rollback)
@@ -1,21 +1,86 @@
+from pathlib import Path
+from alembic import command
+from alembic.config import Config
+from sqlalchemy import event, inspect, make_url
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
 from sqlalchemy.orm import DeclarativeBase
 from app.config import get_settings
+from app.pool_metrics import MeteredQueuePool, PoolMetrics
 
 settings = get_settings()
 
-# SQLite needs connect_args for async; PostgreSQL doesn't
-connect_args = {}
-if settings.DATABASE_URL.startswith("sqlite"):
-    connect_args = {"check_same_thread": False}
+def _is_sqlite_memory(url) -> bool:
+    return url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:")
 
-engine = create_async_engine(
-    settings.DATABASE_URL,
-    echo=settings.DEBUG,
-    connect_args=connect_args,
-)
+
+def _engine_options(url, read_only: bool = False) -> dict:
+    if url.get_backend_name() == "sqlite":
+        # SQLite needs connect_args for async; `cached_statements` is sqlite3's statement cache
+        options = {"connect_args": {"check_same_thread": False, "cached_statements": settings.DB_STATEMENT_CACHE_SIZE}}
+        if _is_sqlite_memory(url):
+            return options  # one shared connection (StaticPool); pool settings do not apply
+    else:
+        connect_args = {"prepared_statement_cache_size": settings.DB_STATEMENT_CACHE_SIZE}
+        if read_only:
+            connect_args["server_settings"] = {"default_transaction_read_only": "on"}
+        options = {"connect_args": connect_args}
+    return {
+        **options,
+        "poolclass": MeteredQueuePool,
+        "pool_size": settings.DB_READ_POOL_SIZE if read_only else settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT_SECONDS,
+        "pool_recycle": settings.DB_POOL_RECYCLE_SECONDS,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+    }
+
+
+def _sqlite_query_only(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA query_only=ON")
+    cursor.close()
+
+
+DB_URL = make_url(settings.DATABASE_URL)
+IS_SQLITE = DB_URL.get_backend_name() == "sqlite"
+IS_SQLITE_MEMORY = _is_sqlite_memory(DB_URL)
+
+engine = create_async_engine(DB_URL, echo=settings.DEBUG, **_engine_options(DB_URL))
+
+if IS_SQLITE and not IS_SQLITE_MEMORY:
+    @event.listens_for(engine.sync_engine, "connect")
+    def _sqlite_wal(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")  # safe in WAL mode: a power loss can drop only the last commits
+        cursor.close()
+
+# Reads that tolerate a moment of staleness go to DATABASE_READ_URL (a
+# replica), or on a SQLite file to a second pool of query-only connections:
+# in WAL mode those read a snapshot while the simulator writes, instead of
+# waiting behind its lock or for a connection the writers hold.
+READ_URL = make_url(settings.DATABASE_READ_URL) if settings.DATABASE_READ_URL else None
+if READ_URL is not None or (IS_SQLITE and not IS_SQLITE_MEMORY):
+    READ_URL = READ_URL or DB_URL
+    read_engine = create_async_engine(READ_URL, echo=settings.DEBUG, **_engine_options(READ_URL, read_only=True))
+    if READ_URL.get_backend_name() == "sqlite":
+        event.listen(read_engine.sync_engine, "connect", _sqlite_query_only)
+else:
+    read_engine = engine
 
 async_session = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+# Sessions for reads that tolerate a moment of staleness and never write
+read_session = async_sessionmaker(read_engine, class_=AsyncSession, expire_on_commit=False)
+
+pool_metrics = {}
+if not IS_SQLITE_MEMORY:
+    pool_metrics["write"] = PoolMetrics(engine)
+if read_engine is not engine and not _is_sqlite_memory(READ_URL):
+    pool_metrics["read"] = PoolMetrics(read_engine)
+
+
+def pool_stats() -> dict:
+    return {name: metrics.stats() for name, metrics in pool_metrics.items()}
 
 
 class Base(DeclarativeBase):
@@ -30,6 +95,25 @@ async def get_db():
             await session.close()
 
 
+MIGRATIONS_DIR = Path(__file__).resolve().parent.parent / "migrations"
+BASELINE_REVISION = "0001"
+
+
+def _upgrade(connection):
+    config = Config()
+    config.set_main_option("script_location", str(MIGRATIONS_DIR))
+    config.attributes["connection"] = connection
+    tables = inspect(connection).get_table_names()
+    if "users" in tables and "alembic_version" not in tables:
+        # Created by create_all before migrations existed: that schema is the baseline
+        command.stamp(config, BASELINE_REVISION)
+    command.upgrade(config, "head")
+
+
 async def create_tables():
+    """Bring the schema up to date by running the Alembic migrations to head."""
     async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
+        if conn.dialect.name == "postgresql":
+            # Workers start together; let one migrate while the others wait
+            await conn.exec_driver_sql("SELECT pg_advisory_xact_lock(hashtext('sentinelai:migrations'))")
+        await conn.run_sync(_upgrade)
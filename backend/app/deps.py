@@ -1,40 +1,58 @@
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
-from app.database import get_db
-from app.auth import decode_token
-from app.models import User
+from app.database import async_session, get_db, read_session
+from app.auth_cache import CurrentUser, TokenUser, auth_cache
+from app.read_routing import read_routing
 from typing import List
 
 security = HTTPBearer()
 
-async def get_current_user(
-    credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: AsyncSession = Depends(get_db),
-) -> User:
-    token = credentials.credentials
-    payload = decode_token(token)
+def _access_claims(credentials: HTTPAuthorizationCredentials) -> dict:
+    payload = auth_cache.decode(credentials.credentials)
     if payload is None:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid or expired token")
 
     if payload.get("type") != "access":
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token type")
 
-    user_id = payload.get("sub")
-    if user_id is None:
+    if payload.get("sub") is None:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token payload")
+    return payload
+
+async def get_token_user(
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+) -> TokenUser:
+    """Id and role from the token only. For read endpoints that just scope queries by user id."""
+    payload = _access_claims(credentials)
+    return TokenUser(id=payload["sub"], role=payload.get("role"))
+
+async def get_read_db(user: TokenUser = Depends(get_token_user)):
+    """Session for read-only endpoints: the read replica/pool, or the primary right after this user's own ingest."""
+    factory = async_session if await read_routing.use_primary(user.id) else read_session
+    async with factory() as session:
+        yield session
 
-    result = await db.execute(select(User).where(User.id == user_id))
-    user = result.scalar_one_or_none()
+async def get_current_user(
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    db: AsyncSession = Depends(get_db),
+) -> CurrentUser:
+    payload = _access_claims(credentials)
+    user = await auth_cache.user(db, payload["sub"])
     if user is None:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User not found")
 
     return user
 
 def require_roles(allowed_roles: List[str]):
-    async def role_checker(user: User = Depends(get_current_user)) -> User:
+    async def role_checker(
+        user: CurrentUser = Depends(get_current_user),
+        db: AsyncSession = Depends(get_db),
+    ) -> CurrentUser:
         if user.role not in allowed_roles:
+            # The cached snapshot may predate a role change made by another worker
+            user = await auth_cache.user(db, user.id, refresh=True)
+        if user is None or user.role not in allowed_roles:
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN, 
                 detail=f"Operation not permitted. Requires one of: {', '.join(allowed_roles)}"
@@ -42,12 +60,23 @@ def require_roles(allowed_roles: List[str]):
         return user
     return role_checker
 
-async def require_admin(user: User = Depends(get_current_user)) -> User:
+async def require_admin(
+    user: CurrentUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+) -> CurrentUser:
     if user.role != "admin":
+        user = await auth_cache.user(db, user.id, refresh=True)
+    if user is None or user.role != "admin":
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin access required")
     return user
 
-async def require_consent(user: User = Depends(get_current_user)) -> User:
+async def require_consent(
+    user: CurrentUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+) -> CurrentUser:
     if not user.consent_given:
+        # Consent may have just been given through another worker
+        user = await auth_cache.user(db, user.id, refresh=True)
+    if user is None or not user.consent_given:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Consent required before accessing this resource")
     return user
@@ -0,0 +1,169 @@
+import csv
+import io
+import json
+import zlib
+from typing import AsyncIterator, List, NamedTuple, Sequence
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+from sqlalchemy import Select
+from app.config import get_settings
+from app.database import read_session
+
+settings = get_settings()
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    HAS_PYARROW = True
+except ImportError:
+    HAS_PYARROW = False
+
+EXPORT_FORMATS = ("csv", "parquet", "arrow")
+_MEDIA_TYPES = {
+    "csv": "text/csv",
+    "parquet": "application/vnd.apache.parquet",
+    "arrow": "application/vnd.apache.arrow.stream",
+}
+
+
+class ExportColumn(NamedTuple):
+    header: str  # CSV header
+    name: str  # Arrow / Parquet field name
+    type: str  # pyarrow type factory name: string, float64, int64, bool_, timestamp
+
+
+class ExportSpec(NamedTuple):
+    filename: str
+    columns: Sequence[ExportColumn]
+
+    def arrow_schema(self):
+        def field_type(kind):
+            return pa.timestamp("us") if kind == "timestamp" else getattr(pa, kind)()
+        return pa.schema([(col.name, field_type(col.type)) for col in self.columns])
+
+
+async def _partitions(query: Select) -> AsyncIterator[List[tuple]]:
+    """Stream result rows in chunks of EXPORT_CHUNK_ROWS through a server-side cursor.
+
+    Uses its own session: the request's session is closed before a
+    streaming response body is sent.
+    """
+    async with read_session() as db:
+        result = await db.stream(query.execution_options(yield_per=settings.EXPORT_CHUNK_ROWS))
+        async for rows in result.partitions():
+            yield rows
+
+
+def _cell(value):
+    return json.dumps(value) if isinstance(value, (dict, list)) else value
+
+
+async def _csv_chunks(spec: ExportSpec, query: Select) -> AsyncIterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([col.header for col in spec.columns])
+    async for rows in _partitions(query):
+        writer.writerows([_cell(v) for v in row] for row in rows)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+async def _gzip(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    compressor = zlib.compressobj(wbits=31)  # gzip container
+    async for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file object that hands written bytes back to the generator."""
+
+    def __init__(self):
+        self._parts: List[bytes] = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._parts.append(bytes(data))
+        return len(data)
+
+    def drain(self) -> bytes:
+        data = b"".join(self._parts)
+        self._parts.clear()
+        return data
+
+
+async def _arrow_chunks(spec: ExportSpec, query: Select, fmt: str) -> AsyncIterator[bytes]:
+    """One record batch (Arrow IPC) or row group (Parquet) per streamed partition."""
+    schema = spec.arrow_schema()
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema) if fmt == "parquet" else pa.ipc.new_stream(sink, schema)
+    try:
+        async for rows in _partitions(query):
+            columns = list(zip(*rows))
+            arrays = [
+                pa.array([_cell(v) if col.type == "string" else v for v in values], type=schema.field(i).type)
+                for i, (col, values) in enumerate(zip(spec.columns, columns))
+            ]
+            writer.write_batch(pa.record_batch(arrays, schema=schema))
+            data = sink.drain()
+            if data:
+                yield data
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+def export_response(spec: ExportSpec, query: Select, fmt: str = "csv", gzip: bool = False) -> StreamingResponse:
+    """Stream `query` as CSV (optionally gzipped), Parquet or an Arrow IPC stream."""
+    if fmt not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {', '.join(EXPORT_FORMATS)}")
+    if fmt != "csv" and not HAS_PYARROW:
+        raise HTTPException(status_code=400, detail=f"{fmt} export requires the optional 'pyarrow' package")
+    if gzip and fmt != "csv":
+        raise HTTPException(status_code=400, detail="gzip applies to CSV only; Parquet and Arrow are columnar binary formats")
+
+    filename = f"{spec.filename}.{fmt}"
+    media_type = _MEDIA_TYPES[fmt]
+    body = _csv_chunks(spec, query) if fmt == "csv" else _arrow_chunks(spec, query, fmt)
+    if gzip:
+        body = _gzip(body)
+        filename += ".gz"
+        media_type = "application/gzip"
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={"Content-Disposition": f"attachment; filename={filename}"},
+    )
+
+
+REPORT_EXPORT = ExportSpec("sentinel_report", [
+    ExportColumn("Name", "name", "string"),
+    ExportColumn("Email", "email", "string"),
+    ExportColumn("College", "college", "string"),
+    ExportColumn("Role", "role", "string"),
+    ExportColumn("Risk Score", "risk_score", "float64"),
+    ExportColumn("Risk Level", "risk_level", "string"),
+])
+
+BEHAVIOR_LOG_EXPORT = ExportSpec("behavior_logs", [
+    ExportColumn("ID", "id", "int64"),
+    ExportColumn("User ID", "user_id", "string"),
+    ExportColumn("Device ID", "device_id", "string"),
+    ExportColumn("Timestamp", "timestamp", "timestamp"),
+    ExportColumn("App", "app_name", "string"),
+    ExportColumn("Permission", "permission_requested", "string"),
+    ExportColumn("Network Activity", "network_activity_level", "float64"),
+    ExportColumn("Background Process", "background_process_flag", "bool_"),
+    ExportColumn("Anomaly", "anomaly_flag", "bool_"),
+    ExportColumn("Anomaly Type", "anomaly_type", "string"),
+    ExportColumn("Severity", "severity", "string"),
+    ExportColumn("Anomaly Score", "anomaly_score", "float64"),
+    ExportColumn("Log Data", "log_data", "string"),
+])
@@ -0,0 +1,299 @@
+import asyncio
+import hashlib
+import logging
+import os
+import socket
+import tempfile
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+from sqlalchemy import text
+from app.config import get_settings
+from app.database import engine
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+LOCK_NAME = "sentinelai:leader"
+
+
+class LeaderLock:
+    """A mutex that is released automatically if its holder dies."""
+
+    name = "base"
+
+    async def acquire(self) -> bool:
+        raise NotImplementedError
+
+    async def renew(self) -> bool:
+        """Confirm we still hold the lock; False means leadership was lost."""
+        raise NotImplementedError
+
+    async def release(self):
+        raise NotImplementedError
+
+    async def holder(self) -> Optional[str]:
+        return None
+
+
+class FileLock(LeaderLock):
+    """flock-based lock for single-host deployments (SQLite). The OS drops it when the process exits."""
+
+    name = "file"
+
+    def __init__(self, path: str):
+        self.path = path
+        self._fd: Optional[int] = None
+
+    async def acquire(self) -> bool:
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if fcntl:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+        except OSError:
+            os.close(fd)
+            return False
+        os.ftruncate(fd, 0)
+        os.write(fd, WORKER_ID.encode())
+        self._fd = fd
+        return True
+
+    async def renew(self) -> bool:
+        return self._fd is not None
+
+    async def release(self):
+        if self._fd is not None:
+            if fcntl:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+            os.close(self._fd)
+            self._fd = None
+
+    async def holder(self) -> Optional[str]:
+        try:
+            with open(self.path) as f:
+                return f.read().strip() or None
+        except OSError:
+            return None
+
+
+class PostgresAdvisoryLock(LeaderLock):
+    """Session-level pg advisory lock held on a dedicated connection; Postgres frees it if that connection dies.
+
+    The connection runs in autocommit, so it never sits idle in a transaction
+    for the whole tenure (holding back vacuum, or tripping
+    idle_in_transaction_session_timeout).
+    """
+
+    name = "postgres"
+
+    def __init__(self):
+        self.key = int.from_bytes(hashlib.sha1(LOCK_NAME.encode()).digest()[:8], "big", signed=True)
+        self._conn = None
+
+    async def acquire(self) -> bool:
+        conn = await engine.connect()
+        try:
+            await conn.execution_options(isolation_level="AUTOCOMMIT")
+            result = await conn.execute(text("SELECT pg_try_advisory_lock(:key)"), {"key": self.key})
+            if result.scalar():
+                await conn.execute(text("SELECT set_config('application_name', :name, false)"), {"name": f"sentinelai-leader {WORKER_ID}"})
+                self._conn = conn
+                return True
+        except Exception:
+            await conn.close()
+            raise
+        await conn.close()
+        return False
+
+    async def renew(self) -> bool:
+        if self._conn is None:
+            return False
+        try:
+            await self._conn.execute(text("SELECT 1"))
+            return True
+        except Exception:
+            await self.release()
+            return False
+
+    async def release(self):
+        if self._conn is not None:
+            try:
+                await self._conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": self.key})
+            except Exception:
+                pass
+            await self._conn.close()
+            self._conn = None
+
+    async def holder(self) -> Optional[str]:
+        # A bigint advisory key shows up in pg_locks split into classid (high) / objid (low)
+        unsigned = self.key & 0xFFFFFFFFFFFFFFFF
+        async with engine.connect() as conn:
+            result = await conn.execute(text(
+                "SELECT a.application_name FROM pg_locks l JOIN pg_stat_activity a ON a.pid = l.pid "
+                "WHERE l.locktype = 'advisory' AND l.granted AND l.objsubid = 1 "
+                "AND l.classid = :hi AND l.objid = :lo"
+            ), {"hi": unsigned >> 32, "lo": unsigned & 0xFFFFFFFF})
+            name = result.scalar()
+            return name.removeprefix("sentinelai-leader ") if name else None
+
+
+class RedisLock(LeaderLock):
+    """SET NX PX lock with a TTL; a dead leader's lock expires after `ttl_ms`."""
+
+    name = "redis"
+
+    _RENEW = "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('pexpire', KEYS[1], ARGV[2]) else return 0 end"
+    _RELEASE = "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) else return 0 end"
+
+    def __init__(self, url: str, ttl_ms: int, client=None):
+        if client is None:
+            import redis.asyncio as aioredis
+            client = aioredis.from_url(url, decode_responses=True)
+        self._client = client
+        self.ttl_ms = ttl_ms
+
+    async def acquire(self) -> bool:
+        return bool(await self._client.set(LOCK_NAME, WORKER_ID, nx=True, px=self.ttl_ms))
+
+    async def renew(self) -> bool:
+        return bool(await self._client.eval(self._RENEW, 1, LOCK_NAME, WORKER_ID, self.ttl_ms))
+
+    async def release(self):
+        await self._client.eval(self._RELEASE, 1, LOCK_NAME, WORKER_ID)
+
+    async def holder(self) -> Optional[str]:
+        return await self._client.get(LOCK_NAME)
+
+
+def create_lock(settings) -> LeaderLock:
+    backend = settings.LEADER_BACKEND
+    if backend == "auto":
+        if settings.REDIS_ENABLED:
+            backend = "redis"
+        elif settings.DATABASE_URL.startswith("postgresql"):
+            backend = "postgres"
+        else:
+            backend = "file"
+    if backend == "redis":
+        return RedisLock(settings.REDIS_URL, ttl_ms=settings.LEADER_TTL_SECONDS * 1000)
+    if backend == "postgres":
+        return PostgresAdvisoryLock()
+    if backend == "file":
+        return FileLock(settings.LEADER_LOCK_FILE or os.path.join(tempfile.gettempdir(), "sentinelai-leader.lock"))
+    raise ValueError(f"Unknown LEADER_BACKEND {backend!r}")
+
+
+class LeaderElector:
+    """Elects one process across all workers to run periodic jobs (simulator, model retraining, ...).
+
+    Every worker retries the lock each `renew_interval` seconds; the leader
+    renews it on the same cadence. Jobs registered with `add_job` run only
+    while this process leads and are cancelled as soon as leadership is lost,
+    so a crashed leader is replaced within about one TTL.
+    """
+
+    def __init__(self, renew_interval: int):
+        self.renew_interval = renew_interval
+        self.lock: Optional[LeaderLock] = None
+        self.is_leader = False
+        self.leader_since: Optional[float] = None
+        self.transitions = 0
+        self.holder: Optional[str] = None  # as of the last tick
+        self._jobs: List[Tuple[str, Callable[[], Awaitable[None]]]] = []
+        self._running: Dict[str, asyncio.Task] = {}
+        self._loop_task: Optional[asyncio.Task] = None
+
+    def add_job(self, name: str, factory: Callable[[], Awaitable[None]]):
+        self._jobs.append((name, factory))
+
+    @property
+    def running(self) -> bool:
+        return self._loop_task is not None
+
+    def may_run_jobs(self) -> bool:
+        """True when this process should do leader-only work (always, if election is not running)."""
+        return self.is_leader or not self.running
+
+    async def _tick(self):
+        try:
+            held = await self.lock.renew() if self.is_leader else await self.lock.acquire()
+        except Exception as e:
+            logger.warning(f"Leader lock ({self.lock.name}) check failed: {e}")
+            held = False
+        await self._refresh_holder(held)
+        if held and not self.is_leader:
+            self.is_leader = True
+            self.leader_since = time.time()
+            self.transitions += 1
+            logger.info(f"Worker {WORKER_ID} became leader ({self.lock.name} lock)")
+            for name, factory in self._jobs:
+                self._running[name] = asyncio.create_task(factory())
+        elif not held and self.is_leader:
+            logger.warning(f"Worker {WORKER_ID} lost leadership")
+            await self._stop_jobs()
+            self.is_leader = False
+            self.leader_since = None
+            self.transitions += 1
+
+    async def _refresh_holder(self, held: bool):
+        # Looked up once per tick, so /api/health never queries the lock backend
+        if held:
+            self.holder = WORKER_ID
+            return
+        try:
+            self.holder = await self.lock.holder()
+        except Exception:
+            self.holder = None
+
+    async def _stop_jobs(self):
+        tasks = list(self._running.values())
+        self._running.clear()
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.renew_interval)
+            await self._tick()
+
+    async def start(self, lock: Optional[LeaderLock] = None):
+        self.lock = lock or create_lock(settings)
+        await self._tick()
+        self._loop_task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._loop_task:
+            self._loop_task.cancel()
+            await asyncio.gather(self._loop_task, return_exceptions=True)
+            self._loop_task = None
+        await self._stop_jobs()
+        if self.is_leader:
+            try:
+                await self.lock.release()
+            except Exception as e:
+                logger.warning(f"Releasing leader lock failed: {e}")
+            self.is_leader = False
+            self.holder = None
+
+    def stats(self) -> dict:
+        return {
+            "backend": self.lock.name if self.lock else None,
+            "worker_id": WORKER_ID,
+            "is_leader": self.is_leader,
+            "leader": self.holder,
+            "leader_since": self.leader_since,
+            "transitions": self.transitions,
+            "jobs": sorted(self._running),
+        }
+
+
+leader = LeaderElector(renew_interval=settings.LEADER_RENEW_SECONDS)
@@ -0,0 +1,204 @@
+"""Student risk leaderboard served from per-college Fenwick trees.
+
+Benchmark against the old full-scan ranking: python -m bench.leaderboard
+(from backend/).
+"""
+import asyncio
+import logging
+import time
+from typing import Dict, Optional, Tuple
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+from app.config import get_settings
+from app.database import async_session
+from app.models import RiskScore, User
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+SCORE_STEP = 0.1  # risk scores are rounded to one decimal, so buckets of 0.1 rank exactly
+BUCKETS = int(100 / SCORE_STEP) + 1
+_PENDING_KEY = "leaderboard_pending"
+
+
+def _bucket(score: float) -> int:
+    return min(max(int(round(score / SCORE_STEP)), 0), BUCKETS - 1)
+
+
+class ScoreTree:
+    """Fenwick tree of student counts per score bucket, plus the score total for averages."""
+
+    __slots__ = ("tree", "count", "score_sum")
+
+    def __init__(self):
+        self.tree = [0] * (BUCKETS + 1)
+        self.count = 0
+        self.score_sum = 0.0
+
+    @classmethod
+    def build(cls, scores) -> "ScoreTree":
+        """Tree over `scores` in O(n + buckets), instead of one O(log buckets) add per score."""
+        tree = cls()
+        for score in scores:
+            tree.tree[_bucket(score) + 1] += 1
+            tree.count += 1
+            tree.score_sum += score
+        for i in range(1, BUCKETS + 1):
+            parent = i + (i & -i)
+            if parent <= BUCKETS:
+                tree.tree[parent] += tree.tree[i]
+        return tree
+
+    def add(self, bucket: int, score: float, sign: int = 1):
+        self.count += sign
+        self.score_sum += sign * score
+        i = bucket + 1
+        while i <= BUCKETS:
+            self.tree[i] += sign
+            i += i & -i
+
+    def below(self, bucket: int) -> int:
+        """Students in buckets lower than `bucket`."""
+        total, i = 0, bucket
+        while i > 0:
+            total += self.tree[i]
+            i -= i & -i
+        return total
+
+    def average(self) -> float:
+        return self.score_sum / self.count if self.count else 0.0
+
+
+class Leaderboard:
+    """In-memory student risk leaderboard, campus-wide and per college.
+
+    Rank (1 + students with a strictly lower score), percentile and average
+    cost O(log buckets) per request instead of loading every score. Scores
+    written through `record` are applied when their transaction commits, so
+    this worker's own writes show up immediately. Other workers' writes (and
+    anything else that touches risk_scores) are picked up by a full reload
+    every `resync_interval` seconds.
+    """
+
+    def __init__(self, resync_interval: float):
+        self.resync_interval = resync_interval
+        self.campus = ScoreTree()
+        self.colleges: Dict[str, ScoreTree] = {}
+        self.students: Dict[str, Tuple[str, float]] = {}  # user_id -> (college, score)
+        self.loaded_at: Optional[float] = None
+        self.reloads = 0
+        self.drift = 0
+        self._reloading: Optional[Dict[str, Tuple[str, float]]] = None
+        self._task: Optional[asyncio.Task] = None
+
+    # ──── Updates ────
+    def _set(self, user_id: str, college: str, score: float):
+        old = self.students.get(user_id)
+        if old is not None:
+            old_college, old_score = old
+            self.campus.add(_bucket(old_score), old_score, -1)
+            self.colleges[old_college].add(_bucket(old_score), old_score, -1)
+        self.students[user_id] = (college, score)
+        bucket = _bucket(score)
+        self.campus.add(bucket, score)
+        self.colleges.setdefault(college, ScoreTree()).add(bucket, score)
+
+    def record(self, session: Session, user_id: str, college: str, score: float):
+        """Queue a student's new score; it is applied when `session` commits."""
+        session.info.setdefault(_PENDING_KEY, {})[user_id] = (college, score)
+
+    def after_commit(self, session: Session):
+        pending = session.info.pop(_PENDING_KEY, None)
+        if not pending or self.loaded_at is None:
+            return
+        for user_id, (college, score) in pending.items():
+            self._set(user_id, college, score)
+        if self._reloading is not None:
+            # The reload's snapshot may predate this commit; scores are absolute, so replaying is safe
+            self._reloading.update(pending)
+
+    def after_rollback(self, session: Session):
+        session.info.pop(_PENDING_KEY, None)
+
+    # ──── Reads ────
+    def _tree(self, college: Optional[str]) -> ScoreTree:
+        return self.colleges.get(college, ScoreTree()) if college is not None else self.campus
+
+    def standing(self, user_id: str, college: Optional[str] = None) -> Optional[dict]:
+        """The student's rank among all students (or those of `college`); None if they have no score yet."""
+        entry = self.students.get(user_id)
+        if entry is None or (college is not None and entry[0] != college):
+            return None
+        tree = self._tree(college)
+        rank = tree.below(_bucket(entry[1])) + 1
+        return {
+            "rank": rank,
+            "total": tree.count,
+            "percentile": int(((tree.count - rank) / max(tree.count, 1)) * 100),
+            "score": entry[1],
+            "average": tree.average(),
+        }
+
+    def summary(self, college: Optional[str] = None) -> Tuple[int, float]:
+        """(students, average score), campus-wide or for one college."""
+        tree = self._tree(college)
+        return tree.count, tree.average()
+
+    # ──── Loading ────
+    async def reload(self):
+        self._reloading = {}
+        try:
+            async with async_session() as db:
+                result = await db.execute(
+                    select(RiskScore.user_id, User.college, RiskScore.current_score)
+                    .join(User, User.id == RiskScore.user_id)
+                    .where(User.role == "student")
+                )
+                students = {user_id: (college, score or 0.0) for user_id, college, score in result.all()}
+            students.update(self._reloading)
+        finally:
+            self._reloading = None
+        by_college: Dict[str, list] = {}
+        for college, score in students.values():
+            by_college.setdefault(college, []).append(score)
+        if self.loaded_at is not None:
+            self.drift = sum(1 for user_id, entry in students.items() if self.students.get(user_id) != entry)
+            self.drift += sum(1 for user_id in self.students if user_id not in students)
+        self.campus = ScoreTree.build(score for _, score in students.values())
+        self.colleges = {college: ScoreTree.build(scores) for college, scores in by_college.items()}
+        self.students = students
+        self.loaded_at = time.monotonic()
+        self.reloads += 1
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.resync_interval)
+            try:
+                await self.reload()
+            except Exception as e:
+                logger.error(f"Leaderboard reload failed: {e}")
+
+    async def start(self):
+        await self.reload()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def stats(self) -> dict:
+        return {
+            "students": self.campus.count,
+            "colleges": len(self.colleges),
+            "age_seconds": round(time.monotonic() - self.loaded_at, 1) if self.loaded_at else None,
+            "reloads": self.reloads,
+            "last_drift": self.drift,
+        }
+
+
+leaderboard = Leaderboard(resync_interval=settings.LEADERBOARD_RESYNC_SECONDS)
+
+event.listen(Session, "after_commit", leaderboard.after_commit)
+event.listen(Session, "after_rollback", leaderboard.after_rollback)
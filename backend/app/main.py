@@ -1,4 +1,3 @@
-import asyncio
 import logging
 import os
 import traceback
@@ -6,13 +5,25 @@ from contextlib import asynccontextmanager
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Request
 from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
-from slowapi import Limiter, _rate_limit_exceeded_handler
-from slowapi.util import get_remote_address
-from slowapi.errors import RateLimitExceeded
 
 from app.config import get_settings
-from app.database import create_tables
+from app.database import create_tables, pool_stats
 from app.websocket_manager import manager
+from app.rolling_window import rolling_windows
+from app.model_registry import model_registry
+from app.scoring_executor import scoring_executor
+from app.leader import leader
+from app.counters import admin_stats
+from app.leaderboard import leaderboard
+from app.alert_dedup import alert_aggregator
+from app.anomaly_buckets import bucket_cache
+from app.auth_cache import auth_cache
+from app.read_routing import read_routing
+from app.rate_limiter import RateLimitMiddleware, rate_limiter
+from app.password_hasher import PasswordHasherBusy, password_hasher
+from app.rollups import rollup_compactor
+from app.retention import log_retention
+from app.simulator import fleet_simulator, run_simulator
 from app.routers import (
     auth_router, logs_router, student_router, admin_router,
     devices_router, profiles_router, incidents_router, privacy_router,
@@ -22,14 +33,8 @@ settings = get_settings()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-limiter = Limiter(key_func=get_remote_address, default_limits=[settings.RATE_LIMIT])
-
-simulator_task = None
-
-
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    global simulator_task
     logger.info("SentinelAI starting up...")
     await create_tables()
     logger.info("Database tables created")
@@ -49,24 +54,35 @@ async def lifespan(app: FastAPI):
     except Exception as e:
         logger.warning(f"Auto-seed skipped: {e}")
 
-    # Start device simulator (skip in serverless environments)
+    await manager.start()
+    await model_registry.start()
+    await scoring_executor.start()
+    await password_hasher.start()
+    await admin_stats.start()
+    await leaderboard.start()
+    await alert_aggregator.start()
+
+    # Periodic jobs run only in the elected leader worker
+    leader.add_job("model-bootstrap", model_registry.bootstrap)
+    leader.add_job("rollup-compaction", rollup_compactor.run)
+    leader.add_job("log-retention", log_retention.run)
+    # Device simulator (skip in serverless environments)
     is_serverless = os.environ.get("VERCEL") or os.environ.get("AWS_LAMBDA_FUNCTION_NAME")
     if settings.SIMULATOR_ENABLED and not is_serverless:
-        from app.simulator import run_simulator
-        simulator_task = asyncio.create_task(
-            run_simulator(settings.SIMULATOR_INTERVAL_SECONDS)
-        )
-        logger.info("Device simulator started")
+        leader.add_job("simulator", lambda: run_simulator(settings.SIMULATOR_INTERVAL_SECONDS))
+    await leader.start()
 
     yield
 
     # Shutdown
-    if simulator_task:
-        simulator_task.cancel()
-        try:
-            await simulator_task
-        except asyncio.CancelledError:
-            pass
+    await leader.stop()
+    await alert_aggregator.stop()
+    await leaderboard.stop()
+    await admin_stats.stop()
+    await password_hasher.stop()
+    await scoring_executor.stop()
+    await manager.stop()
+    await model_registry.stop()
     logger.info("SentinelAI shutdown complete")
 
 
@@ -77,9 +93,12 @@ app = FastAPI(
     lifespan=lifespan,
 )
 
-# Rate limiting
-app.state.limiter = limiter
-app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
+
+@app.exception_handler(PasswordHasherBusy)
+async def password_hasher_busy_handler(request: Request, exc: PasswordHasherBusy):
+    return JSONResponse(
+        status_code=503, content={"detail": str(exc)}, headers={"Retry-After": str(exc.retry_after)}
+    )
 
 
 @app.exception_handler(Exception)
@@ -88,6 +107,10 @@ async def global_exception_handler(request: Request, exc: Exception):
     logger.error(traceback.format_exc())
     return JSONResponse(status_code=500, content={"detail": str(exc)})
 
+# Rate limiting (added before CORS so that 429 responses still carry CORS headers)
+if rate_limiter:
+    app.add_middleware(RateLimitMiddleware, limiter=rate_limiter)
+
 # CORS
 app.add_middleware(
     CORSMiddleware,
@@ -95,6 +118,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
 # Mount routers
@@ -116,18 +140,35 @@ async def health():
         "status": "healthy",
         "app": settings.APP_NAME,
         "websocket_connections": manager.connected_count,
+        "db_pool": pool_stats(),
+        "read_routing": read_routing.stats(),
+        "websocket": manager.stats(),
+        "rolling_window": rolling_windows.stats(),
+        "models": model_registry.stats(),
+        "scoring": scoring_executor.stats(),
+        "leader": leader.stats(),
+        "simulator": fleet_simulator.stats(),
+        "admin_stats": admin_stats.stats(),
+        "leaderboard": leaderboard.stats(),
+        "alert_dedup": alert_aggregator.stats(),
+        "anomaly_cache": bucket_cache.stats(),
+        "auth_cache": auth_cache.stats(),
+        "password_hasher": password_hasher.stats(),
+        "rate_limit": rate_limiter.stats() if rate_limiter else None,
+        "rollups": rollup_compactor.stats(),
+        "log_retention": log_retention.stats(),
     }
 
 
 @app.websocket("/ws/{user_id}")
 async def websocket_endpoint(websocket: WebSocket, user_id: str):
-    await manager.connect(websocket, user_id)
+    connection = await manager.connect(websocket, user_id)
     try:
         while True:
             data = await websocket.receive_text()
-            # Keep-alive / echo
+            # Keep-alive / echo (queued so it never interleaves with alert sends)
             if data == "ping":
-                await websocket.send_text("pong")
+                connection.send("pong", "pong")
     except WebSocketDisconnect:
         manager.disconnect(websocket, user_id)
     except Exception:
@@ -0,0 +1,444 @@
+import asyncio
+import hashlib
+import logging
+import os
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, NamedTuple, Optional, Set, Tuple
+from sqlalchemy import select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from app.config import get_settings
+from app.database import async_session, read_session
+from app.leader import leader
+from app.models import BehaviorLog, ModelRetrainCount, User
+from app.ai_engine import HAS_NUMPY, HAS_SKLEARN, features_from_rows, fit_isolation_forest
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+if HAS_SKLEARN:
+    import joblib
+
+
+class ModelEntry(NamedTuple):
+    key: str
+    version: int
+    model: object
+    trained_at: float
+    n_samples: int
+
+
+def user_key(user_id: str) -> str:
+    return f"user:{user_id}"
+
+
+def college_key(college: str) -> str:
+    return f"college:{college}"
+
+
+def _read_entry(path: str) -> Optional[ModelEntry]:
+    try:
+        return ModelEntry(**joblib.load(path))
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logger.warning(f"Skipping unreadable model file {path}: {e}")
+        return None
+
+
+class ModelRegistry:
+    """Fitted Isolation Forest models keyed by cohort (college, or user once they have enough history).
+
+    Training happens off the request path, on a single background thread of
+    the elected leader worker, after `retrain_after_logs` new logs for a cohort
+    or every `retrain_interval` seconds. Due cohorts wait in a queue of at most
+    `fit_queue_size` and are fitted one at a time, busiest first; the rest stay
+    counted and are picked up once there is room. A cohort with too few logs
+    to fit is held back until the missing logs have arrived. Every worker counts the logs it
+    ingests and adds them to `model_retrain_counts` each `reload_interval`;
+    the leader schedules fits from those shared totals, so logs ingested on
+    any worker count. Each fit produces a new version that is swapped in atomically and
+    written to `model_dir`; every worker polls that directory and loads newer
+    versions instead of refitting on its own. Request-path scoring only ever
+    sees fully fitted models.
+
+    College models are few and always loaded. Per-user models are loaded
+    lazily, the first time `entry_for` sees the user (the college model is
+    used until then), and at most `max_cached_user_models` stay in memory per
+    worker, least recently used first out. On disk, the leader keeps the
+    `max_user_models` most recently trained and deletes the rest; those users
+    fall back to their college model until their next refit.
+    """
+
+    def __init__(
+        self,
+        model_dir: str,
+        min_user_logs: int,
+        retrain_after_logs: int,
+        retrain_interval: int,
+        reload_interval: int,
+        max_training_samples: int,
+        max_user_models: int,
+        max_cached_user_models: int,
+        fit_queue_size: int,
+    ):
+        self.model_dir = model_dir
+        self.min_user_logs = min_user_logs
+        self.retrain_after_logs = retrain_after_logs
+        self.retrain_interval = retrain_interval
+        self.reload_interval = reload_interval
+        self.max_training_samples = max_training_samples
+        self.max_user_models = max_user_models
+        self.max_cached_user_models = max_cached_user_models
+        self.fit_queue_size = fit_queue_size
+        self.enabled = HAS_SKLEARN and HAS_NUMPY
+        self._models: Dict[str, ModelEntry] = {}  # college models
+        self._user_models: "OrderedDict[str, ModelEntry]" = OrderedDict()  # LRU of loaded per-user models
+        self._user_files: Dict[str, float] = {}  # per-user model path -> mtime, as of the last scan
+        self._loading: Set[str] = set()
+        self._loads: Set[asyncio.Task] = set()  # referenced until done, so a load is never collected mid-flight
+        self.lazy_loads = 0
+        self.evictions = 0
+        self.pruned = 0
+        self._unflushed: Dict[str, int] = {}  # logs counted here, not yet added to model_retrain_counts
+        self._queue: "OrderedDict[str, int]" = OrderedDict()  # cohort key -> logs counted, waiting for a fit
+        self._queued = asyncio.Event()
+        self._fitting: Optional[str] = None
+        self._fitter: Optional[asyncio.Task] = None
+        self._mtimes: Dict[str, float] = {}
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="model-train")
+        # Loads and file housekeeping, so they never queue behind a fit
+        self._io = ThreadPoolExecutor(max_workers=1, thread_name_prefix="model-io")
+        self._scheduler: Optional[asyncio.Task] = None
+
+    # ──── Request path ────
+    def entry_for(self, user_id: str, college: Optional[str]) -> Optional[ModelEntry]:
+        """Return the most specific fitted model for a user, or None to use the rules."""
+        key = user_key(user_id)
+        entry = self._user_models.get(key)
+        if entry is not None:
+            self._user_models.move_to_end(key)
+            return entry
+        path = self.path_for(key)
+        if path in self._user_files and key not in self._loading:
+            self._loading.add(key)
+            task = asyncio.get_running_loop().create_task(self._load_user_model(key, path))
+            self._loads.add(task)
+            task.add_done_callback(self._loads.discard)
+        return self._models.get(college_key(college)) if college else None
+
+    def _cache_user_model(self, entry: ModelEntry):
+        self._user_models[entry.key] = entry
+        self._user_models.move_to_end(entry.key)
+        while len(self._user_models) > self.max_cached_user_models:
+            self._user_models.popitem(last=False)
+            self.evictions += 1
+
+    async def _load_user_model(self, key: str, path: str):
+        try:
+            entry = await asyncio.get_running_loop().run_in_executor(self._io, _read_entry, path)
+            current = self._user_models.get(key)
+            if entry is not None and (current is None or entry.version > current.version):
+                self._cache_user_model(entry)
+                self.lazy_loads += 1
+        except Exception as e:
+            logger.error(f"Loading model {key} failed: {e}")
+        finally:
+            self._loading.discard(key)
+
+    def record_logs(self, user_id: str, college: Optional[str], count: int = 1):
+        """Count new logs against the user's cohorts; they reach the shared counts on the next flush."""
+        if not self.enabled:
+            return
+        keys = [user_key(user_id)] + ([college_key(college)] if college else [])
+        for key in keys:
+            self._unflushed[key] = self._unflushed.get(key, 0) + count
+
+    # ──── Shared retrain counts ────
+    async def flush_counts(self):
+        """Add this worker's counted logs to model_retrain_counts."""
+        counts, self._unflushed = self._unflushed, {}
+        if not counts:
+            return
+        try:
+            async with async_session() as db:
+                stmt = (postgresql if db.bind.dialect.name == "postgresql" else sqlite).insert(ModelRetrainCount)
+                stmt = stmt.on_conflict_do_update(
+                    index_elements=["key"], set_={"pending": ModelRetrainCount.pending + stmt.excluded.pending},
+                )
+                # Sorted so concurrent flushes lock rows in the same order
+                await db.execute(stmt, [{"key": key, "pending": counts[key]} for key in sorted(counts)])
+                await db.commit()
+        except Exception:
+            for key, count in counts.items():
+                self._unflushed[key] = self._unflushed.get(key, 0) + count
+            raise
+
+    async def schedule_due(self, minimum: int):
+        """Leader: queue a fit for the busiest cohorts with at least `minimum` logs counted since their last one."""
+        free = self.fit_queue_size - len(self._queue)
+        if free <= 0:
+            return
+        query = select(ModelRetrainCount.key, ModelRetrainCount.pending).where(ModelRetrainCount.pending >= minimum)
+        waiting = list(self._queue) + ([self._fitting] if self._fitting else [])
+        if waiting:
+            query = query.where(ModelRetrainCount.key.not_in(waiting))
+        async with async_session() as db:
+            result = await db.execute(query.order_by(ModelRetrainCount.pending.desc()).limit(free))
+            due = result.all()
+        for key, pending in due:
+            self.schedule(key, pending)
+
+    # ──── Training ────
+    def schedule(self, key: str, counted: int = 0) -> bool:
+        """Queue a fit of `key`; `counted` logs are taken off its shared count once the fit starts.
+
+        Returns False when the queue is full; the cohort's logs stay counted for a later schedule.
+        """
+        # Only the elected leader fits models; other workers pick them up from model_dir
+        if not self.enabled or not leader.may_run_jobs():
+            return False
+        if key in self._queue or key == self._fitting:
+            return True
+        if len(self._queue) >= self.fit_queue_size:
+            return False
+        self._queue[key] = counted
+        self._queued.set()
+        return True
+
+    async def _run_fits(self):
+        while True:
+            await self._queued.wait()
+            while self._queue:
+                key, counted = self._queue.popitem(last=False)
+                self._fitting = key
+                try:
+                    await self._train(key, counted)
+                finally:
+                    self._fitting = None
+            self._queued.clear()
+
+    async def _training_rows(self, key: str) -> list:
+        kind, _, ident = key.partition(":")
+        query = select(
+            BehaviorLog.permission_requested,
+            BehaviorLog.network_activity_level,
+            BehaviorLog.background_process_flag,
+            BehaviorLog.anomaly_flag,
+        )
+        if kind == "user":
+            query = query.where(BehaviorLog.user_id == ident)
+        else:
+            query = query.join(User, User.id == BehaviorLog.user_id).where(User.college == ident)
+        query = query.order_by(BehaviorLog.timestamp.desc()).limit(self.max_training_samples)
+        async with read_session() as db:
+            result = await db.execute(query)
+            return result.all()
+
+    async def _train(self, key: str, counted: int):
+        try:
+            rows = await self._training_rows(key)
+            min_rows = self.min_user_logs if key.startswith("user:") else 5
+            # Too few logs to fit: also take the shortfall off the count, so the
+            # cohort is not picked again until that many more logs have arrived
+            shortfall = max(0, min_rows - len(rows))
+            if counted or shortfall:
+                # Subtract rather than reset: logs flushed since the count was read still count
+                async with async_session() as db:
+                    await db.execute(
+                        update(ModelRetrainCount)
+                        .where(ModelRetrainCount.key == key)
+                        .values(pending=ModelRetrainCount.pending - counted - shortfall)
+                    )
+                    await db.commit()
+            if shortfall:
+                return
+
+            loop = asyncio.get_running_loop()
+            model = await loop.run_in_executor(self._executor, fit_isolation_forest, features_from_rows(rows))
+            previous = self._models.get(key) or self._user_models.get(key)
+            if previous is None and key.startswith("user:"):
+                # Not loaded here, but other workers may hold an older version: continue its numbering
+                previous = await loop.run_in_executor(self._io, _read_entry, self.path_for(key))
+            entry = ModelEntry(
+                key=key,
+                version=(previous.version + 1) if previous else 1,
+                model=model,
+                trained_at=time.time(),
+                n_samples=len(rows),
+            )
+            path, mtime = await loop.run_in_executor(self._io, self._persist, entry)
+            if key.startswith("user:"):
+                self._user_files[path] = mtime
+                self._cache_user_model(entry)
+            else:
+                self._models[key] = entry
+            logger.info(f"Trained model {key} v{entry.version} on {entry.n_samples} logs")
+        except Exception as e:
+            logger.error(f"Model training for {key} failed: {e}")
+
+    # ──── Persistence ────
+    def path_for(self, key: str) -> str:
+        kind = key.partition(":")[0]
+        digest = hashlib.sha1(key.encode()).hexdigest()
+        return os.path.join(self.model_dir, f"{kind}-{digest}.joblib")
+
+    def _persist(self, entry: ModelEntry) -> Tuple[str, float]:
+        os.makedirs(self.model_dir, exist_ok=True)
+        path = self.path_for(entry.key)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        joblib.dump(entry._asdict(), tmp_path)
+        os.replace(tmp_path, path)
+        mtime = os.path.getmtime(path)
+        if not entry.key.startswith("user:"):
+            self._mtimes[path] = mtime
+        return path, mtime
+
+    def _scan(self) -> Tuple[List[ModelEntry], Dict[str, float]]:
+        """Read college models other workers wrote since the last scan, and list the per-user model files."""
+        colleges, users = [], {}
+        if not os.path.isdir(self.model_dir):
+            return colleges, users
+        for name in os.listdir(self.model_dir):
+            path = os.path.join(self.model_dir, name)
+            try:
+                if name.endswith(".tmp"):
+                    # Left by a worker that died mid-write
+                    if time.time() - os.path.getmtime(path) > 3600:
+                        os.remove(path)
+                    continue
+                if not name.endswith(".joblib"):
+                    continue
+                if not name.startswith(("college-", "user-")):
+                    os.remove(path)  # unprefixed name from before per-user models were bounded; refit as needed
+                    continue
+                mtime = os.path.getmtime(path)
+            except FileNotFoundError:
+                continue  # removed by another worker meanwhile
+            if name.startswith("user-"):
+                users[path] = mtime
+                continue
+            if self._mtimes.get(path) == mtime:
+                continue
+            entry = _read_entry(path)
+            if entry is not None:
+                self._mtimes[path] = mtime
+                colleges.append(entry)
+        return colleges, users
+
+    async def reload(self):
+        colleges, users = await asyncio.get_running_loop().run_in_executor(self._io, self._scan)
+        loaded = 0
+        for entry in colleges:
+            current = self._models.get(entry.key)
+            if current is None or entry.version > current.version:
+                self._models[entry.key] = entry
+                loaded += 1
+        # Cached user models that were retrained elsewhere are reloaded; deleted ones are dropped
+        for key, entry in list(self._user_models.items()):
+            path = self.path_for(key)
+            if path not in users:
+                del self._user_models[key]
+            elif users[path] != self._user_files.get(path) and key not in self._loading:
+                self._loading.add(key)
+                await self._load_user_model(key, path)
+        self._user_files = users
+        if loaded:
+            logger.info(f"Loaded {loaded} updated models from {self.model_dir}")
+
+    def _prune(self, files: Dict[str, float]) -> List[str]:
+        """Delete all but the `max_user_models` most recently written per-user models."""
+        excess = sorted(files, key=files.get)[:max(0, len(files) - self.max_user_models)]
+        for path in excess:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        return excess
+
+    async def prune(self):
+        """Leader: bound the per-user models on disk. Removed users score with their college model until refit."""
+        if len(self._user_files) <= self.max_user_models:
+            return
+        files = dict(self._user_files)
+        pruned = await asyncio.get_running_loop().run_in_executor(self._io, self._prune, files)
+        for path in pruned:
+            self._user_files.pop(path, None)
+        self.pruned += len(pruned)
+        logger.info(f"Pruned {len(pruned)} per-user models beyond MODEL_MAX_USER_MODELS={self.max_user_models}")
+
+    # ──── Lifecycle ────
+    async def _run_scheduler(self):
+        last_retrain = time.monotonic()
+        while True:
+            await asyncio.sleep(self.reload_interval)
+            try:
+                await self.reload()
+                await self.flush_counts()
+                if leader.may_run_jobs():
+                    await self.prune()
+                    if time.monotonic() - last_retrain >= self.retrain_interval:
+                        last_retrain = time.monotonic()
+                        await self.schedule_due(1)
+                    else:
+                        await self.schedule_due(self.retrain_after_logs)
+            except Exception as e:
+                logger.error(f"Model scheduler error: {e}")
+
+    async def bootstrap(self):
+        """Fit a model for every college that has none yet. Runs as a leader job."""
+        if not self.enabled:
+            return
+        async with read_session() as db:
+            result = await db.execute(select(User.college).distinct())
+            colleges = [c for c in result.scalars().all() if c]
+        for college in colleges:
+            if college_key(college) not in self._models:
+                self.schedule(college_key(college))
+
+    async def start(self):
+        if not self.enabled:
+            logger.info("Model registry disabled (scikit-learn/numpy unavailable), using rule-based scoring")
+            return
+        await self.reload()
+        self._fitter = asyncio.create_task(self._run_fits())
+        self._scheduler = asyncio.create_task(self._run_scheduler())
+
+    async def stop(self):
+        tasks = [task for task in (self._scheduler, self._fitter) if task] + list(self._loads)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if self.enabled:
+            try:
+                await self.flush_counts()
+            except Exception as e:
+                logger.error(f"Final retrain count flush failed: {e}")
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "models": len(self._models),
+            "user_models_loaded": len(self._user_models),
+            "user_models_on_disk": len(self._user_files),
+            "lazy_loads": self.lazy_loads,
+            "evictions": self.evictions,
+            "pruned": self.pruned,
+            "training": self._fitting is not None,
+            "fits_queued": len(self._queue),
+            "unflushed_logs": sum(self._unflushed.values()),
+        }
+
+
+model_registry = ModelRegistry(
+    model_dir=settings.MODEL_DIR,
+    min_user_logs=settings.MODEL_MIN_USER_LOGS,
+    retrain_after_logs=settings.MODEL_RETRAIN_AFTER_LOGS,
+    retrain_interval=settings.MODEL_RETRAIN_INTERVAL_SECONDS,
+    reload_interval=settings.MODEL_RELOAD_INTERVAL_SECONDS,
+    max_training_samples=settings.MODEL_MAX_TRAINING_SAMPLES,
+    max_user_models=settings.MODEL_MAX_USER_MODELS,
+    max_cached_user_models=settings.MODEL_CACHED_USER_MODELS,
+    fit_queue_size=settings.MODEL_FIT_QUEUE_SIZE,
+)
@@ -1,7 +1,7 @@
 import uuid
 from datetime import datetime
 from sqlalchemy import (
-    Column, String, Boolean, Float, DateTime, ForeignKey, Text, Integer, JSON
+    Column, String, Boolean, Float, DateTime, ForeignKey, Text, Integer, JSON, Index, text, Date
 )
 from sqlalchemy.orm import relationship
 from app.database import Base
@@ -27,6 +27,17 @@ class User(Base):
     incidents = relationship("Incident", back_populates="user", cascade="all, delete-orphan")
     data_access_logs = relationship("DataAccessLog", back_populates="user", cascade="all, delete-orphan")
 
+    __table_args__ = (
+        # Keyset pagination of the admin user list
+        Index("ix_users_created_at_id", "created_at", "id"),
+        # User search: trigram indexes serve ILIKE '%x%' on Postgres,
+        # NOCASE indexes serve LIKE 'x%' on SQLite
+        Index("ix_users_name_trgm", "name", postgresql_using="gin", postgresql_ops={"name": "gin_trgm_ops"}).ddl_if(dialect="postgresql"),
+        Index("ix_users_email_trgm", "email", postgresql_using="gin", postgresql_ops={"email": "gin_trgm_ops"}).ddl_if(dialect="postgresql"),
+        Index("ix_users_name_nocase", text("name COLLATE NOCASE")).ddl_if(dialect="sqlite"),
+        Index("ix_users_email_nocase", text("email COLLATE NOCASE")).ddl_if(dialect="sqlite"),
+    )
+
 
 class Device(Base):
     __tablename__ = "devices"
@@ -66,19 +77,30 @@ class Alert(Base):
     __tablename__ = "alerts"
 
     id = Column(Integer, primary_key=True, autoincrement=True)
-    user_id = Column(String(36), ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
+    user_id = Column(String(36), ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
     alert_type = Column(String(100), nullable=False)
     severity = Column(String(20), nullable=False)
     message = Column(Text, nullable=False)
     explanation_text = Column(Text, nullable=True)
     recommendation = Column(Text, nullable=True)
     confidence_score = Column(Float, default=1.0)
-    created_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
     resolved = Column(Boolean, default=False)
+    # Deduplication key (with user_id and alert_type) and repeat tracking, see app/alert_dedup.py
+    device_id = Column(String(36), nullable=True)
+    app_name = Column(String(255), nullable=True)
+    occurrences = Column(Integer, nullable=False, default=1, server_default="1")
+    last_seen_at = Column(DateTime, default=datetime.utcnow)
 
     user = relationship("User", back_populates="alerts")
     incidents = relationship("Incident", back_populates="alert", cascade="all, delete-orphan")
 
+    __table_args__ = (
+        # A student's alerts, newest first (also serves the user_id foreign key and the
+        # dedup lookup of their alerts within the suppression window)
+        Index("ix_alerts_user_id_created_at", "user_id", "created_at"),
+    )
+
 
 class Incident(Base):
     __tablename__ = "incidents"
@@ -114,12 +136,14 @@ class IntegrationConfig(Base):
 
 
 class BehaviorLog(Base):
+    # On Postgres this is range-partitioned by month on timestamp, with primary
+    # key (id, timestamp); see migrations/versions/0004 and app/retention.py
     __tablename__ = "behavior_logs"
 
     id = Column(Integer, primary_key=True, autoincrement=True)
-    user_id = Column(String(36), ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
+    user_id = Column(String(36), ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
     device_id = Column(String(36), ForeignKey("devices.id", ondelete="CASCADE"), nullable=True, index=True)
-    timestamp = Column(DateTime, default=datetime.utcnow)
+    timestamp = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
     app_name = Column(String(255))
     permission_requested = Column(String(255))
     network_activity_level = Column(Float, default=0.0)
@@ -132,3 +156,63 @@ class BehaviorLog(Base):
     
     user = relationship("User", back_populates="behavior_logs")
     device = relationship("Device", back_populates="behavior_logs")
+
+    __table_args__ = (
+        # Per-user history in time order: recent logs, rolling windows, timeline, model training
+        # (also serves the user_id foreign key)
+        Index("ix_behavior_logs_user_id_timestamp", "user_id", "timestamp"),
+        # Anomalies are a small fraction of logs; per-user anomaly counts and lookups read only these
+        Index(
+            "ix_behavior_logs_anomalies", "user_id", "timestamp",
+            postgresql_where=anomaly_flag == True, sqlite_where=anomaly_flag == True,
+        ),
+    )
+
+
+class DailyRollup(Base):
+    """Per-day, per-college totals behind the admin trends chart (see app/rollups.py)."""
+    __tablename__ = "daily_rollups"
+    day = Column(Date, primary_key=True)
+    college = Column(String(255), primary_key=True)
+    log_count = Column(Integer, default=0, nullable=False)
+    anomaly_count = Column(Integer, default=0, nullable=False)
+    alert_count = Column(Integer, default=0, nullable=False)
+    risk_sum = Column(Float, default=0.0, nullable=False)  # sum / samples = average risk scored that day
+    risk_samples = Column(Integer, default=0, nullable=False)
+
+
+class BehaviorLogHourly(Base):
+    """Per-user, per-hour summary of behavior logs by app and permission (see app/retention.py)."""
+    __tablename__ = "behavior_log_hourly"
+    user_id = Column(String(36), ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    hour = Column(DateTime, primary_key=True)
+    app_name = Column(String(255), primary_key=True)  # "" for logs without one
+    permission_requested = Column(String(255), primary_key=True)
+    log_count = Column(Integer, default=0, nullable=False)
+    anomaly_count = Column(Integer, default=0, nullable=False)
+    high_severity_count = Column(Integer, default=0, nullable=False)
+    network_sum = Column(Float, default=0.0, nullable=False)
+    anomaly_score_sum = Column(Float, default=0.0, nullable=False)  # missing scores count as 0
+
+    __table_args__ = (
+        # The summarization watermark is max(hour)
+        Index("ix_behavior_log_hourly_hour", "hour"),
+    )
+
+
+class UserLogAggregate(Base):
+    """All-time per-user log totals by app and permission, kept current at ingest (see app/aggregates.py)."""
+    __tablename__ = "user_log_aggregates"
+    user_id = Column(String(36), ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    app_name = Column(String(255), primary_key=True)  # "" for logs without one
+    permission_requested = Column(String(255), primary_key=True)
+    log_count = Column(Integer, default=0, nullable=False)
+    anomaly_count = Column(Integer, default=0, nullable=False)
+    network_sum = Column(Float, default=0.0, nullable=False)
+
+
+class ModelRetrainCount(Base):
+    """New logs per model cohort since its last fit, summed over every worker (see app/model_registry.py)."""
+    __tablename__ = "model_retrain_counts"
+    key = Column(String(300), primary_key=True)  # "user:<id>" or "college:<name>"
+    pending = Column(Integer, default=0, nullable=False)
@@ -0,0 +1,126 @@
+"""bcrypt hashing and verification off the event loop.
+
+A bcrypt call is 100-250 ms of CPU at the default cost, so running it on
+the event loop stalls every other request and WebSocket on the worker.
+`password_hasher` runs it in a bounded pool instead. bcrypt releases the GIL,
+so `thread` mode already uses several cores; `process` isolates it
+completely at the price of a spawned interpreter per worker.
+
+At most `workers + max_queue` hashes are accepted at once. Past that,
+requests fail fast with 503 and Retry-After (see main.py) instead of
+queueing for longer than a client waits.
+
+Load test: python -m bench.password_hashing (from backend/).
+"""
+import asyncio
+import logging
+import math
+import multiprocessing
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Optional, Tuple
+from app.auth import hash_password, verify_and_update_password
+from app.config import get_settings
+from app.scoring_executor import LatencyHistogram
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+HASH_MODES = ("inline", "thread", "process")
+
+
+class PasswordHasherBusy(Exception):
+    """The hashing queue is full; the client should retry after `retry_after` seconds."""
+
+    def __init__(self, retry_after: int):
+        super().__init__("Too many logins in progress, try again shortly")
+        self.retry_after = retry_after
+
+
+class PasswordHasher:
+    """Bounded pool for `hash_password` and `verify_and_update_password`.
+
+    `inline` runs them on the calling coroutine (the previous behaviour), as
+    does any call made before `start` (scripts, seeding).
+    """
+
+    def __init__(self, mode: str, workers: int, max_queue: int):
+        if mode not in HASH_MODES:
+            raise ValueError(f"PASSWORD_HASH_EXECUTOR must be one of {', '.join(HASH_MODES)}, got {mode!r}")
+        self.mode = mode
+        self.workers = workers
+        self.max_queue = max_queue
+        self._pool: Optional[Executor] = None
+        self.in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+        self.rehashed = 0
+        self.latency = LatencyHistogram()
+
+    async def start(self):
+        if self.mode == "inline":
+            return
+        if self.mode == "process":
+            # spawn, not fork: the parent already runs the event loop and background threads
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers, mp_context=multiprocessing.get_context("spawn")
+            )
+        else:
+            self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="bcrypt")
+        logger.info(f"Password hasher started (mode={self.mode}, workers={self.workers}, rounds={settings.BCRYPT_ROUNDS})")
+
+    async def stop(self):
+        if self._pool:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def _retry_after(self) -> int:
+        # Time for the current backlog to drain at the observed mean latency
+        mean = self.latency.sum_ms / self.latency.total / 1000 if self.latency.total else 0.25
+        return max(1, math.ceil(self.in_flight * mean / self.workers))
+
+    async def _run(self, fn, *args):
+        started = time.perf_counter()
+        if self._pool is None:
+            result = fn(*args)
+        else:
+            if self.in_flight >= self.workers + self.max_queue:
+                self.rejected += 1
+                raise PasswordHasherBusy(self._retry_after())
+            self.in_flight += 1
+            try:
+                result = await asyncio.get_running_loop().run_in_executor(self._pool, fn, *args)
+            finally:
+                self.in_flight -= 1
+        self.latency.observe((time.perf_counter() - started) * 1000)
+        self.completed += 1
+        return result
+
+    async def hash(self, password: str) -> str:
+        return await self._run(hash_password, password)
+
+    async def verify(self, plain: str, hashed: str) -> Tuple[bool, Optional[str]]:
+        """(matches, new hash); store the new hash when set, it carries the current BCRYPT_ROUNDS."""
+        valid, new_hash = await self._run(verify_and_update_password, plain, hashed)
+        if new_hash:
+            self.rehashed += 1
+        return valid, new_hash
+
+    def stats(self) -> dict:
+        return {
+            "mode": self.mode,
+            "workers": self.workers,
+            "rounds": settings.BCRYPT_ROUNDS,
+            "in_flight": self.in_flight,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "rehashed": self.rehashed,
+            "latency": self.latency.snapshot(),
+        }
+
+
+password_hasher = PasswordHasher(
+    mode=settings.PASSWORD_HASH_EXECUTOR,
+    workers=settings.PASSWORD_HASH_WORKERS,
+    max_queue=settings.PASSWORD_HASH_MAX_QUEUE,
+)
@@ -0,0 +1,73 @@
+import time
+from typing import Optional
+from sqlalchemy import event, exc
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from app.scoring_executor import LatencyHistogram
+
+
+class MeteredQueuePool(AsyncAdaptedQueuePool):
+    """Queue pool that also times each checkout, since the pool events fire only once a connection is handed out."""
+
+    metrics: Optional["PoolMetrics"] = None
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            if self.metrics:
+                self.metrics.timeouts += 1
+            raise
+        finally:
+            if self.metrics:
+                self.metrics.wait.observe((time.perf_counter() - started) * 1000)
+
+    def recreate(self):
+        # engine.dispose() swaps in a fresh pool; keep counting into the same metrics
+        pool = super().recreate()
+        pool.metrics = self.metrics
+        return pool
+
+
+class PoolMetrics:
+    """Connection pool telemetry for one engine (per worker), fed by SQLAlchemy pool events."""
+
+    def __init__(self, engine: AsyncEngine):
+        self.engine = engine
+        self.connects = 0
+        self.checkouts = 0
+        self.overflow_checkouts = 0
+        self.timeouts = 0
+        self.invalidations = 0
+        self.wait = LatencyHistogram()
+        pool = engine.sync_engine.pool
+        pool.metrics = self
+        event.listen(pool, "connect", self._connect)
+        event.listen(pool, "checkout", self._checkout)
+        event.listen(pool, "invalidate", self._invalidate)
+
+    def _connect(self, dbapi_connection, connection_record):
+        self.connects += 1
+
+    def _checkout(self, dbapi_connection, connection_record, connection_proxy):
+        self.checkouts += 1
+        if self.engine.sync_engine.pool.overflow() > 0:
+            self.overflow_checkouts += 1
+
+    def _invalidate(self, dbapi_connection, connection_record, exception):
+        self.invalidations += 1
+
+    def stats(self) -> dict:
+        pool = self.engine.sync_engine.pool
+        return {
+            "size": pool.size(),
+            "checked_out": pool.checkedout(),
+            "overflow": max(pool.overflow(), 0),  # negative while the pool is still filling up
+            "connects": self.connects,
+            "checkouts": self.checkouts,
+            "overflow_checkouts": self.overflow_checkouts,
+            "timeouts": self.timeouts,
+            "invalidations": self.invalidations,
+            "wait": self.wait.snapshot(),
+        }
@@ -0,0 +1,111 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+try:
+    import redis.asyncio as aioredis
+    HAS_REDIS = True
+except ImportError:
+    HAS_REDIS = False
+
+MessageHandler = Callable[[str], Awaitable[None]]
+
+
+class PubSubBackend:
+    """Broadcasts payloads to every worker process subscribed to the same channel."""
+
+    name = "base"
+
+    async def start(self, handler: MessageHandler):
+        raise NotImplementedError
+
+    async def publish(self, payload: str):
+        raise NotImplementedError
+
+    async def stop(self):
+        pass
+
+
+class InMemoryBackend(PubSubBackend):
+    """Single-process backend: publishing hands the payload straight to the local subscriber."""
+
+    name = "memory"
+
+    def __init__(self):
+        self._handler: Optional[MessageHandler] = None
+
+    async def start(self, handler: MessageHandler):
+        self._handler = handler
+
+    async def publish(self, payload: str):
+        if self._handler:
+            await self._handler(payload)
+
+    async def stop(self):
+        self._handler = None
+
+
+class RedisBackend(PubSubBackend):
+    """Redis pub/sub backend so an alert raised on one uvicorn worker reaches sockets held by the others."""
+
+    name = "redis"
+
+    def __init__(self, url: str, channel: str, client=None):
+        if client is None and not HAS_REDIS:
+            raise RuntimeError("REDIS_ENABLED is set but the 'redis' package is not installed")
+        self.url = url
+        self.channel = channel
+        self._client = client
+        self._listener: Optional[asyncio.Task] = None
+
+    async def start(self, handler: MessageHandler):
+        if self._client is None:
+            self._client = aioredis.from_url(self.url, decode_responses=True)
+        self._listener = asyncio.create_task(self._listen(handler))
+
+    async def _listen(self, handler: MessageHandler):
+        backoff = 0.5
+        while True:
+            pubsub = self._client.pubsub()
+            try:
+                await pubsub.subscribe(self.channel)
+                logger.info(f"Subscribed to Redis channel {self.channel}")
+                backoff = 0.5
+                async for message in pubsub.listen():
+                    if message.get("type") != "message":
+                        continue
+                    try:
+                        await handler(message["data"])
+                    except Exception as e:
+                        logger.error(f"WebSocket fan-out handler failed: {e}")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Redis subscription lost ({e}), retrying in {backoff:.1f}s")
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 30)
+            finally:
+                try:
+                    await pubsub.aclose()
+                except Exception:
+                    pass
+
+    async def publish(self, payload: str):
+        await self._client.publish(self.channel, payload)
+
+    async def stop(self):
+        if self._listener:
+            self._listener.cancel()
+            await asyncio.gather(self._listener, return_exceptions=True)
+            self._listener = None
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+def create_backend(settings, channel: str) -> PubSubBackend:
+    if settings.REDIS_ENABLED:
+        return RedisBackend(settings.REDIS_URL, channel)
+    return InMemoryBackend()
@@ -0,0 +1,215 @@
+"""Query-plan regression check for the hot read paths.
+
+    python -m app.query_plans            # against DATABASE_URL
+    python -m app.query_plans --verbose  # print every plan
+
+Runs EXPLAIN (SQLite: EXPLAIN QUERY PLAN, Postgres: EXPLAIN (FORMAT JSON) with
+sequential scans disabled, so a seq scan only shows up when no index can
+serve the query) for each query below and exits non-zero if any of them
+reads one of the big tables with a full scan. On Postgres the queries in
+PRUNED_QUERIES are also run (EXPLAIN ANALYZE, so pruning at execution time
+counts) and fail if they read more than two monthly behavior_logs partitions:
+their time filter must compare the bare `timestamp` column, not a function
+of it. Brings the schema to head first, so it can run against an empty
+scratch database in CI.
+
+The queries mirror the ones the routers and background jobs run; keep them in
+sync when those change.
+"""
+import argparse
+import asyncio
+import json
+import re
+import sys
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Tuple
+from sqlalchemy import Select, func, select, text, and_, or_
+from app.database import create_tables, engine
+from app.aggregates import recomputed_totals
+from app.alert_dedup import open_alerts_query
+from app.anomaly_buckets import heatmap_query, timeline_query
+from app.retention import hourly_summary_query
+from app.models import (
+    Alert, BehaviorLog, BehaviorLogHourly, DailyRollup, Device, Incident, RiskScore, User, UserLogAggregate,
+)
+
+# Tables that grow with users × time; a full scan of any of these is a regression
+LARGE_TABLES = {
+    "users", "devices", "risk_scores", "alerts", "incidents",
+    "behavior_logs", "behavior_log_hourly", "daily_rollups", "user_log_aggregates",
+}
+
+PARTITION_NAME = re.compile(r"_(p\d{6}|default)$")
+
+USER_ID = "00000000-0000-0000-0000-000000000000"
+SINCE = datetime.utcnow() - timedelta(days=1)  # recent, so partition pruning matches real requests
+
+
+def _rolling_window_warm() -> Select:
+    ranked = (
+        select(
+            BehaviorLog.user_id, BehaviorLog.app_name,
+            func.row_number().over(partition_by=BehaviorLog.user_id, order_by=BehaviorLog.timestamp.desc()).label("rn"),
+        )
+        .where(BehaviorLog.user_id.in_([USER_ID, USER_ID[:-1] + "1"]))
+        .subquery()
+    )
+    return select(ranked).where(ranked.c.rn <= 50)
+
+
+def _all_users_page() -> Select:
+    return (
+        select(User.id)
+        .where(or_(User.created_at < SINCE, and_(User.created_at == SINCE, User.id < USER_ID)))
+        .order_by(User.created_at.desc(), User.id.desc())
+        .limit(100)
+    )
+
+
+HOT_QUERIES: Dict[str, Callable[[], Select]] = {
+    "auth: user by email": lambda: select(User).where(User.email == "student@example.edu"),
+    "deps: current user": lambda: select(User).where(User.id == USER_ID),
+    "logs: recent logs": lambda: (
+        select(BehaviorLog).where(BehaviorLog.user_id == USER_ID).order_by(BehaviorLog.timestamp.desc()).limit(50)
+    ),
+    "logs: my alerts": lambda: (
+        select(Alert).where(Alert.user_id == USER_ID).order_by(Alert.created_at.desc()).limit(50)
+    ),
+    "alerts: dedup lookup": lambda: (
+        open_alerts_query([USER_ID, USER_ID[:-1] + "1"], ["high_risk_behavior"], datetime.utcnow() - timedelta(minutes=10))
+    ),
+    "logs: risk score": lambda: select(RiskScore).where(RiskScore.user_id == USER_ID),
+    "devices: my devices": lambda: select(Device).where(Device.user_id == USER_ID),
+    "anomalies: 24h timeline": lambda: timeline_query(USER_ID, SINCE, 1, engine.dialect.name),
+    "anomalies: 90-day heatmap": lambda: heatmap_query(USER_ID, SINCE - timedelta(days=89), engine.dialect.name),
+    "student: log aggregates": lambda: select(UserLogAggregate).where(UserLogAggregate.user_id == USER_ID),
+    "aggregates: rebuild one user": lambda: recomputed_totals(engine.dialect.name, [USER_ID]),
+    "retention: summary watermark": lambda: select(func.max(BehaviorLogHourly.hour)),
+    "retention: summarize an hour": lambda: (
+        hourly_summary_query(engine.dialect.name, SINCE.replace(minute=0, second=0, microsecond=0),
+                       SINCE.replace(minute=0, second=0, microsecond=0) + timedelta(hours=1))
+    ),
+    "incidents: my incidents": lambda: (
+        select(Incident).where(Incident.user_id == USER_ID).order_by(Incident.created_at.desc())
+    ),
+    "admin: activity feed": lambda: select(Alert).order_by(Alert.created_at.desc()).limit(50),
+    "admin: all-users page": _all_users_page,
+    "admin: trends": lambda: (
+        select(DailyRollup.day, func.sum(DailyRollup.alert_count))
+        .where(DailyRollup.day >= SINCE.date() - timedelta(days=13), DailyRollup.day <= SINCE.date())
+        .group_by(DailyRollup.day)
+    ),
+    "admin: export-logs range": lambda: (
+        select(BehaviorLog.id, BehaviorLog.timestamp)
+        .where(BehaviorLog.timestamp >= SINCE, BehaviorLog.timestamp < SINCE + timedelta(days=1))
+        .order_by(BehaviorLog.timestamp, BehaviorLog.id)
+    ),
+    "rolling window: warm": _rolling_window_warm,
+    "model registry: user training set": lambda: (
+        select(BehaviorLog.app_name).where(BehaviorLog.user_id == USER_ID).order_by(BehaviorLog.timestamp.desc()).limit(5000)
+    ),
+}
+
+# Time-bounded reads of behavior_logs; on Postgres each must skip the other months' partitions
+PRUNED_QUERIES = {
+    "retention: summarize an hour",
+    "admin: export-logs range",
+    "aggregates: rebuild one user",
+    "anomalies: 24h timeline",
+    "anomalies: 90-day heatmap",
+}
+MAX_PARTITIONS = 2  # a range may straddle a month boundary, or reach the DEFAULT partition
+
+
+def _sqlite_scans(rows) -> Tuple[List[str], str]:
+    # Rows are (id, parent, notused, detail); "SCAN users" is a table scan,
+    # "SCAN users USING [COVERING] INDEX ..." walks an index
+    details = [row[3] for row in rows]
+    scans = []
+    for detail in details:
+        words = detail.split()
+        if words[:1] == ["SCAN"] and "USING" not in words:
+            table = words[2] if words[1] == "TABLE" else words[1]
+            if table in LARGE_TABLES:
+                scans.append(table)
+    return scans, "\n".join(details)
+
+
+def _postgres_scans(plan) -> Tuple[List[str], str]:
+    scans = []
+
+    def walk(node):
+        # Partitions (behavior_logs_p202610, behavior_logs_default) count as their parent table
+        table = PARTITION_NAME.sub("", node.get("Relation Name", ""))
+        # With seq scans disabled the planner may instead walk a whole index and filter every row
+        full_index_walk = "Index" in node.get("Node Type", "") and "Filter" in node and "Index Cond" not in node
+        if (node.get("Node Type") == "Seq Scan" or full_index_walk) and table in LARGE_TABLES:
+            scans.append(table)
+        for child in node.get("Plans", []):
+            walk(child)
+
+    walk(plan[0]["Plan"])
+    return scans, json.dumps(plan, indent=2)
+
+
+def _partitions_read(plan) -> List[str]:
+    """behavior_logs partitions an EXPLAIN ANALYZE plan actually read (pruned ones are absent or never executed).
+
+    Partitions created ahead for future months are empty, and an open-ended
+    range ("since the watermark") rightly includes them, so they are left out.
+    """
+    read = set()
+    this_month = f"behavior_logs_p{datetime.utcnow():%Y%m}"  # sorts after _default and every earlier month
+
+    def walk(node):
+        name = node.get("Relation Name", "")
+        if name.startswith("behavior_logs_") and PARTITION_NAME.search(name) and name <= this_month and node.get("Actual Loops", 1):
+            read.add(name)
+        for child in node.get("Plans", []):
+            walk(child)
+
+    walk(plan[0]["Plan"])
+    return sorted(read)
+
+
+async def check_plans(verbose: bool = False) -> List[Tuple[str, List[str]]]:
+    """EXPLAIN every hot query; return (name, full-scanned tables) for the ones that regressed."""
+    failures = []
+    async with engine.connect() as conn:
+        dialect = conn.dialect
+        if dialect.name == "postgresql":
+            await conn.execute(text("SET enable_seqscan = off"))
+        for name, build in HOT_QUERIES.items():
+            sql = str(build().compile(dialect=dialect, compile_kwargs={"literal_binds": True}))
+            if dialect.name == "postgresql":
+                plan = (await conn.execute(text(f"EXPLAIN (FORMAT JSON) {sql}"))).scalar()
+                scans, shown = _postgres_scans(plan if isinstance(plan, list) else json.loads(plan))
+            else:
+                scans, shown = _sqlite_scans((await conn.execute(text(f"EXPLAIN QUERY PLAN {sql}"))).all())
+            print(f"{'FULL SCAN' if scans else 'ok':9}  {name}" + (f"  ({', '.join(sorted(set(scans)))})" if scans else ""))
+            if verbose:
+                print("    " + shown.replace("\n", "\n    "))
+            if scans:
+                failures.append((name, scans))
+            elif dialect.name == "postgresql" and name in PRUNED_QUERIES:
+                plan = (await conn.execute(text(f"EXPLAIN (ANALYZE, FORMAT JSON) {sql}"))).scalar()
+                read = _partitions_read(plan if isinstance(plan, list) else json.loads(plan))
+                if len(read) > MAX_PARTITIONS:
+                    print(f"{'NO PRUNE':9}  {name}  ({', '.join(read)})")
+                    failures.append((name, read))
+    return failures
+
+
+async def main(verbose: bool) -> int:
+    await create_tables()
+    failures = await check_plans(verbose)
+    await engine.dispose()
+    print(f"{len(HOT_QUERIES) - len(failures)}/{len(HOT_QUERIES)} hot queries use an index"
+          + (" and prune partitions" if engine.dialect.name == "postgresql" else ""))
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fail if a hot query's plan falls back to a full table scan")
+    parser.add_argument("--verbose", action="store_true", help="print each query plan")
+    sys.exit(asyncio.run(main(parser.parse_args().verbose)))
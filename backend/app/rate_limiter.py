@@ -0,0 +1,282 @@
+"""Token-bucket rate limiting for the API, shared by every worker.
+
+Requests are keyed by the authenticated user id, or by client address for
+anonymous requests. X-Forwarded-For is only believed when the connection
+comes from one of TRUSTED_PROXIES (nginx): the client is then the last hop
+that is not itself a trusted proxy. Anyone else gets the socket address, so
+a client reaching a worker directly cannot rotate the header for a fresh
+bucket. Ingest
+(RATE_LIMIT_INGEST) and all other endpoints (RATE_LIMIT) draw from separate
+buckets. A limit of "60/minute" is a bucket of 60 tokens refilled at one per
+second, so bursts up to the limit pass and the sustained rate is the limit.
+
+Backends:
+    redis  one bucket per key in Redis, updated by a Lua script (one round trip)
+    local  a table of buckets in a memory-mapped file that all workers on the
+           host share, guarded by flock; for single-host deployments
+
+Micro-benchmark of the per-request overhead: python -m bench.rate_limit
+(from backend/).
+"""
+import hashlib
+import ipaddress
+import logging
+import mmap
+import os
+import struct
+import tempfile
+import time
+from functools import lru_cache
+from typing import Dict, Optional, Tuple
+from app.auth_cache import auth_cache
+from app.config import get_settings
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+try:
+    import fcntl
+except ImportError:  # Windows: the table is used unlocked, so racing workers may admit a few extra requests
+    fcntl = None
+
+PERIODS = {"second": 1, "minute": 60, "hour": 3600, "day": 86400}
+INGEST_PATHS = ("/api/logs", "/api/logs/batch")
+EXEMPT_PATHS = ("/api/health",)
+TRUSTED_PROXIES = tuple(
+    ipaddress.ip_network(entry.strip(), strict=False) for entry in settings.TRUSTED_PROXIES.split(",") if entry.strip()
+)
+
+
+def parse_rate(rate: str) -> Tuple[float, float]:
+    """'60/minute' -> (capacity 60 tokens, refill 1 token per second)."""
+    try:
+        count, period = rate.replace(" per ", "/").split("/")
+        seconds = PERIODS[period.strip().rstrip("s")]
+        count = float(count)
+    except (KeyError, ValueError):
+        raise ValueError(f"Rate limits look like '60/minute' (second, minute, hour or day), got {rate!r}")
+    return count, count / seconds
+
+
+class BucketBackend:
+    name = "base"
+
+    async def take(self, key: str, capacity: float, refill: float) -> float:
+        """Take one token from `key`'s bucket: 0 if allowed, else seconds until a token is available."""
+        raise NotImplementedError
+
+    def stats(self) -> dict:
+        return {}
+
+
+class LocalBuckets(BucketBackend):
+    """Open-addressed table of (key hash, tokens, last update) slots in a file mapped by every worker on the host.
+
+    Timestamps use CLOCK_MONOTONIC, which all processes on a host share. When
+    a key's probe window is full, the slot idle the longest is taken over; its
+    bucket had the most time to refill anyway.
+    """
+
+    name = "local"
+    SLOT = struct.Struct("<Qdd")
+    PROBES = 8
+
+    def __init__(self, path: str, slots: int):
+        self.path = path
+        self.slots = slots
+        size = slots * self.SLOT.size
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        if os.fstat(self._fd).st_size < size:
+            os.ftruncate(self._fd, size)  # zero-filled: every slot starts empty
+        self._map = mmap.mmap(self._fd, size)
+        self.evictions = 0
+
+    @staticmethod
+    def _hash(key: str) -> int:
+        # Stable across processes (unlike hash()); 0 marks an empty slot
+        return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "little") or 1
+
+    async def take(self, key: str, capacity: float, refill: float) -> float:
+        key_hash = self._hash(key)
+        start = key_hash % self.slots
+        slot_size, unpack_from, pack_into, data = self.SLOT.size, self.SLOT.unpack_from, self.SLOT.pack_into, self._map
+        if fcntl:
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            now = time.monotonic()
+            victim, victim_seen = None, None
+            for probe in range(self.PROBES):
+                offset = ((start + probe) % self.slots) * slot_size
+                slot_hash, tokens, updated = unpack_from(data, offset)
+                if slot_hash == key_hash:
+                    tokens = min(capacity, tokens + max(now - updated, 0.0) * refill)  # clock restarts at boot
+                    break
+                if slot_hash == 0:
+                    tokens = capacity
+                    break
+                if victim_seen is None or updated < victim_seen:
+                    victim, victim_seen = offset, updated
+            else:
+                offset, tokens = victim, capacity
+                self.evictions += 1
+            if tokens >= 1:
+                pack_into(data, offset, key_hash, tokens - 1, now)
+                return 0.0
+            pack_into(data, offset, key_hash, tokens, now)
+            return (1 - tokens) / refill
+        finally:
+            if fcntl:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def stats(self) -> dict:
+        return {"slots": self.slots, "evictions": self.evictions}
+
+
+class RedisBuckets(BucketBackend):
+    """Buckets as Redis hashes; the script refills and takes atomically, on the Redis clock."""
+
+    name = "redis"
+    _TAKE = """
+local capacity, refill = tonumber(ARGV[1]), tonumber(ARGV[2])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(bucket[1]) or capacity
+if bucket[2] then tokens = math.min(capacity, tokens + math.max(0, now - tonumber(bucket[2])) * refill) end
+local wait = 0
+if tokens >= 1 then tokens = tokens - 1 else wait = (1 - tokens) / refill end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacity / refill * 1000))
+return tostring(wait)
+"""
+
+    def __init__(self, url: str, client=None):
+        if client is None:
+            import redis.asyncio as aioredis
+            client = aioredis.from_url(url, decode_responses=True)
+        self._client = client
+        self._script = client.register_script(self._TAKE)
+
+    async def take(self, key: str, capacity: float, refill: float) -> float:
+        return float(await self._script(keys=[f"sentinelai:ratelimit:{key}"], args=[capacity, refill]))
+
+
+def create_backend(settings) -> BucketBackend:
+    backend = settings.RATE_LIMIT_BACKEND
+    if backend == "auto":
+        backend = "redis" if settings.REDIS_ENABLED else "local"
+    if backend == "redis":
+        return RedisBuckets(settings.REDIS_URL)
+    if backend == "local":
+        path = settings.RATE_LIMIT_FILE or os.path.join(tempfile.gettempdir(), "sentinelai-ratelimit.bin")
+        return LocalBuckets(path, settings.RATE_LIMIT_TABLE_SLOTS)
+    raise ValueError(f"Unknown RATE_LIMIT_BACKEND {backend!r}")
+
+
+class RateLimiter:
+    def __init__(self, backend: BucketBackend, limits: Dict[str, str]):
+        self.backend = backend
+        self.limits = {bucket: parse_rate(rate) for bucket, rate in limits.items()}
+        self.allowed: Dict[str, int] = {bucket: 0 for bucket in limits}
+        self.limited: Dict[str, int] = {bucket: 0 for bucket in limits}
+        self.errors = 0
+        self._warned_at = 0.0
+
+    async def take(self, bucket: str, identity: str) -> float:
+        """0 if the request may proceed, else seconds to wait. Fails open if the backend is unreachable."""
+        capacity, refill = self.limits[bucket]
+        try:
+            wait = await self.backend.take(f"{bucket}:{identity}", capacity, refill)
+        except Exception as e:
+            self.errors += 1
+            if time.monotonic() - self._warned_at > 60:
+                self._warned_at = time.monotonic()
+                logger.warning(f"Rate limiter backend {self.backend.name} failed, letting requests through: {e}")
+            return 0.0
+        if wait:
+            self.limited[bucket] += 1
+        else:
+            self.allowed[bucket] += 1
+        return wait
+
+    def stats(self) -> dict:
+        return {
+            "backend": self.backend.name,
+            "allowed": dict(self.allowed),
+            "limited": dict(self.limited),
+            "errors": self.errors,
+            **self.backend.stats(),
+        }
+
+
+def _header(scope, name: bytes) -> Optional[bytes]:
+    for key, value in scope["headers"]:
+        if key == name:
+            return value
+    return None
+
+
+@lru_cache(maxsize=4096)
+def is_trusted_proxy(address: str) -> bool:
+    try:
+        ip = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    return any(ip in network for network in TRUSTED_PROXIES)
+
+
+def client_address(scope) -> str:
+    """The client's address: the socket peer, or the X-Forwarded-For hop nearest to it when the peer is a trusted proxy."""
+    client = scope.get("client")
+    address = client[0] if client else "unknown"
+    if not is_trusted_proxy(address):
+        return address
+    forwarded = _header(scope, b"x-forwarded-for")
+    if not forwarded:
+        return address
+    hops = [hop.strip() for hop in forwarded.decode("latin-1").split(",") if hop.strip()]
+    # Walk back past our own proxies; hops further left are whatever the client chose to send
+    for hop in reversed(hops):
+        if not is_trusted_proxy(hop):
+            return hop
+    return hops[0] if hops else address
+
+
+def client_identity(scope) -> str:
+    """'user:<id>' for a valid access token, else 'ip:<address>'."""
+    authorization = _header(scope, b"authorization")
+    if authorization and authorization[:7].lower() == b"bearer ":
+        payload = auth_cache.decode(authorization[7:].decode("latin-1"))
+        if payload and payload.get("type") == "access" and payload.get("sub"):
+            return f"user:{payload['sub']}"
+    return f"ip:{client_address(scope)}"
+
+
+class RateLimitMiddleware:
+    """ASGI middleware answering 429 with Retry-After once a client's bucket is empty."""
+
+    def __init__(self, app, limiter: "RateLimiter"):
+        self.app = app
+        self.limiter = limiter
+
+    async def __call__(self, scope, receive, send):
+        path = scope.get("path", "")
+        if scope["type"] != "http" or not path.startswith("/api/") or path in EXEMPT_PATHS:
+            return await self.app(scope, receive, send)
+        bucket = "ingest" if scope["method"] == "POST" and path in INGEST_PATHS else "api"
+        wait = await self.limiter.take(bucket, client_identity(scope))
+        if not wait:
+            return await self.app(scope, receive, send)
+        retry_after = str(max(1, int(wait + 0.999)))
+        await send({
+            "type": "http.response.start",
+            "status": 429,
+            "headers": [(b"content-type", b"application/json"), (b"retry-after", retry_after.encode())],
+        })
+        await send({"type": "http.response.body", "body": b'{"detail":"Rate limit exceeded"}'})
+
+
+rate_limiter = RateLimiter(
+    create_backend(settings),
+    {"api": settings.RATE_LIMIT, "ingest": settings.RATE_LIMIT_INGEST},
+) if settings.RATE_LIMIT_ENABLED else None
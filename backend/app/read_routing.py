@@ -0,0 +1,92 @@
+"""Read-your-writes guard for the read/write session split.
+
+Read-only endpoints take their session from `deps.get_read_db`, which reads
+from the replica (DATABASE_READ_URL) or the SQLite read pool. A replica
+trails the primary, so right after a user's own ingest their reads would
+miss the logs they just sent. Ingest calls `read_routing.mark_written` once
+it has committed, and for READ_YOUR_WRITES_SECONDS afterwards that user's
+reads go to the primary instead.
+
+Marks are kept per worker, and also in Redis when REDIS_ENABLED, so a read
+landing on another worker sees them too.
+"""
+import logging
+import time
+from typing import Dict, Optional
+from app.config import get_settings
+from app.database import engine, read_engine
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+try:
+    import redis.asyncio as aioredis
+    HAS_REDIS = True
+except ImportError:
+    HAS_REDIS = False
+
+_KEY_PREFIX = "sentinelai:wrote:"
+
+
+class ReadRouter:
+    def __init__(self, window: float, redis_url: Optional[str] = None):
+        self.window = window
+        self.enabled = read_engine is not engine
+        self.recent: Dict[str, float] = {}  # user_id -> monotonic deadline
+        self._redis = aioredis.from_url(redis_url, decode_responses=True) if redis_url and HAS_REDIS else None
+        self._sweep_at = 1000
+        self.primary_reads = 0
+        self.replica_reads = 0
+
+    async def mark_written(self, user_id: str):
+        """Send `user_id`'s reads to the primary for the next `window` seconds. Call after the commit."""
+        if not self.enabled:
+            return
+        now = time.monotonic()
+        self.recent[user_id] = now + self.window
+        if len(self.recent) >= self._sweep_at:
+            self.recent = {uid: deadline for uid, deadline in self.recent.items() if deadline > now}
+            self._sweep_at = max(1000, 2 * len(self.recent))
+        if self._redis is not None:
+            try:
+                await self._redis.set(_KEY_PREFIX + user_id, 1, px=int(self.window * 1000))
+            except Exception as e:
+                logger.warning(f"Read-your-writes mark for {user_id} not shared: {e}")
+
+    async def wrote_recently(self, user_id: str) -> bool:
+        deadline = self.recent.get(user_id)
+        if deadline is not None:
+            if deadline > time.monotonic():
+                return True
+            del self.recent[user_id]
+        if self._redis is not None:
+            try:
+                return bool(await self._redis.exists(_KEY_PREFIX + user_id))
+            except Exception as e:
+                logger.warning(f"Read-your-writes check failed, reading from the primary: {e}")
+                return True
+        return False
+
+    async def use_primary(self, user_id: str) -> bool:
+        """Whether this user's read must go to the primary."""
+        primary = not self.enabled or await self.wrote_recently(user_id)
+        if primary:
+            self.primary_reads += 1
+        else:
+            self.replica_reads += 1
+        return primary
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "replica": "DATABASE_READ_URL" if settings.DATABASE_READ_URL else ("sqlite read pool" if self.enabled else None),
+            "recent_writers": len(self.recent),
+            "primary_reads": self.primary_reads,
+            "replica_reads": self.replica_reads,
+        }
+
+
+read_routing = ReadRouter(
+    window=settings.READ_YOUR_WRITES_SECONDS,
+    redis_url=settings.REDIS_URL if settings.REDIS_ENABLED else None,
+)
@@ -0,0 +1,195 @@
+import asyncio
+import logging
+from datetime import date, datetime, timedelta, timezone
+from typing import List, Optional
+from sqlalchemy import and_, case, delete, func, insert, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.config import get_settings
+from app.database import async_session, engine
+from app.models import BehaviorLog, BehaviorLogHourly
+from app.rollups import hour_bucket
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+SUMMARY_GRACE = timedelta(minutes=5)  # let in-flight inserts for an hour commit before it is summarized
+SUMMARY_CHUNK = timedelta(days=1)  # hours summarized per transaction when catching up
+DELETE_BATCH = 10000
+HIGH_SEVERITIES = ("high", "critical")
+
+
+def utc_now() -> datetime:
+    # Log timestamps are stored as naive UTC
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def _month_start(value) -> date:
+    return date(value.year, value.month, 1)
+
+
+def _add_months(month: date, months: int) -> date:
+    index = month.month - 1 + months
+    return date(month.year + index // 12, index % 12 + 1, 1)
+
+
+def _partition_name(month: date) -> str:
+    return f"behavior_logs_p{month:%Y%m}"
+
+
+async def summarized_until(db: AsyncSession) -> Optional[datetime]:
+    """Logs before this are counted in behavior_log_hourly; from it on only in behavior_logs."""
+    last = (await db.execute(select(func.max(BehaviorLogHourly.hour)))).scalar()
+    return last + timedelta(hours=1) if last else None
+
+
+def hourly_summary_query(dialect_name: str, start: datetime, end: datetime):
+    """behavior_log_hourly rows for logs in [start, end). Bucket in the select, filter on the bare column (partition pruning)."""
+    hour = hour_bucket(BehaviorLog.timestamp, dialect_name)
+    app = func.coalesce(BehaviorLog.app_name, "")
+    permission = func.coalesce(BehaviorLog.permission_requested, "")
+    return (
+        select(
+            BehaviorLog.user_id, hour, app, permission,
+            func.count(BehaviorLog.id),
+            func.count(case((BehaviorLog.anomaly_flag == True, 1))),
+            func.count(case((and_(BehaviorLog.anomaly_flag == True, BehaviorLog.severity.in_(HIGH_SEVERITIES)), 1))),
+            func.coalesce(func.sum(BehaviorLog.network_activity_level), 0.0),
+            func.coalesce(func.sum(BehaviorLog.anomaly_score), 0.0),
+        )
+        .where(BehaviorLog.timestamp >= start, BehaviorLog.timestamp < end)
+        .group_by(BehaviorLog.user_id, hour, app, permission)
+    )
+
+
+class LogRetention:
+    """Leader job: summarize completed hours of behavior logs, keep future partitions
+    ready (Postgres) and drop whole months of summarized raw logs past the retention.
+    """
+
+    def __init__(self, interval: float, retention_days: int, partitions_ahead: int):
+        self.interval = interval
+        self.retention_days = retention_days
+        self.partitions_ahead = partitions_ahead
+        self.last_run: Optional[str] = None
+        self.summarized_until: Optional[str] = None
+        self.summary_rows = 0
+        self.expired_months: List[str] = []
+
+    async def summarize(self, until: datetime) -> int:
+        """Summarize hours from the watermark up to `until` (an hour boundary), a day per transaction."""
+        async with async_session() as db:
+            start = await summarized_until(db)
+            if start is None:
+                oldest = (await db.execute(select(func.min(BehaviorLog.timestamp)))).scalar()
+                if oldest is None:
+                    return 0
+                start = oldest.replace(minute=0, second=0, microsecond=0)
+        columns = [
+            "user_id", "hour", "app_name", "permission_requested", "log_count",
+            "anomaly_count", "high_severity_count", "network_sum", "anomaly_score_sum",
+        ]
+        rows = 0
+        while start < until:
+            end = min(start + SUMMARY_CHUNK, until)
+            async with async_session() as db:
+                query = hourly_summary_query(db.bind.dialect.name, start, end)
+                result = await db.execute(insert(BehaviorLogHourly).from_select(columns, query))
+                await db.commit()
+            rows += max(result.rowcount, 0)
+            start = end
+        return rows
+
+    async def ensure_partitions(self):
+        """Create this month's and the next `partitions_ahead` months' partitions (Postgres only)."""
+        month = _month_start(utc_now())
+        for offset in range(self.partitions_ahead + 1):
+            lower = _add_months(month, offset)
+            upper = _add_months(lower, 1)
+            try:
+                async with engine.begin() as conn:
+                    await conn.execute(text(
+                        f"CREATE TABLE IF NOT EXISTS {_partition_name(lower)} PARTITION OF behavior_logs "
+                        f"FOR VALUES FROM ('{lower.isoformat()}') TO ('{upper.isoformat()}')"
+                    ))
+            except Exception as e:
+                # e.g. the DEFAULT partition already holds rows for that month
+                logger.error(f"Could not create partition {_partition_name(lower)}: {e}")
+
+    async def expire(self, dialect_name: str) -> List[str]:
+        """Drop raw logs in months that ended before the retention window and are fully summarized."""
+        async with async_session() as db:
+            watermark = await summarized_until(db)
+        if watermark is None:
+            return []
+        cutoff = min(_month_start(utc_now() - timedelta(days=self.retention_days)), _month_start(watermark))
+
+        expired = []
+        if dialect_name == "postgresql":
+            async with engine.begin() as conn:
+                result = await conn.execute(text(
+                    "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+                    "WHERE i.inhparent = 'behavior_logs'::regclass"
+                ))
+                partitions = sorted(name for (name,) in result.all() if name.startswith("behavior_logs_p"))
+            for name in partitions:
+                month = date(int(name[-6:-2]), int(name[-2:]), 1)
+                if _add_months(month, 1) > cutoff:
+                    break
+                async with engine.begin() as conn:
+                    await conn.execute(text(f"ALTER TABLE behavior_logs DETACH PARTITION {name}"))
+                    await conn.execute(text(f"DROP TABLE {name}"))
+                expired.append(f"{month:%Y-%m}")
+
+        # SQLite keeps one table; on Postgres this only reaches rows that landed in the DEFAULT partition.
+        # Batches keep write locks short.
+        boundary = datetime.combine(cutoff, datetime.min.time())
+        while True:
+            async with async_session() as db:
+                batch = select(BehaviorLog.id).where(BehaviorLog.timestamp < boundary).limit(DELETE_BATCH)
+                result = await db.execute(delete(BehaviorLog).where(BehaviorLog.id.in_(batch)))
+                await db.commit()
+            if result.rowcount and not expired:
+                expired.append(f"before {cutoff:%Y-%m}")
+            if result.rowcount < DELETE_BATCH:
+                break
+        return expired
+
+    async def run_once(self):
+        now = utc_now()
+        until = (now - SUMMARY_GRACE).replace(minute=0, second=0, microsecond=0)
+        self.summary_rows = await self.summarize(until)
+        dialect_name = engine.dialect.name
+        if dialect_name == "postgresql":
+            await self.ensure_partitions()
+        expired = await self.expire(dialect_name)
+        if expired:
+            self.expired_months = expired
+            logger.info(f"Dropped expired behavior logs: {', '.join(expired)}")
+        async with async_session() as db:
+            watermark = await summarized_until(db)
+        self.summarized_until = watermark.isoformat() if watermark else None
+        self.last_run = datetime.now(timezone.utc).isoformat()
+
+    async def run(self):
+        while True:
+            try:
+                await self.run_once()
+            except Exception as e:
+                logger.error(f"Behavior log retention failed: {e}")
+            await asyncio.sleep(self.interval)
+
+    def stats(self) -> dict:
+        return {
+            "last_run": self.last_run,
+            "summarized_until": self.summarized_until,
+            "last_summary_rows": self.summary_rows,
+            "last_expired": self.expired_months,
+            "retention_days": self.retention_days,
+        }
+
+
+log_retention = LogRetention(
+    interval=settings.LOG_SUMMARY_INTERVAL_SECONDS,
+    retention_days=settings.LOG_RETENTION_DAYS,
+    partitions_ahead=settings.LOG_PARTITIONS_AHEAD,
+)
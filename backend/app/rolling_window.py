@@ -0,0 +1,247 @@
+import time
+import logging
+from collections import OrderedDict, deque
+from typing import Deque, Dict, Iterable, List, NamedTuple, Optional
+from sqlalchemy import event, select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from app.config import get_settings
+from app.models import BehaviorLog
+from app.ai_engine import LogAggregate
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+_STAGED_KEY = "rolling_window_staged"
+
+
+def log_features(log) -> dict:
+    """Project a BehaviorLog (ORM object, row or request) onto the fields the AI engine scores."""
+    return {
+        "permission_requested": log.permission_requested,
+        "network_activity_level": log.network_activity_level,
+        "background_process_flag": log.background_process_flag,
+        "anomaly_flag": log.anomaly_flag,
+    }
+
+
+class WindowSnapshot(NamedTuple):
+    logs: List[dict]
+    aggregate: LogAggregate
+
+
+class _Window:
+    __slots__ = ("logs", "aggregate", "warmed_at", "touched_at")
+
+    def __init__(self, logs: Deque[dict]):
+        now = time.monotonic()
+        self.logs = logs
+        self.aggregate = LogAggregate.from_logs(logs)
+        self.warmed_at = now
+        self.touched_at = now
+
+    def extend(self, new_logs: Iterable[dict]):
+        for log in new_logs:
+            if len(self.logs) == self.logs.maxlen:
+                self.aggregate.remove(self.logs[0])
+            self.logs.append(log)
+            self.aggregate.add(log)
+
+    def snapshot(self, extra_logs: Iterable[dict] = ()) -> WindowSnapshot:
+        """Copy of the window, as it would be with `extra_logs` appended; the window itself is untouched."""
+        logs = deque(self.logs, maxlen=self.logs.maxlen)
+        aggregate = self.aggregate.copy()
+        for log in extra_logs:
+            if len(logs) == logs.maxlen:
+                aggregate.remove(logs[0])
+            logs.append(log)
+            aggregate.add(log)
+        return WindowSnapshot(list(logs), aggregate)
+
+
+class _Staged:
+    """One user's uncommitted logs in a session: appended to the live window on commit.
+
+    `cold` is a window warmed inside the transaction; it already holds the
+    session's flushed rows, so it is only installed once they are committed.
+    """
+
+    __slots__ = ("cold", "logs")
+
+    def __init__(self, cold: Optional[_Window] = None):
+        self.cold = cold
+        self.logs: List[dict] = []
+
+
+class RollingWindowStore:
+    """Per-user ring buffers of the most recent behavior logs, used for risk recomputation.
+
+    Windows are warmed lazily from the database the first time a user is seen
+    and kept current by every insert that goes through `record`. Appends are
+    staged on the session and reach the shared window only when the
+    transaction commits, so a rolled-back ingest leaves no trace. Idle users
+    are evicted in LRU order once `max_users` is reached, and a window is
+    re-warmed after `refresh_seconds` so writes landing on other workers are
+    eventually picked up.
+    """
+
+    def __init__(self, window_size: int, max_users: int, idle_seconds: int, refresh_seconds: int):
+        self.window_size = window_size
+        self.max_users = max_users
+        self.idle_seconds = idle_seconds
+        self.refresh_seconds = refresh_seconds
+        self._windows: "OrderedDict[str, _Window]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _lookup(self, user_id: str) -> _Window | None:
+        window = self._windows.get(user_id)
+        if window is None:
+            return None
+        now = time.monotonic()
+        if now - window.touched_at > self.idle_seconds or now - window.warmed_at > self.refresh_seconds:
+            del self._windows[user_id]
+            return None
+        window.touched_at = now
+        self._windows.move_to_end(user_id)
+        return window
+
+    def _insert(self, user_id: str, window: _Window):
+        self._windows[user_id] = window
+        self._windows.move_to_end(user_id)
+        while len(self._windows) > self.max_users:
+            self._windows.popitem(last=False)
+            self.evictions += 1
+
+    async def _warm(self, db: AsyncSession, user_id: str) -> _Window:
+        result = await db.execute(
+            select(
+                BehaviorLog.permission_requested,
+                BehaviorLog.network_activity_level,
+                BehaviorLog.background_process_flag,
+                BehaviorLog.anomaly_flag,
+            )
+            .where(BehaviorLog.user_id == user_id)
+            .order_by(BehaviorLog.timestamp.desc())
+            .limit(self.window_size)
+        )
+        rows = result.all()
+        window = _Window(deque((log_features(r) for r in reversed(rows)), maxlen=self.window_size))
+        self._insert(user_id, window)
+        return window
+
+    async def _warm_many(self, db: AsyncSession, user_ids: List[str]) -> Dict[str, _Window]:
+        """Read several windows with one windowed query instead of one query per user (not cached here)."""
+        ranked = (
+            select(
+                BehaviorLog.user_id,
+                BehaviorLog.permission_requested,
+                BehaviorLog.network_activity_level,
+                BehaviorLog.background_process_flag,
+                BehaviorLog.anomaly_flag,
+                func.row_number().over(
+                    partition_by=BehaviorLog.user_id,
+                    order_by=BehaviorLog.timestamp.desc(),
+                ).label("rn"),
+            )
+            .where(BehaviorLog.user_id.in_(user_ids))
+            .subquery()
+        )
+        result = await db.execute(
+            select(ranked).where(ranked.c.rn <= self.window_size).order_by(ranked.c.user_id, ranked.c.rn.desc())
+        )
+        logs: Dict[str, List[dict]] = {user_id: [] for user_id in user_ids}
+        for row in result.all():
+            logs[row.user_id].append(log_features(row))
+        return {user_id: _Window(deque(user_logs, maxlen=self.window_size)) for user_id, user_logs in logs.items()}
+
+    async def get(self, db: AsyncSession, user_id: str) -> WindowSnapshot:
+        """Return the user's current window (oldest first) and its running aggregate."""
+        window = self._lookup(user_id)
+        if window is None:
+            self.misses += 1
+            window = await self._warm(db, user_id)
+        else:
+            self.hits += 1
+        return window.snapshot()
+
+    def _staged(self, db: AsyncSession) -> Dict[str, _Staged]:
+        return db.sync_session.info.setdefault(_STAGED_KEY, {})
+
+    def _preview(self, user_id: str, staged: _Staged) -> Optional[WindowSnapshot]:
+        if staged.cold is not None:
+            return staged.cold.snapshot()
+        window = self._lookup(user_id)
+        return window.snapshot(staged.logs) if window is not None else None
+
+    async def record(self, db: AsyncSession, user_id: str, new_logs: Iterable[dict]) -> WindowSnapshot:
+        """Stage freshly flushed logs for the user's window and return the window including them.
+
+        The rows must already be flushed on `db`: a cold window is warmed from
+        the database, which then includes them, so they are not appended twice.
+        """
+        return (await self.record_many(db, {user_id: list(new_logs)}))[user_id]
+
+    async def record_many(self, db: AsyncSession, new_logs: Dict[str, List[dict]]) -> Dict[str, WindowSnapshot]:
+        """`record` for many users at once; cold windows are warmed in a single query."""
+        staged = self._staged(db)
+        snapshots, cold = {}, []
+        for user_id, logs in new_logs.items():
+            entry = staged.setdefault(user_id, _Staged())
+            if entry.cold is not None:
+                entry.cold.extend(logs)
+            else:
+                entry.logs.extend(logs)
+            snapshot = self._preview(user_id, entry)
+            if snapshot is None:
+                cold.append(user_id)
+            else:
+                snapshots[user_id] = snapshot
+        self.hits += len(snapshots)
+        self.misses += len(cold)
+        if cold:
+            for user_id, window in (await self._warm_many(db, cold)).items():
+                staged[user_id] = _Staged(cold=window)
+                snapshots[user_id] = window.snapshot()
+        return snapshots
+
+    def after_commit(self, session: Session):
+        staged: Dict[str, _Staged] = session.info.pop(_STAGED_KEY, None)
+        if not staged:
+            return
+        for user_id, entry in staged.items():
+            window = self._windows.get(user_id)
+            if entry.cold is not None:
+                if window is None:
+                    self._insert(user_id, entry.cold)
+                else:
+                    # Warmed elsewhere meanwhile, without these rows: re-read it next time
+                    self.invalidate(user_id)
+            elif window is not None:
+                window.extend(entry.logs)
+
+    def after_rollback(self, session: Session):
+        session.info.pop(_STAGED_KEY, None)
+
+    def invalidate(self, user_id: str):
+        self._windows.pop(user_id, None)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "users": len(self._windows),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+rolling_windows = RollingWindowStore(
+    window_size=settings.ROLLING_WINDOW_SIZE,
+    max_users=settings.ROLLING_WINDOW_MAX_USERS,
+    idle_seconds=settings.ROLLING_WINDOW_IDLE_SECONDS,
+    refresh_seconds=settings.ROLLING_WINDOW_REFRESH_SECONDS,
+)
+
+event.listen(Session, "after_commit", rolling_windows.after_commit)
+event.listen(Session, "after_rollback", rolling_windows.after_rollback)
@@ -0,0 +1,268 @@
+import asyncio
+import logging
+from datetime import date, datetime, time as dt_time, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import select, func, case, cast, Date, Integer
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.config import get_settings
+from app.database import async_session
+from app.models import Alert, BehaviorLog, DailyRollup, RiskScore, User
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+COUNT_FIELDS = ("log_count", "anomaly_count", "alert_count")
+RISK_FIELDS = ("risk_sum", "risk_samples")
+
+
+def utc_today() -> date:
+    return datetime.now(timezone.utc).date()
+
+
+def day_bucket(column, dialect_name: str):
+    """Truncate a timestamp column to its UTC day, in SQL."""
+    if dialect_name == "sqlite":
+        return func.date(column)
+    return cast(column, Date)
+
+
+def hour_bucket(column, dialect_name: str):
+    """Truncate a timestamp column to the start of its hour, in SQL."""
+    if dialect_name == "sqlite":
+        # Same text format SQLAlchemy stores SQLite DateTimes in, so stored buckets compare correctly
+        return func.strftime("%Y-%m-%d %H:00:00.000000", column)
+    return func.date_trunc("hour", column)
+
+
+def next_hour(value, dialect_name: str):
+    """The start of the hour after an `hour_bucket` value, in SQL; compare the bare timestamp column against it."""
+    if dialect_name == "sqlite":
+        return func.strftime("%Y-%m-%d %H:00:00.000000", value, "+1 hour")
+    return value + func.make_interval(0, 0, 0, 0, 1)
+
+
+def time_bucket(column, dialect_name: str, hours: int):
+    """Truncate a timestamp column to the start of its `hours`-wide bucket (`hours` divides 24), in SQL."""
+    if hours == 1:
+        return hour_bucket(column, dialect_name)
+    start_hour = (hour_of_day(column, dialect_name) // hours) * hours
+    if dialect_name == "sqlite":
+        return func.strftime("%Y-%m-%d ", column).concat(func.printf("%02d:00:00.000000", start_hour))
+    return func.date_trunc("day", column) + func.make_interval(0, 0, 0, 0, start_hour)
+
+
+def hour_of_day(column, dialect_name: str):
+    """The UTC hour (0-23) of a timestamp column, in SQL."""
+    if dialect_name == "sqlite":
+        return cast(func.strftime("%H", column), Integer)
+    return cast(func.extract("hour", column), Integer)
+
+
+def _as_date(value) -> date:
+    return date.fromisoformat(value) if isinstance(value, str) else value
+
+
+def _insert(dialect_name: str):
+    return (postgresql if dialect_name == "postgresql" else sqlite).insert(DailyRollup)
+
+
+async def _upsert(db: AsyncSession, rows: List[dict], add: Tuple[str, ...], replace: Tuple[str, ...] = ()):
+    """Insert rollup rows, adding `add` columns to and overwriting `replace` columns of existing rows."""
+    if not rows:
+        return
+    stmt = _insert(db.bind.dialect.name)
+    set_ = {name: getattr(DailyRollup, name) + getattr(stmt.excluded, name) for name in add}
+    set_.update({name: getattr(stmt.excluded, name) for name in replace})
+    await db.execute(stmt.on_conflict_do_update(index_elements=["day", "college"], set_=set_), rows)
+
+
+def rollup_row(college: str, day: Optional[date] = None, **values) -> dict:
+    row = {"day": day or utc_today(), "college": college}
+    for name in COUNT_FIELDS + RISK_FIELDS:
+        row[name] = values.get(name, 0)
+    return row
+
+
+async def record_rollups(db: AsyncSession, rows: List[dict]):
+    """Add ingest-path increments (from `rollup_row`) to today's rollups, in the caller's transaction."""
+    merged: Dict[tuple, dict] = {}
+    for row in rows:
+        key = (row["day"], row["college"])
+        if key in merged:
+            for name in COUNT_FIELDS + RISK_FIELDS:
+                merged[key][name] += row[name]
+        else:
+            merged[key] = dict(row)
+    # Same row order as compaction's locks, so the two cannot deadlock
+    rows = [merged[key] for key in sorted(merged, key=lambda k: (k[0], k[1] or ""))]
+    await _upsert(db, rows, add=COUNT_FIELDS + RISK_FIELDS)
+
+
+async def _claim(db: AsyncSession, start: date, end: date):
+    """Create and lock the rollup rows ingest may still be adding to, until this transaction ends.
+
+    Ingest increments wait for the recount instead of being overwritten by it.
+    On SQLite the first write takes the database write lock, which does the same.
+    """
+    result = await db.execute(select(User.college).where(User.college.isnot(None)).distinct())
+    colleges = sorted(result.scalars().all())
+    days = [start + timedelta(days=i) for i in range((end - start).days + 1)]
+    if colleges:
+        stmt = _insert(db.bind.dialect.name).on_conflict_do_nothing(index_elements=["day", "college"])
+        await db.execute(stmt, [rollup_row(college, day) for day in days for college in colleges])
+    await db.execute(
+        select(DailyRollup.day)
+        .where(DailyRollup.day >= start, DailyRollup.day <= end)
+        .order_by(DailyRollup.day, DailyRollup.college)
+        .with_for_update()
+    )
+
+
+async def _recount(start: date, end: date, claim: bool) -> int:
+    lo = datetime.combine(start, dt_time.min)
+    hi = datetime.combine(end + timedelta(days=1), dt_time.min)
+    async with async_session() as db:
+        dialect = db.bind.dialect.name
+        if claim:
+            await _claim(db, start, end)
+        log_day = day_bucket(BehaviorLog.timestamp, dialect)
+        result = await db.execute(
+            select(
+                log_day.label("day"), User.college,
+                func.count(BehaviorLog.id),
+                func.count(case((BehaviorLog.anomaly_flag == True, 1))),
+            )
+            .join(User, User.id == BehaviorLog.user_id)
+            .where(BehaviorLog.timestamp >= lo, BehaviorLog.timestamp < hi)
+            .group_by(log_day, User.college)
+        )
+        rows: Dict[tuple, dict] = {}
+        for day, college, logs, anomalies in result.all():
+            rows[(_as_date(day), college)] = rollup_row(college, _as_date(day), log_count=logs, anomaly_count=anomalies)
+
+        alert_day = day_bucket(Alert.created_at, dialect)
+        result = await db.execute(
+            select(alert_day.label("day"), User.college, func.count(Alert.id))
+            .join(User, User.id == Alert.user_id)
+            .where(Alert.created_at >= lo, Alert.created_at < hi)
+            .group_by(alert_day, User.college)
+        )
+        for day, college, alerts in result.all():
+            key = (_as_date(day), college)
+            rows.setdefault(key, rollup_row(college, key[0]))["alert_count"] = alerts
+
+        await _upsert(db, list(rows.values()), add=RISK_FIELDS, replace=COUNT_FIELDS)
+        await db.commit()
+    return len(rows)
+
+
+async def compact(start: date, end: date) -> int:
+    """Recount logs, anomalies and alerts for [start, end] from the source tables.
+
+    Fixes drift from writes that bypass `record_rollups` (seeding, other code paths).
+    Risk averages cannot be recomputed (only current scores are stored), so
+    those columns are left as accumulated. Ingest only adds to today's rows
+    (yesterday's, for a transaction spanning midnight), so those are recounted
+    under a row lock; older days are recounted without one.
+    """
+    settled_end = min(end, utc_today() - timedelta(days=2))
+    rows = 0
+    if start <= settled_end:
+        rows += await _recount(start, settled_end, claim=False)
+    if end > settled_end:
+        rows += await _recount(max(start, settled_end + timedelta(days=1)), end, claim=True)
+    return rows
+
+
+async def trend_rows(db: AsyncSession, start: date, end: date, college: Optional[str] = None) -> List[dict]:
+    """One entry per day in [start, end]: counts summed over colleges, average risk carried forward over gaps."""
+    query = (
+        select(
+            DailyRollup.day,
+            func.sum(DailyRollup.alert_count),
+            func.sum(DailyRollup.anomaly_count),
+            func.sum(DailyRollup.risk_sum),
+            func.sum(DailyRollup.risk_samples),
+        )
+        .where(DailyRollup.day >= start, DailyRollup.day <= end)
+        .group_by(DailyRollup.day)
+    )
+    if college:
+        query = query.where(DailyRollup.college == college)
+    result = await db.execute(query)
+    by_day = {_as_date(day): (alerts, anomalies, risk_sum, samples) for day, alerts, anomalies, risk_sum, samples in result.all()}
+
+    # Seed the carried average from the last scored day before the range, else today's scores
+    prior = (
+        select(func.sum(DailyRollup.risk_sum) / func.sum(DailyRollup.risk_samples))
+        .where(DailyRollup.day < start, DailyRollup.risk_samples > 0)
+        .group_by(DailyRollup.day)
+        .order_by(DailyRollup.day.desc())
+        .limit(1)
+    )
+    current = select(func.avg(RiskScore.current_score))
+    if college:
+        prior = prior.where(DailyRollup.college == college)
+        current = current.join(User, User.id == RiskScore.user_id).where(User.college == college)
+    avg_risk = (await db.execute(prior)).scalar()
+    if avg_risk is None:
+        avg_risk = (await db.execute(current)).scalar() or 0
+
+    points = []
+    day = start
+    while day <= end:
+        alerts, anomalies, risk_sum, samples = by_day.get(day, (0, 0, 0.0, 0))
+        if samples:
+            avg_risk = risk_sum / samples
+        points.append({
+            "day": day,
+            "avg_risk_score": round(float(avg_risk), 1),
+            "alert_count": int(alerts or 0),
+            "anomaly_count": int(anomalies or 0),
+        })
+        day += timedelta(days=1)
+    return points
+
+
+class RollupCompactor:
+    """Leader job: recount the recent rollup window every night (and backfill an empty table at startup)."""
+
+    def __init__(self, window_days: int, backfill_days: int, retention_days: int):
+        self.window_days = window_days
+        # Raw logs past the retention are gone: recounting those days would zero their rollups
+        self.backfill_days = min(backfill_days, retention_days)
+        self.last_run: Optional[str] = None
+        self.last_rows = 0
+
+    async def run_once(self):
+        today = utc_today()
+        async with async_session() as db:
+            # Ingest may already have created today's rows, so only history counts
+            result = await db.execute(select(DailyRollup.day).where(DailyRollup.day < today).limit(1))
+            empty = result.first() is None
+        days = self.backfill_days if empty else self.window_days
+        self.last_rows = await compact(today - timedelta(days=days - 1), today)
+        self.last_run = datetime.now(timezone.utc).isoformat()
+        logger.info(f"Compacted daily rollups for the last {days} days ({self.last_rows} rows)")
+
+    async def run(self):
+        while True:
+            try:
+                await self.run_once()
+            except Exception as e:
+                logger.error(f"Daily rollup compaction failed: {e}")
+            # Next run shortly after UTC midnight, once yesterday is complete
+            now = datetime.now(timezone.utc)
+            next_run = datetime.combine(now.date() + timedelta(days=1), dt_time(0, 5), tzinfo=timezone.utc)
+            await asyncio.sleep((next_run - now).total_seconds())
+
+    def stats(self) -> dict:
+        return {"last_run": self.last_run, "rows": self.last_rows}
+
+
+rollup_compactor = RollupCompactor(
+    window_days=settings.ROLLUP_COMPACTION_DAYS,
+    backfill_days=settings.ROLLUP_BACKFILL_DAYS,
+    retention_days=settings.LOG_RETENTION_DAYS,
+)
@@ -1,12 +1,10 @@
-from fastapi import APIRouter, Depends, Query
-from fastapi.responses import StreamingResponse
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func, case, and_
-from sqlalchemy.orm import selectinload
-from typing import List
-from datetime import datetime, timezone, timedelta
-import csv
-import io
+from sqlalchemy import select, func, case, and_, or_
+from typing import List, Optional
+from datetime import date, datetime, timezone, timedelta
+import base64
+import json
 
 from app.database import get_db
 from app.models import User, RiskScore, Alert, BehaviorLog
@@ -14,7 +12,10 @@ from app.schemas import (
     AdminStatsResponse, HighRiskUserResponse,
     ActivityFeedItem, TrendPoint, CollegeBreakdownItem, UserListItem,
 )
-from app.deps import require_admin
+from app.deps import require_admin, get_read_db, CurrentUser
+from app.counters import admin_stats
+from app.rollups import trend_rows, utc_today
+from app.exports import export_response, REPORT_EXPORT, BEHAVIOR_LOG_EXPORT
 
 router = APIRouter(prefix="/api/admin", tags=["admin"])
 
@@ -22,61 +23,23 @@ router = APIRouter(prefix="/api/admin", tags=["admin"])
 @router.get("/stats", response_model=AdminStatsResponse)
 async def get_stats(
     db: AsyncSession = Depends(get_db),
-    admin: User = Depends(require_admin),
+    admin: CurrentUser = Depends(require_admin),
 ):
-    total_result = await db.execute(select(func.count(User.id)))
-    total_users = total_result.scalar() or 0
-
-    students_result = await db.execute(
-        select(func.count(User.id)).where(User.role == "student")
-    )
-    total_students = students_result.scalar() or 0
-
-    admins_result = await db.execute(
-        select(func.count(User.id)).where(User.role == "admin")
-    )
-    total_admins = admins_result.scalar() or 0
-
-    high_result = await db.execute(
-        select(func.count(RiskScore.id)).where(RiskScore.risk_level == "high")
-    )
-    high_risk = high_result.scalar() or 0
-
-    medium_result = await db.execute(
-        select(func.count(RiskScore.id)).where(RiskScore.risk_level == "medium")
-    )
-    medium_risk = medium_result.scalar() or 0
-
-    low_result = await db.execute(
-        select(func.count(RiskScore.id)).where(RiskScore.risk_level == "low")
-    )
-    low_risk = low_result.scalar() or 0
-
-    alerts_result = await db.execute(select(func.count(Alert.id)))
-    total_alerts = alerts_result.scalar() or 0
-
-    unresolved_result = await db.execute(
-        select(func.count(Alert.id)).where(Alert.resolved == False)
-    )
-    unresolved_alerts = unresolved_result.scalar() or 0
-
+    counts = await admin_stats.snapshot(db)
     return AdminStatsResponse(
-        total_users=total_users,
-        total_students=total_students,
-        total_admins=total_admins,
-        high_risk_count=high_risk,
-        medium_risk_count=medium_risk,
-        low_risk_count=low_risk,
-        total_alerts=total_alerts,
-        unresolved_alerts=unresolved_alerts,
-        risk_distribution={"high": high_risk, "medium": medium_risk, "low": low_risk},
+        **counts,
+        risk_distribution={
+            "high": counts["high_risk_count"],
+            "medium": counts["medium_risk_count"],
+            "low": counts["low_risk_count"],
+        },
     )
 
 
 @router.get("/high-risk-users", response_model=List[HighRiskUserResponse])
 async def get_high_risk_users(
     db: AsyncSession = Depends(get_db),
-    admin: User = Depends(require_admin),
+    admin: CurrentUser = Depends(require_admin),
 ):
     result = await db.execute(
         select(User, RiskScore)
@@ -100,38 +63,52 @@ async def get_high_risk_users(
 
 @router.get("/export-report")
 async def export_report(
-    db: AsyncSession = Depends(get_db),
-    admin: User = Depends(require_admin),
+    admin: CurrentUser = Depends(require_admin),
+    format: str = Query("csv", description="csv, parquet or arrow (the latter two need pyarrow)"),
+    gzip: bool = Query(False, description="gzip the CSV"),
 ):
-    result = await db.execute(
-        select(User, RiskScore)
+    query = (
+        select(User.name, User.email, User.college, User.role, RiskScore.current_score, RiskScore.risk_level)
         .join(RiskScore, User.id == RiskScore.user_id)
         .order_by(RiskScore.current_score.desc())
     )
-    rows = result.all()
+    return export_response(REPORT_EXPORT, query, format, gzip)
 
-    output = io.StringIO()
-    writer = csv.writer(output)
-    writer.writerow(["Name", "Email", "College", "Role", "Risk Score", "Risk Level"])
-    for user, risk in rows:
-        writer.writerow([
-            user.name, user.email, user.college, user.role,
-            risk.current_score, risk.risk_level,
-        ])
 
-    output.seek(0)
-    return StreamingResponse(
-        iter([output.getvalue()]),
-        media_type="text/csv",
-        headers={"Content-Disposition": "attachment; filename=sentinel_report.csv"},
+@router.get("/export-logs")
+async def export_logs(
+    admin: CurrentUser = Depends(require_admin),
+    start: datetime = Query(..., description="Start of the range (UTC), inclusive"),
+    end: Optional[datetime] = Query(None, description="End of the range (UTC), exclusive; defaults to now"),
+    user_id: Optional[str] = Query(None),
+    format: str = Query("csv", description="csv, parquet or arrow (the latter two need pyarrow)"),
+    gzip: bool = Query(False, description="gzip the CSV"),
+):
+    """Raw behavior logs for a time range, streamed in timestamp order."""
+    start = _naive_utc(start)
+    end = _naive_utc(end) if end else datetime.utcnow()
+    if end <= start:
+        raise HTTPException(status_code=400, detail="end must be after start")
+    query = (
+        select(*(getattr(BehaviorLog, col.name) for col in BEHAVIOR_LOG_EXPORT.columns))
+        .where(BehaviorLog.timestamp >= start, BehaviorLog.timestamp < end)
+        .order_by(BehaviorLog.timestamp, BehaviorLog.id)
     )
+    if user_id:
+        query = query.where(BehaviorLog.user_id == user_id)
+    return export_response(BEHAVIOR_LOG_EXPORT, query, format, gzip)
+
+
+def _naive_utc(value: datetime) -> datetime:
+    # Timestamps are stored as naive UTC
+    return value.astimezone(timezone.utc).replace(tzinfo=None) if value.tzinfo else value
 
 
 # ──── Activity Feed ────
 @router.get("/activity-feed", response_model=List[ActivityFeedItem])
 async def get_activity_feed(
     db: AsyncSession = Depends(get_db),
-    admin: User = Depends(require_admin),
+    admin: CurrentUser = Depends(require_admin),
     limit: int = Query(50, le=100),
 ):
     result = await db.execute(
@@ -150,6 +127,8 @@ async def get_activity_feed(
             severity=alert.severity,
             message=alert.message,
             created_at=alert.created_at,
+            occurrences=alert.occurrences,
+            last_seen_at=alert.last_seen_at,
         )
         for alert, name, email in rows
     ]
@@ -158,58 +137,36 @@ async def get_activity_feed(
 # ──── Trend Analytics ────
 @router.get("/trends", response_model=List[TrendPoint])
 async def get_trends(
-    db: AsyncSession = Depends(get_db),
-    admin: User = Depends(require_admin),
-    days: int = Query(14, le=30),
+    db: AsyncSession = Depends(get_read_db),
+    admin: CurrentUser = Depends(require_admin),
+    days: int = Query(14, ge=1, le=365),
+    start: Optional[date] = Query(None, description="First day (UTC) of an explicit range"),
+    end: Optional[date] = Query(None, description="Last day (UTC), inclusive; defaults to yesterday"),
+    college: Optional[str] = Query(None),
 ):
-    trends = []
-    now = datetime.now(timezone.utc)
-
-    for i in range(days, 0, -1):
-        day_start = (now - timedelta(days=i)).replace(hour=0, minute=0, second=0, microsecond=0)
-        day_end = day_start + timedelta(days=1)
-
-        # Average risk score across all students
-        score_result = await db.execute(
-            select(func.avg(RiskScore.current_score))
-        )
-        avg_score = score_result.scalar() or 0
+    """Daily alert/anomaly counts and average risk, read from the daily rollup table."""
+    end = end or (utc_today() - timedelta(days=1))
+    start = start or (end - timedelta(days=days - 1))
+    if start > end or (end - start).days >= 366:
+        raise HTTPException(status_code=400, detail="Range must be between 1 and 366 days")
 
-        # Alerts created that day
-        alert_result = await db.execute(
-            select(func.count(Alert.id)).where(
-                and_(Alert.created_at >= day_start, Alert.created_at < day_end)
-            )
-        )
-        alert_count = alert_result.scalar() or 0
-
-        # Anomalies that day
-        anomaly_result = await db.execute(
-            select(func.count(BehaviorLog.id)).where(
-                and_(
-                    BehaviorLog.timestamp >= day_start,
-                    BehaviorLog.timestamp < day_end,
-                    BehaviorLog.anomaly_flag == True,
-                )
-            )
+    points = await trend_rows(db, start, end, college)
+    return [
+        TrendPoint(
+            date=point["day"].strftime("%b %d"),
+            avg_risk_score=point["avg_risk_score"],
+            alert_count=point["alert_count"],
+            anomaly_count=point["anomaly_count"],
         )
-        anomaly_count = anomaly_result.scalar() or 0
-
-        trends.append(TrendPoint(
-            date=day_start.strftime("%b %d"),
-            avg_risk_score=round(float(avg_score), 1),
-            alert_count=alert_count,
-            anomaly_count=anomaly_count,
-        ))
-
-    return trends
+        for point in points
+    ]
 
 
 # ──── College Breakdown ────
 @router.get("/college-breakdown", response_model=List[CollegeBreakdownItem])
 async def get_college_breakdown(
-    db: AsyncSession = Depends(get_db),
-    admin: User = Depends(require_admin),
+    db: AsyncSession = Depends(get_read_db),
+    admin: CurrentUser = Depends(require_admin),
 ):
     # Get all students with their risk scores grouped by college
     result = await db.execute(
@@ -241,38 +198,74 @@ async def get_college_breakdown(
 
 
 # ──── All Users ────
+def _encode_cursor(created_at: datetime, user_id: str) -> str:
+    payload = json.dumps([created_at.isoformat(), user_id]).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip("=")
+
+
+def _decode_cursor(cursor: str):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, user_id = json.loads(base64.urlsafe_b64decode(padded))
+        return datetime.fromisoformat(created_at), str(user_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def _search_filter(dialect: str, search: str, match: str):
+    if match == "substring":
+        # Served by the pg_trgm GIN indexes on PostgreSQL; a scan elsewhere
+        return User.name.ilike(f"%{search}%") | User.email.ilike(f"%{search}%")
+    # Prefix match: index-friendly without trigram indexes (NOCASE indexes on SQLite)
+    escaped = search.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    if dialect == "postgresql":
+        return User.name.ilike(f"{escaped}%", escape="\\") | User.email.ilike(f"{escaped}%", escape="\\")
+    return User.name.like(f"{escaped}%", escape="\\") | User.email.like(f"{escaped}%", escape="\\")
+
+
 @router.get("/all-users", response_model=List[UserListItem])
 async def get_all_users(
-    db: AsyncSession = Depends(get_db),
-    admin: User = Depends(require_admin),
+    response: Response,
+    db: AsyncSession = Depends(get_read_db),
+    admin: CurrentUser = Depends(require_admin),
     search: str = Query("", description="Search by name or email"),
+    match: str = Query("substring", pattern="^(substring|prefix)$",
+                       description="prefix: only names/emails starting with `search`; uses an index on every database"),
     role_filter: str = Query("all", description="Filter by role"),
+    limit: int = Query(100, ge=1, le=500),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor from the previous page"),
 ):
-    query = (
-        select(User, RiskScore.current_score, RiskScore.risk_level)
-        .outerjoin(RiskScore, User.id == RiskScore.user_id)
-    )
-
+    """Users newest first, one page per call. The next page's cursor is returned in `X-Next-Cursor`."""
+    page = select(User.id, User.created_at)
     if search:
-        query = query.where(
-            User.name.ilike(f"%{search}%") | User.email.ilike(f"%{search}%")
-        )
+        page = page.where(_search_filter(db.bind.dialect.name, search, match))
     if role_filter != "all":
-        query = query.where(User.role == role_filter)
+        page = page.where(User.role == role_filter)
+    if cursor:
+        created_at, user_id = _decode_cursor(cursor)
+        page = page.where(or_(
+            User.created_at < created_at,
+            and_(User.created_at == created_at, User.id < user_id),
+        ))
+    page = page.order_by(User.created_at.desc(), User.id.desc()).limit(limit).cte("page")
 
-    query = query.order_by(User.created_at.desc())
-    result = await db.execute(query)
+    alert_counts = (
+        select(Alert.user_id, func.count(Alert.id).label("alert_count"))
+        .where(Alert.user_id.in_(select(page.c.id)))
+        .group_by(Alert.user_id)
+        .subquery()
+    )
+    result = await db.execute(
+        select(User, RiskScore.current_score, RiskScore.risk_level, alert_counts.c.alert_count)
+        .join(page, page.c.id == User.id)
+        .outerjoin(RiskScore, User.id == RiskScore.user_id)
+        .outerjoin(alert_counts, alert_counts.c.user_id == User.id)
+        .order_by(User.created_at.desc(), User.id.desc())
+    )
     rows = result.all()
 
-    items = []
-    for user, score, level in rows:
-        # Count alerts for user
-        alert_result = await db.execute(
-            select(func.count(Alert.id)).where(Alert.user_id == user.id)
-        )
-        alert_count = alert_result.scalar() or 0
-
-        items.append(UserListItem(
+    items = [
+        UserListItem(
             id=user.id,
             name=user.name,
             email=user.email,
@@ -281,8 +274,12 @@ async def get_all_users(
             consent_given=user.consent_given,
             risk_score=round(float(score), 1) if score else None,
             risk_level=level,
-            alert_count=alert_count,
+            alert_count=alert_count or 0,
             created_at=user.created_at,
-        ))
-
+        )
+        for user, score, level, alert_count in rows
+    ]
+    if len(items) == limit:
+        response.headers["X-Next-Cursor"] = _encode_cursor(items[-1].created_at, items[-1].id)
     return items
+
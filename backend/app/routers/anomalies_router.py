@@ -1,80 +1,43 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func
 from typing import List
-from datetime import datetime, timedelta, timezone
 from app.database import get_db
-from app.models import BehaviorLog, User
 from app.schemas import TimelinePoint, HeatmapPoint
-from app.deps import get_current_user
-import random
+from app.deps import TokenUser, get_token_user
+from app.anomaly_buckets import BUCKET_HOURS, anomaly_heatmap, anomaly_timeline
 
 router = APIRouter(prefix="/api/anomalies", tags=["anomalies"])
 
+MAX_RANGE_DAYS = 90
+
 @router.get("/timeline", response_model=List[TimelinePoint])
 async def get_anomaly_timeline(
+    hours: int = Query(24, ge=1, le=MAX_RANGE_DAYS * 24, description="how far back to go"),
+    bucket_hours: int = Query(1, description=f"bucket width in hours, one of {BUCKET_HOURS}"),
     db: AsyncSession = Depends(get_db),
-    user: User = Depends(get_current_user)
+    user: TokenUser = Depends(get_token_user)
 ):
-    # For a real implementation, we'd group logs by hour/minute and average the score.
-    # Since sqlite/asyncpg date math varies, we'll fetch the last 24 hours of logs
-    # and organize them in python, or simply mock a timeline if few logs exist.
-    
-    time_limit = datetime.utcnow() - timedelta(hours=24)
-    result = await db.execute(
-        select(BehaviorLog.timestamp, BehaviorLog.anomaly_score)
-        .where(BehaviorLog.user_id == user.id, BehaviorLog.timestamp >= time_limit)
-        .order_by(BehaviorLog.timestamp.asc())
-    )
-    
-    logs = result.all()
-    
-    if len(logs) < 10:
-        # Generate stable mock data for the demo if insufficient logs
-        base_time = datetime.utcnow() - timedelta(hours=12)
-        mock_timeline = []
-        for i in range(12):
-            point_time = base_time + timedelta(hours=i)
-            mock_timeline.append(TimelinePoint(
-                timestamp=point_time.strftime("%H:%M"),
-                risk_score=random.uniform(10.0, 45.0) if i != 8 else random.uniform(80.0, 95.0) # spike at hour 8
-            ))
-        return mock_timeline
-        
-    # Group by hour
-    grouped = {}
-    for timestamp, score in logs:
-        hour_key = timestamp.strftime("%H:00")
-        if hour_key not in grouped:
-            grouped[hour_key] = []
-        grouped[hour_key].append(score or 0.0)
-        
-    timeline = []
-    for hour, scores in grouped.items():
-        avg_score = sum(scores) / len(scores)
-        timeline.append(TimelinePoint(timestamp=hour, risk_score=round(avg_score, 1)))
-        
-    return timeline
+    # Mean anomaly score per UTC time bucket, oldest first; empty buckets are 0
+    if bucket_hours not in BUCKET_HOURS or hours < bucket_hours:
+        raise HTTPException(status_code=422, detail=f"bucket_hours must be one of {BUCKET_HOURS} and at most hours")
+    points = await anomaly_timeline(db, user.id, hours, bucket_hours)
+    label = "%H:%M" if hours <= 24 else "%Y-%m-%d %H:%M"
+    return [
+        TimelinePoint(
+            timestamp=point["start"].strftime(label),
+            risk_score=round(point["avg_score"], 1),
+            log_count=point["log_count"],
+            anomaly_count=point["anomaly_count"],
+        )
+        for point in points
+    ]
 
 @router.get("/heatmap", response_model=List[HeatmapPoint])
 async def get_anomaly_heatmap(
+    days: int = Query(30, ge=1, le=MAX_RANGE_DAYS, description="how many days back, today included"),
     db: AsyncSession = Depends(get_db),
-    user: User = Depends(get_current_user)
+    user: TokenUser = Depends(get_token_user)
 ):
-    # Heatmap of hour of day vs frequency of high-risk anomalies
-    # Returning a simulated heatmap pattern for the dashboard
-    
-    heatmap = []
-    # 24 hours
-    for h in range(24):
-        # Higher frequency during night hours (simulated anomaly pattern)
-        if 1 <= h <= 4:
-            freq = random.randint(5, 15)
-        elif 9 <= h <= 17:
-            freq = random.randint(0, 3)
-        else:
-            freq = random.randint(0, 5)
-            
-        heatmap.append(HeatmapPoint(hour=h, frequency=freq))
-        
-    return heatmap
+    # Heatmap of UTC hour of day vs number of flagged anomalies
+    counts = await anomaly_heatmap(db, user.id, days)
+    return [HeatmapPoint(hour=hour, frequency=count) for hour, count in enumerate(counts)]
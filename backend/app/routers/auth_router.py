@@ -6,8 +6,11 @@ from app.models import User, RiskScore
 from app.schemas import (
     RegisterRequest, LoginRequest, TokenResponse, UserResponse, ConsentRequest
 )
-from app.auth import hash_password, verify_password, create_access_token, create_refresh_token
-from app.deps import get_current_user
+from app.auth import create_access_token, create_refresh_token
+from app.deps import get_current_user, CurrentUser
+from app.auth_cache import auth_cache
+from app.leaderboard import leaderboard
+from app.password_hasher import password_hasher
 
 router = APIRouter(prefix="/api", tags=["auth"])
 
@@ -23,13 +26,15 @@ async def register(req: RegisterRequest, db: AsyncSession = Depends(get_db)):
         email=req.email,
         college=req.college,
         role=req.role.value,
-        hashed_password=hash_password(req.password),
+        hashed_password=await password_hasher.hash(req.password),
     )
     db.add(user)
     await db.flush()
 
     risk_score = RiskScore(user_id=user.id, current_score=0.0, risk_level="low")
     db.add(risk_score)
+    if user.role == "student":
+        leaderboard.record(db.sync_session, user.id, user.college, 0.0)
     await db.commit()
     await db.refresh(user)
     return user
@@ -39,8 +44,16 @@ async def register(req: RegisterRequest, db: AsyncSession = Depends(get_db)):
 async def login(req: LoginRequest, db: AsyncSession = Depends(get_db)):
     result = await db.execute(select(User).where(User.email == req.email))
     user = result.scalar_one_or_none()
-    if not user or not verify_password(req.password, user.hashed_password):
+    if not user:
         raise HTTPException(status_code=401, detail="Invalid email or password")
+    valid, new_hash = await password_hasher.verify(req.password, user.hashed_password)
+    if not valid:
+        raise HTTPException(status_code=401, detail="Invalid email or password")
+    if new_hash:
+        # Stored hash predates the current BCRYPT_ROUNDS; upgrade it while we have the plaintext
+        user.hashed_password = new_hash
+        await db.commit()
+        await db.refresh(user)
 
     access_token = create_access_token({"sub": str(user.id), "role": user.role})
     refresh_token = create_refresh_token({"sub": str(user.id)})
@@ -53,7 +66,7 @@ async def login(req: LoginRequest, db: AsyncSession = Depends(get_db)):
 
 
 @router.get("/profile", response_model=UserResponse)
-async def get_profile(user: User = Depends(get_current_user)):
+async def get_profile(user: CurrentUser = Depends(get_current_user)):
     return user
 
 
@@ -61,12 +74,14 @@ async def get_profile(user: User = Depends(get_current_user)):
 async def give_consent(
     req: ConsentRequest,
     db: AsyncSession = Depends(get_db),
-    user: User = Depends(get_current_user),
+    user: CurrentUser = Depends(get_current_user),
 ):
     if not req.accept_terms or not req.enable_monitoring:
         raise HTTPException(status_code=400, detail="You must accept terms and enable monitoring")
 
-    user.consent_given = True
+    row = await db.get(User, user.id)
+    row.consent_given = True
     await db.commit()
-    await db.refresh(user)
-    return user
+    auth_cache.invalidate(user.id)
+    await db.refresh(row)
+    return row
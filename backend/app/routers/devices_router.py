@@ -3,9 +3,9 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 from typing import List
 from app.database import get_db
-from app.models import Device, User
+from app.models import Device
 from app.schemas import RegisterDeviceRequest, DeviceResponse
-from app.deps import get_current_user
+from app.deps import get_current_user, CurrentUser, TokenUser, get_token_user
 
 router = APIRouter(prefix="/api/devices", tags=["devices"])
 
@@ -13,7 +13,7 @@ router = APIRouter(prefix="/api/devices", tags=["devices"])
 async def register_device(
     req: RegisterDeviceRequest, 
     db: AsyncSession = Depends(get_db),
-    user: User = Depends(get_current_user)
+    user: CurrentUser = Depends(get_current_user)
 ):
     device = Device(
         user_id=user.id,
@@ -29,7 +29,7 @@ async def register_device(
 @router.get("", response_model=List[DeviceResponse])
 async def get_devices(
     db: AsyncSession = Depends(get_db),
-    user: User = Depends(get_current_user)
+    user: TokenUser = Depends(get_token_user)
 ):
     result = await db.execute(select(Device).where(Device.user_id == user.id))
     devices = result.scalars().all()
@@ -39,7 +39,7 @@ async def get_devices(
 async def get_device_risk(
     device_id: str,
     db: AsyncSession = Depends(get_db),
-    user: User = Depends(get_current_user)
+    user: TokenUser = Depends(get_token_user)
 ):
     result = await db.execute(
         select(Device).where(Device.id == device_id, Device.user_id == user.id)
@@ -2,9 +2,9 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 from app.database import get_db
-from app.models import User, IntegrationConfig
+from app.models import IntegrationConfig
 from app.schemas import EscalateRequest
-from app.deps import get_current_user
+from app.deps import get_current_user, CurrentUser
 
 router = APIRouter(prefix="/api/escalate", tags=["escalate"])
 
@@ -12,7 +12,7 @@ router = APIRouter(prefix="/api/escalate", tags=["escalate"])
 async def escalate_incident(
     req: EscalateRequest, 
     db: AsyncSession = Depends(get_db),
-    user: User = Depends(get_current_user)
+    user: CurrentUser = Depends(get_current_user)
 ):
     # Retrieve active integration hooks for the campus IT center
     result = await db.execute(select(IntegrationConfig).where(IntegrationConfig.status == "active"))
@@ -3,9 +3,9 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, update
 from typing import List
 from app.database import get_db
-from app.models import Incident, User, Alert
+from app.models import Incident, Alert
 from app.schemas import ReportIncidentRequest, IncidentResponse
-from app.deps import get_current_user
+from app.deps import get_current_user, CurrentUser
 
 router = APIRouter(prefix="/api/incidents", tags=["incidents"])
 
@@ -13,7 +13,7 @@ router = APIRouter(prefix="/api/incidents", tags=["incidents"])
 async def report_incident(
     req: ReportIncidentRequest, 
     db: AsyncSession = Depends(get_db),
-    user: User = Depends(get_current_user)
+    user: CurrentUser = Depends(get_current_user)
 ):
     # Verify the alert exists and belongs to the user
     result = await db.execute(select(Alert).where(Alert.id == req.alert_id, Alert.user_id == user.id))
@@ -41,7 +41,7 @@ async def report_incident(
 @router.get("", response_model=List[IncidentResponse])
 async def get_incidents(
     db: AsyncSession = Depends(get_db),
-    user: User = Depends(get_current_user)
+    user: CurrentUser = Depends(get_current_user)
 ):
     if user.role == "admin":
         result = await db.execute(select(Incident).order_by(Incident.created_at.desc()))
@@ -55,7 +55,7 @@ async def update_incident_status(
     incident_id: int,
     status: str,
     db: AsyncSession = Depends(get_db),
-    user: User = Depends(get_current_user)
+    user: CurrentUser = Depends(get_current_user)
 ):
     # Only admins can update status typically, but allowing for demo purposes
     if user.role != "admin" and status != "resolved":
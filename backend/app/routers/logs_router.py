@@ -1,23 +1,81 @@
-from fastapi import APIRouter, Depends, HTTPException
+import asyncio
+from fastapi import APIRouter, Depends
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import select, insert, update, func, bindparam
 from datetime import datetime, timezone
-from typing import List
+from typing import List, Optional
 from app.database import get_db
-from app.models import User, BehaviorLog, RiskScore, Alert, BehaviorProfile, DataAccessLog
-from app.schemas import LogIngestRequest, LogResponse, RiskScoreResponse, AlertResponse
-from app.deps import get_current_user, require_consent
-from app.ai_engine import calculate_risk
+from app.models import BehaviorLog, RiskScore, Alert, BehaviorProfile, DataAccessLog, Device
+from app.schemas import (
+    LogIngestRequest, LogBatchIngestRequest, LogBatchIngestResponse,
+    LogResponse, RiskScoreResponse, AlertResponse,
+)
+from app.deps import require_consent, CurrentUser, TokenUser, get_token_user
 from app.websocket_manager import manager
+from app.rolling_window import rolling_windows, log_features
+from app.model_registry import model_registry
+from app.scoring_executor import scoring_executor
+from app.rollups import record_rollups, rollup_row
+from app.aggregates import record_user_logs
+from app.leaderboard import leaderboard
+from app.read_routing import read_routing
+from app.alert_dedup import alert_aggregator, AlertCandidate, RaisedAlert, alert_message
 
 router = APIRouter(prefix="/api", tags=["logs"])
 
 
+async def _get_baseline(db: AsyncSession, user_id: str):
+    bp_result = await db.execute(select(BehaviorProfile).where(BehaviorProfile.user_id == user_id))
+    profile = bp_result.scalar_one_or_none()
+    return profile.baseline_metrics if profile else None
+
+
+async def _store_risk_score(db: AsyncSession, user: CurrentUser, risk: dict) -> RiskScore:
+    user_id = user.id
+    rs_result = await db.execute(select(RiskScore).where(RiskScore.user_id == user_id))
+    risk_score = rs_result.scalar_one_or_none()
+    if risk_score:
+        risk_score.current_score = risk["score"]
+        risk_score.risk_level = risk["level"]
+        risk_score.last_updated = datetime.now(timezone.utc)
+    else:
+        risk_score = RiskScore(
+            user_id=user_id, current_score=risk["score"], risk_level=risk["level"]
+        )
+        db.add(risk_score)
+    if user.role == "student":
+        leaderboard.record(db.sync_session, user_id, user.college, risk["score"])
+    return risk_score
+
+
+async def _raise_alert(db: AsyncSession, user_id: str, risk: dict, app_name: str, device_id: Optional[str]) -> RaisedAlert:
+    [raised] = await alert_aggregator.raise_alerts(db, [AlertCandidate(
+        user_id=user_id,
+        device_id=device_id,
+        app_name=app_name,
+        alert_type="high_risk_behavior",
+        severity=risk.get("severity", "high"),
+        message=f"Risk score {risk['score']}: suspicious activity from {app_name}",
+        explanation_text=risk.get("explanation", f"High risk score detected from excessive permissions or background activity in {app_name}."),
+        recommendation=risk.get("recommendation", "Review the app's requested permissions and consider blocking or uninstalling it."),
+        confidence_score=0.95,
+        risk_score=risk["score"],
+    )])
+    return raised
+
+
+async def _announce_alert(raised: Optional[RaisedAlert]):
+    """Push a new alert to the user's sockets; call after the commit, so clients never see a rolled-back alert."""
+    # Repeats within the suppression window are reported once, when it closes
+    if raised and raised.new:
+        await manager.send_to_user(str(raised.candidate.user_id), alert_message(raised.id, raised.candidate, datetime.now(timezone.utc)))
+
+
 @router.post("/logs", response_model=LogResponse)
 async def ingest_log(
     req: LogIngestRequest,
     db: AsyncSession = Depends(get_db),
-    user: User = Depends(require_consent),
+    user: CurrentUser = Depends(require_consent),
 ):
     log_entry = BehaviorLog(
         user_id=user.id,
@@ -32,23 +90,8 @@ async def ingest_log(
     db.add(log_entry)
     await db.flush()
 
-    # Recalculate risk score
-    result = await db.execute(
-        select(BehaviorLog)
-        .where(BehaviorLog.user_id == user.id)
-        .order_by(BehaviorLog.timestamp.desc())
-        .limit(50)
-    )
-    recent = result.scalars().all()
-    logs_data = [
-        {
-            "permission_requested": l.permission_requested,
-            "network_activity_level": l.network_activity_level,
-            "background_process_flag": l.background_process_flag,
-            "anomaly_flag": l.anomaly_flag,
-        }
-        for l in recent
-    ]
+    # Recalculate risk score over the user's rolling window
+    window = await rolling_windows.record(db, user.id, [log_features(log_entry)])
 
     # Privacy Transparency: Log data access for AI calculation
     db.add(DataAccessLog(
@@ -57,61 +100,150 @@ async def ingest_log(
         purpose="AI Risk Score Calculation and Deviation Check"
     ))
 
-    # Fetch User Baseline
-    bp_result = await db.execute(select(BehaviorProfile).where(BehaviorProfile.user_id == user.id))
-    profile = bp_result.scalar_one_or_none()
-    baseline = profile.baseline_metrics if profile else None
-
     # Calculate Risk using personalized baseline logic
-    risk = calculate_risk(logs_data, baseline=baseline)
-
-    # Update risk score
-    rs_result = await db.execute(select(RiskScore).where(RiskScore.user_id == user.id))
-    risk_score = rs_result.scalar_one_or_none()
-    if risk_score:
-        risk_score.current_score = risk["score"]
-        risk_score.risk_level = risk["level"]
-        risk_score.last_updated = datetime.now(timezone.utc)
-    else:
-        risk_score = RiskScore(
-            user_id=user.id, current_score=risk["score"], risk_level=risk["level"]
-        )
-        db.add(risk_score)
+    baseline = await _get_baseline(db, user.id)
+    model_registry.record_logs(user.id, user.college)
+    model_entry = model_registry.entry_for(user.id, user.college)
+    risk = await scoring_executor.score(window.logs, baseline, window.aggregate, model_entry)
+    await _store_risk_score(db, user, risk)
 
     # Alert if high risk
+    raised = None
     if risk["score"] > 70:
-        alert = Alert(
-            user_id=user.id,
-            alert_type="high_risk_behavior",
-            severity=risk.get("severity", "high"),
-            message=f"Risk score {risk['score']}: suspicious activity from {req.app_name}",
-            explanation_text=risk.get("explanation", f"High risk score detected from excessive permissions or background activity in {req.app_name}."),
-            recommendation=risk.get("recommendation", "Review the app's requested permissions and consider blocking or uninstalling it."),
-            confidence_score=0.95
-        )
-        db.add(alert)
-        await db.flush()
-
-        await manager.send_to_user(str(user.id), {
-            "type": "alert",
-            "alert_id": alert.id,
-            "alert_type": alert.alert_type,
-            "severity": alert.severity,
-            "message": alert.message,
-            "recommendation": alert.recommendation,
-            "timestamp": datetime.now(timezone.utc).isoformat(),
-            "risk_score": risk["score"],
-        })
+        raised = await _raise_alert(db, user.id, risk, req.app_name, req.device_id)
+    alerted = bool(raised and raised.new)
 
+    await record_user_logs(db, [{
+        "user_id": user.id,
+        "app_name": req.app_name,
+        "permission_requested": req.permission_requested,
+        "network_activity_level": req.network_activity_level,
+        "anomaly_flag": req.anomaly_flag,
+    }])
+    await record_rollups(db, [rollup_row(
+        user.college, log_count=1, anomaly_count=int(req.anomaly_flag), alert_count=int(alerted),
+        risk_sum=risk["score"], risk_samples=1,
+    )])
     await db.commit()
+    await _announce_alert(raised)
+    await read_routing.mark_written(user.id)
     await db.refresh(log_entry)
     return log_entry
 
 
+@router.post("/logs/batch", response_model=LogBatchIngestResponse)
+async def ingest_logs_batch(
+    req: LogBatchIngestRequest,
+    db: AsyncSession = Depends(get_db),
+    user: CurrentUser = Depends(require_consent),
+):
+    """Ingest a burst of telemetry in one transaction.
+
+    All rows go in with a single executemany, and risk is recomputed once for
+    the user and once per device touched by the batch instead of per event.
+    """
+    rows = [
+        {
+            "user_id": user.id,
+            "device_id": item.device_id,
+            "app_name": item.app_name,
+            "permission_requested": item.permission_requested,
+            "network_activity_level": item.network_activity_level,
+            "background_process_flag": item.background_process_flag,
+            "anomaly_flag": item.anomaly_flag,
+            "log_data": item.extra_data or {},
+        }
+        for item in req.items
+    ]
+    result = await db.execute(
+        insert(BehaviorLog).returning(BehaviorLog.id, sort_by_parameter_order=True),
+        rows,
+    )
+    ids = list(result.scalars())
+
+    # Privacy Transparency: one audit entry covers the whole batch
+    db.add(DataAccessLog(
+        user_id=user.id,
+        data_type="Behavioral History",
+        purpose=f"AI Risk Score Calculation and Deviation Check ({len(ids)} events)"
+    ))
+
+    baseline = await _get_baseline(db, user.id)
+
+    window = await rolling_windows.record(db, user.id, [log_features(item) for item in req.items])
+    model_registry.record_logs(user.id, user.college, len(ids))
+    model_entry = model_registry.entry_for(user.id, user.college)
+    risk = await scoring_executor.score(window.logs, baseline, window.aggregate, model_entry)
+    risk_score = await _store_risk_score(db, user, risk)
+
+    # Per-device windows for every device in the batch, fetched in one query
+    device_ids = {item.device_id for item in req.items if item.device_id}
+    device_risk = {}
+    if device_ids:
+        ranked = (
+            select(
+                BehaviorLog.device_id,
+                BehaviorLog.permission_requested,
+                BehaviorLog.network_activity_level,
+                BehaviorLog.background_process_flag,
+                BehaviorLog.anomaly_flag,
+                func.row_number().over(
+                    partition_by=BehaviorLog.device_id,
+                    order_by=BehaviorLog.timestamp.desc(),
+                ).label("rn"),
+            )
+            .where(BehaviorLog.user_id == user.id, BehaviorLog.device_id.in_(device_ids))
+            .subquery()
+        )
+        result = await db.execute(select(ranked).where(ranked.c.rn <= 50))
+        device_logs = {}
+        for row in result.all():
+            device_logs.setdefault(row.device_id, []).append(log_features(row))
+
+        # Submitted together so the executor scores them as one micro-batch
+        scored = await asyncio.gather(*(
+            scoring_executor.score(logs, baseline, model_entry=model_entry)
+            for logs in device_logs.values()
+        ))
+        device_risk = {device_id: r["score"] for device_id, r in zip(device_logs, scored)}
+        if device_risk:
+            await db.execute(
+                update(Device.__table__)
+                .where(Device.id == bindparam("b_id"), Device.user_id == user.id)
+                .values(risk_score=bindparam("b_score")),
+                [{"b_id": d, "b_score": s} for d, s in device_risk.items()],
+            )
+
+    raised, alert_id, alerted = None, None, False
+    if risk["score"] > 70:
+        raised = await _raise_alert(db, user.id, risk, req.items[-1].app_name, req.items[-1].device_id)
+        alert_id, alerted = raised.id, raised.new
+
+    await record_user_logs(db, rows)
+    await record_rollups(db, [rollup_row(
+        user.college,
+        log_count=len(ids),
+        anomaly_count=sum(1 for item in req.items if item.anomaly_flag),
+        alert_count=int(alerted),
+        risk_sum=risk["score"],
+        risk_samples=1,
+    )])
+    await db.commit()
+    await _announce_alert(raised)
+    await read_routing.mark_written(user.id)
+    return LogBatchIngestResponse(
+        ids=ids,
+        accepted=len(ids),
+        risk=RiskScoreResponse.model_validate(risk_score),
+        device_risk=device_risk,
+        alert_id=alert_id,
+    )
+
+
 @router.get("/risk-score", response_model=RiskScoreResponse)
 async def get_risk_score(
     db: AsyncSession = Depends(get_db),
-    user: User = Depends(get_current_user),
+    user: TokenUser = Depends(get_token_user),
 ):
     result = await db.execute(select(RiskScore).where(RiskScore.user_id == user.id))
     risk_score = result.scalar_one_or_none()
@@ -123,7 +255,7 @@ async def get_risk_score(
 @router.get("/alerts", response_model=List[AlertResponse])
 async def get_alerts(
     db: AsyncSession = Depends(get_db),
-    user: User = Depends(get_current_user),
+    user: TokenUser = Depends(get_token_user),
 ):
     result = await db.execute(
         select(Alert)
@@ -137,7 +269,7 @@ async def get_alerts(
 @router.get("/logs/recent", response_model=List[LogResponse])
 async def get_recent_logs(
     db: AsyncSession = Depends(get_db),
-    user: User = Depends(require_consent),
+    user: CurrentUser = Depends(require_consent),
 ):
     result = await db.execute(
         select(BehaviorLog)
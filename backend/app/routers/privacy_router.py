@@ -3,16 +3,16 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 from typing import List
 from app.database import get_db
-from app.models import DataAccessLog, User, Alert
+from app.models import DataAccessLog, Alert
 from app.schemas import DataAccessLogResponse
-from app.deps import get_current_user
+from app.deps import TokenUser, get_token_user
 
 router = APIRouter(prefix="/api/privacy", tags=["privacy"])
 
 @router.get("/data-access", response_model=List[DataAccessLogResponse])
 async def get_data_access_logs(
     db: AsyncSession = Depends(get_db),
-    user: User = Depends(get_current_user)
+    user: TokenUser = Depends(get_token_user)
 ):
     # Retrieve the audit trail of what data the system accessed for this user
     result = await db.execute(select(DataAccessLog).where(DataAccessLog.user_id == user.id).order_by(DataAccessLog.timestamp.desc()))
@@ -22,7 +22,7 @@ async def get_data_access_logs(
 async def get_alert_explanation(
     alert_id: int,
     db: AsyncSession = Depends(get_db),
-    user: User = Depends(get_current_user)
+    user: TokenUser = Depends(get_token_user)
 ):
     # Explainability Engine Endpoint: Explains an alert in natural language
     result = await db.execute(select(Alert).where(Alert.id == alert_id, Alert.user_id == user.id))
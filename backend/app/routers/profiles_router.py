@@ -2,16 +2,16 @@ from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 from app.database import get_db
-from app.models import User, BehaviorProfile
+from app.models import BehaviorProfile
 from app.schemas import BehaviorProfileResponse
-from app.deps import get_current_user
+from app.deps import get_current_user, CurrentUser, TokenUser, get_token_user
 
 router = APIRouter(prefix="/api/profile", tags=["profile"])
 
 @router.get("/baseline", response_model=BehaviorProfileResponse)
 async def get_baseline(
     db: AsyncSession = Depends(get_db),
-    user: User = Depends(get_current_user)
+    user: CurrentUser = Depends(get_current_user)
 ):
     result = await db.execute(select(BehaviorProfile).where(BehaviorProfile.user_id == user.id))
     profile = result.scalar_one_or_none()
@@ -25,7 +25,7 @@ async def get_baseline(
 @router.get("/deviation")
 async def get_deviation(
     db: AsyncSession = Depends(get_db),
-    user: User = Depends(get_current_user)
+    user: TokenUser = Depends(get_token_user)
 ):
     # This endpoint returns the user's current deviation from their baseline.
     # In a real app we'd calculate this on the fly or fetch from a recent cache.
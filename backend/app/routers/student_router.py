@@ -1,14 +1,17 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func, case
+from sqlalchemy import select
 from app.database import get_db
-from app.models import User, Alert, BehaviorLog, RiskScore
+from app.models import Alert, RiskScore
 from app.schemas import (
     BlockAppRequest, ResolveAlertRequest, AlertResponse,
     WellbeingResponse, AppUsageItem, PermissionAuditResponse,
     PermissionBreakdown, LeaderboardResponse, TrainingProgressResponse, TrainingModule,
 )
-from app.deps import get_current_user, require_consent
+from app.deps import get_current_user, require_consent, CurrentUser, TokenUser, get_token_user, get_read_db
+from app.rollups import record_rollups, rollup_row
+from app.aggregates import user_log_totals
+from app.leaderboard import leaderboard
 import random
 
 router = APIRouter(prefix="/api", tags=["student"])
@@ -18,7 +21,7 @@ router = APIRouter(prefix="/api", tags=["student"])
 async def block_app(
     req: BlockAppRequest,
     db: AsyncSession = Depends(get_db),
-    user: User = Depends(require_consent),
+    user: CurrentUser = Depends(require_consent),
 ):
     alert = Alert(
         user_id=user.id,
@@ -28,6 +31,7 @@ async def block_app(
         resolved=True,
     )
     db.add(alert)
+    await record_rollups(db, [rollup_row(user.college, alert_count=1)])
     await db.commit()
     return {"status": "success", "message": f"App '{req.app_name}' blocked successfully"}
 
@@ -36,7 +40,7 @@ async def block_app(
 async def resolve_alert(
     req: ResolveAlertRequest,
     db: AsyncSession = Depends(get_db),
-    user: User = Depends(get_current_user),
+    user: CurrentUser = Depends(get_current_user),
 ):
     result = await db.execute(
         select(Alert).where(Alert.id == req.alert_id, Alert.user_id == user.id)
@@ -54,41 +58,30 @@ async def resolve_alert(
 # ──── Digital Wellbeing ────
 @router.get("/wellbeing", response_model=WellbeingResponse)
 async def get_wellbeing(
-    db: AsyncSession = Depends(get_db),
-    user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_read_db),
+    user: TokenUser = Depends(get_token_user),
 ):
     # Aggregate behaviour logs into wellbeing metrics
-    result = await db.execute(
-        select(
-            BehaviorLog.app_name,
-            func.count(BehaviorLog.id).label("sessions"),
-            func.avg(BehaviorLog.network_activity_level).label("avg_net"),
-        )
-        .where(BehaviorLog.user_id == user.id)
-        .group_by(BehaviorLog.app_name)
-        .order_by(func.count(BehaviorLog.id).desc())
-    )
-    rows = result.all()
+    totals = await user_log_totals(db, user.id)
+    sessions_by_app = {}
+    for (app_name, _), entry in totals.items():
+        sessions_by_app[app_name] = sessions_by_app.get(app_name, 0) + entry["log_count"]
+    rows = sorted(sessions_by_app.items(), key=lambda item: item[1], reverse=True)
 
-    total_sessions = sum(r.sessions for r in rows)
+    total_sessions = sum(sessions_by_app.values())
     # Estimate minutes per session (simulated but derived from real data)
     top_apps = [
         AppUsageItem(
-            app_name=r.app_name,
-            usage_minutes=round(r.sessions * random.uniform(3, 12), 1),
-            sessions=r.sessions,
+            app_name=app_name,
+            usage_minutes=round(sessions * random.uniform(3, 12), 1),
+            sessions=sessions,
         )
-        for r in rows[:8]
+        for app_name, sessions in rows[:8]
     ]
     total_minutes = sum(a.usage_minutes for a in top_apps)
 
     # Focus score: lower anomaly ratio = higher focus
-    anomaly_result = await db.execute(
-        select(func.count(BehaviorLog.id)).where(
-            BehaviorLog.user_id == user.id, BehaviorLog.anomaly_flag == True
-        )
-    )
-    anomaly_count = anomaly_result.scalar() or 0
+    anomaly_count = sum(entry["anomaly_count"] for entry in totals.values())
     focus_score = max(20, 100 - int((anomaly_count / max(total_sessions, 1)) * 100))
 
     # Daily trend from last 7 days (simulated from actual log counts)
@@ -113,41 +106,31 @@ async def get_wellbeing(
 # ──── Permission Audit ────
 @router.get("/permission-audit", response_model=PermissionAuditResponse)
 async def get_permission_audit(
-    db: AsyncSession = Depends(get_db),
-    user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_read_db),
+    user: TokenUser = Depends(get_token_user),
 ):
-    result = await db.execute(
-        select(
-            BehaviorLog.permission_requested,
-            func.count(BehaviorLog.id).label("cnt"),
-        )
-        .where(BehaviorLog.user_id == user.id, BehaviorLog.permission_requested != "none")
-        .group_by(BehaviorLog.permission_requested)
-        .order_by(func.count(BehaviorLog.id).desc())
-    )
-    rows = result.all()
-    total = sum(r.cnt for r in rows) or 1
+    totals = await user_log_totals(db, user.id)
+    counts = {}
+    for (_, permission), entry in totals.items():
+        if permission not in ("none", ""):
+            counts[permission] = counts.get(permission, 0) + entry["log_count"]
+    rows = sorted(counts.items(), key=lambda item: item[1], reverse=True)
+    total = sum(counts.values()) or 1
 
     breakdown = [
         PermissionBreakdown(
-            permission=r.permission_requested,
-            count=r.cnt,
-            percentage=round((r.cnt / total) * 100, 1),
+            permission=permission,
+            count=count,
+            percentage=round((count / total) * 100, 1),
         )
-        for r in rows
+        for permission, count in rows
     ]
 
     # Risky apps = apps with high network + anomaly flags
-    risky_result = await db.execute(
-        select(BehaviorLog.app_name)
-        .where(
-            BehaviorLog.user_id == user.id,
-            BehaviorLog.anomaly_flag == True,
-            BehaviorLog.permission_requested != "none",
-        )
-        .distinct()
-    )
-    risky_apps = [r[0] for r in risky_result.all()]
+    risky_apps = sorted({
+        app_name for (app_name, permission), entry in totals.items()
+        if permission not in ("none", "") and entry["anomaly_count"]
+    })
 
     return PermissionAuditResponse(
         total_requests=total,
@@ -159,42 +142,28 @@ async def get_permission_audit(
 # ──── Peer Leaderboard ────
 @router.get("/leaderboard", response_model=LeaderboardResponse)
 async def get_leaderboard(
-    db: AsyncSession = Depends(get_db),
-    user: User = Depends(get_current_user),
+    scope: str = Query("campus", pattern="^(campus|college)$", description="rank among all students or within your college"),
+    db: AsyncSession = Depends(get_read_db),
+    user: CurrentUser = Depends(get_current_user),
 ):
-    # Get all student risk scores
-    result = await db.execute(
-        select(RiskScore.user_id, RiskScore.current_score)
-        .join(User, User.id == RiskScore.user_id)
-        .where(User.role == "student")
-        .order_by(RiskScore.current_score.asc())  # lower = better
-    )
-    all_scores = result.all()
-    total = len(all_scores)
-    scores_list = [s.current_score for s in all_scores]
-    campus_avg = sum(scores_list) / max(len(scores_list), 1)
-
-    # Find user rank (lower score = better rank)
-    user_score_result = await db.execute(
-        select(RiskScore.current_score).where(RiskScore.user_id == user.id)
-    )
-    user_score = user_score_result.scalar() or 50.0
-
-    rank = 1
-    for s in all_scores:
-        if s.user_id == user.id:
-            break
-        rank += 1
-
-    percentile = int(((total - rank) / max(total, 1)) * 100)
+    # Ranks come from the in-memory score index (lower score = better rank)
+    college = user.college if scope == "college" else None
+    total, campus_avg = leaderboard.summary(college)
+    standing = leaderboard.standing(user.id, college)
+    if standing:
+        rank, percentile, user_score = standing["rank"], standing["percentile"], standing["score"]
+    else:
+        # Not ranked (no score yet, or not a student): placed after everyone
+        user_score_result = await db.execute(
+            select(RiskScore.current_score).where(RiskScore.user_id == user.id)
+        )
+        user_score = user_score_result.scalar() or 50.0
+        rank = total + 1
+        percentile = int(((total - rank) / max(total, 1)) * 100)
 
     # Category breakdown (simulated from real log data)
-    user_anomaly_result = await db.execute(
-        select(func.count(BehaviorLog.id)).where(
-            BehaviorLog.user_id == user.id, BehaviorLog.anomaly_flag == True
-        )
-    )
-    user_anomalies = user_anomaly_result.scalar() or 0
+    totals = await user_log_totals(db, user.id)
+    user_anomalies = sum(entry["anomaly_count"] for entry in totals.values())
 
     user_categories = {
         "network": max(10, 100 - int(user_score * 0.8) + random.randint(-5, 5)),
@@ -232,7 +201,7 @@ TRAINING_MODULES = [
 
 @router.get("/training-progress", response_model=TrainingProgressResponse)
 async def get_training_progress(
-    user: User = Depends(get_current_user),
+    user: TokenUser = Depends(get_token_user),
 ):
     # Simulate progress — in production this would be stored in DB
     # Use deterministic seed from user id so it's consistent
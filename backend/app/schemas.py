@@ -98,6 +98,10 @@ class LogIngestRequest(BaseModel):
     extra_data: Optional[dict] = None
 
 
+class LogBatchIngestRequest(BaseModel):
+    items: List[LogIngestRequest] = Field(..., min_length=1, max_length=1000)
+
+
 class LogResponse(BaseModel):
     id: int
     user_id: str
@@ -126,6 +130,14 @@ class RiskScoreResponse(BaseModel):
         from_attributes = True
 
 
+class LogBatchIngestResponse(BaseModel):
+    ids: List[int]
+    accepted: int
+    risk: RiskScoreResponse
+    device_risk: Dict[str, float]
+    alert_id: Optional[int] = None
+
+
 # ──── Alerts ────
 class AlertResponse(BaseModel):
     id: int
@@ -138,6 +150,10 @@ class AlertResponse(BaseModel):
     confidence_score: float
     created_at: datetime
     resolved: bool
+    device_id: Optional[str] = None
+    app_name: Optional[str] = None
+    occurrences: int = 1
+    last_seen_at: Optional[datetime] = None
 
     class Config:
         from_attributes = True
@@ -215,6 +231,8 @@ class EscalateRequest(BaseModel):
 class TimelinePoint(BaseModel):
     timestamp: str
     risk_score: float
+    log_count: int = 0
+    anomaly_count: int = 0
 
 class HeatmapPoint(BaseModel):
     hour: int
@@ -232,6 +250,18 @@ class WSAlertMessage(BaseModel):
     timestamp: str
 
 
+class WSAlertUpdateMessage(BaseModel):
+    """Sent once an alert's suppression window closes, if repeats were folded into it."""
+    type: str = "alert_update"
+    alert_id: int
+    alert_type: str
+    severity: str
+    message: str
+    occurrences: int
+    first_seen: str
+    last_seen: str
+
+
 # ──── Wellbeing ────
 class AppUsageItem(BaseModel):
     app_name: str
@@ -295,6 +325,8 @@ class ActivityFeedItem(BaseModel):
     severity: str
     message: str
     created_at: datetime
+    occurrences: int = 1
+    last_seen_at: Optional[datetime] = None
 
     class Config:
         from_attributes = True
@@ -0,0 +1,242 @@
+"""Risk scoring off the event loop, micro-batched into a thread or process pool.
+
+Load test: python -m bench.scoring_load (from backend/).
+"""
+import asyncio
+import logging
+import multiprocessing
+import time
+from collections import OrderedDict
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import List, NamedTuple, Optional, Set
+from app.config import get_settings
+from app.ai_engine import LogAggregate, calculate_risk_batch
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+SCORING_MODES = ("inline", "thread", "process")
+
+
+class ScoringJob(NamedTuple):
+    logs: List[dict]
+    baseline: Optional[dict]
+    aggregate: Optional[LogAggregate]
+    model: object = None
+    # Process workers cannot share the parent's model objects, so they load
+    # the registry's persisted copy instead.
+    model_path: Optional[str] = None
+    model_version: int = 0
+
+
+# Per-process LRU of models loaded from disk: path -> (version, model), bounded like the registry's
+_worker_models: "OrderedDict[str, tuple]" = OrderedDict()
+
+
+def _resolve_model(job: ScoringJob):
+    if job.model is not None or not job.model_path:
+        return job.model
+    cached = _worker_models.get(job.model_path)
+    if cached is None or cached[0] < job.model_version:
+        import joblib
+        try:
+            entry = joblib.load(job.model_path)
+        except FileNotFoundError:
+            # Pruned since the parent picked it: keep what we have, else use the rules
+            return cached[1] if cached else None
+        cached = (entry["version"], entry["model"])
+        _worker_models[job.model_path] = cached
+        while len(_worker_models) > settings.MODEL_CACHED_USER_MODELS:
+            _worker_models.popitem(last=False)
+    _worker_models.move_to_end(job.model_path)
+    return cached[1]
+
+
+def score_jobs(jobs: List[ScoringJob]) -> List[dict]:
+    """Score a micro-batch; runs inside the pool (or inline). Each result is independent of the batch size."""
+    return calculate_risk_batch(
+        [job.logs for job in jobs],
+        [job.baseline for job in jobs],
+        [job.aggregate for job in jobs],
+        [_resolve_model(job) for job in jobs],
+    )
+
+
+class LatencyHistogram:
+    """Cumulative latency histogram in milliseconds (Prometheus-style `le` buckets)."""
+
+    BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000)
+
+    def __init__(self):
+        self.counts = [0] * (len(self.BUCKETS_MS) + 1)
+        self.total = 0
+        self.sum_ms = 0.0
+
+    def observe(self, ms: float):
+        for i, bound in enumerate(self.BUCKETS_MS):
+            if ms <= bound:
+                self.counts[i] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.total += 1
+        self.sum_ms += ms
+
+    def snapshot(self) -> dict:
+        buckets, running = {}, 0
+        for bound, count in zip(self.BUCKETS_MS, self.counts):
+            running += count
+            buckets[f"le_{bound}ms"] = running
+        buckets["le_inf"] = self.total
+        return {"count": self.total, "sum_ms": round(self.sum_ms, 3), "buckets": buckets}
+
+
+class ScoringExecutor:
+    """Runs risk scoring off the event loop.
+
+    `inline` scores on the calling coroutine (the previous behaviour). `thread`
+    and `process` queue jobs, drain them into micro-batches of up to
+    `batch_size` (waiting at most `batch_wait_ms` for stragglers) and hand each
+    batch to a pool of `workers`. At most `workers` batches are in flight, so
+    under saturation jobs wait in the queue and batches grow instead.
+    """
+
+    def __init__(self, mode: str, workers: int, batch_size: int, batch_wait_ms: int):
+        if mode not in SCORING_MODES:
+            raise ValueError(f"SCORING_EXECUTOR must be one of {', '.join(SCORING_MODES)}, got {mode!r}")
+        self.mode = mode
+        self.workers = workers
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait_ms / 1000
+        self._pool: Optional[Executor] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._batcher: Optional[asyncio.Task] = None
+        self._dispatches: Set[asyncio.Task] = set()
+        self.queue_latency = LatencyHistogram()
+        self.total_latency = LatencyHistogram()
+        self.batches = 0
+        self.jobs = 0
+
+    @property
+    def running(self) -> bool:
+        return self._batcher is not None
+
+    async def start(self):
+        if self.mode == "inline":
+            return
+        if self.mode == "process":
+            # spawn, not fork: the parent already runs the event loop and background threads
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers, mp_context=multiprocessing.get_context("spawn")
+            )
+        else:
+            self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="scoring")
+        self._queue = asyncio.Queue()
+        self._slots = asyncio.Semaphore(self.workers)
+        self._batcher = asyncio.create_task(self._run_batcher())
+        logger.info(f"Scoring executor started (mode={self.mode}, workers={self.workers})")
+
+    async def stop(self):
+        if self._batcher:
+            self._batcher.cancel()
+            await asyncio.gather(self._batcher, return_exceptions=True)
+            self._batcher = None
+        # Let batches already handed to the pool finish and resolve their callers
+        await asyncio.gather(*self._dispatches, return_exceptions=True)
+        if self._pool:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    async def score(
+        self,
+        logs: List[dict],
+        baseline: Optional[dict] = None,
+        aggregate: Optional[LogAggregate] = None,
+        model_entry=None,
+    ) -> dict:
+        """Score one window; same result as `calculate_risk`. `model_entry` comes from the model registry."""
+        job = ScoringJob(logs, baseline, aggregate)
+        if model_entry is not None:
+            if self.mode == "process":
+                from app.model_registry import model_registry
+                job = job._replace(model_path=model_registry.path_for(model_entry.key), model_version=model_entry.version)
+            else:
+                job = job._replace(model=model_entry.model)
+
+        submitted = time.perf_counter()
+        if not self.running:
+            # Inline mode, or called outside the app lifespan (scripts, seeding)
+            result = score_jobs([job])[0]
+            self._observe(submitted, submitted)
+            return result
+
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((job, future, submitted))
+        return await future
+
+    def _observe(self, submitted: float, dispatched: float):
+        now = time.perf_counter()
+        self.queue_latency.observe((dispatched - submitted) * 1000)
+        self.total_latency.observe((now - submitted) * 1000)
+        self.jobs += 1
+
+    async def _run_batcher(self):
+        while True:
+            await self._slots.acquire()
+            try:
+                batch = [await self._queue.get()]
+                if self._queue.qsize() < self.batch_size - 1 and self.batch_wait > 0:
+                    await asyncio.sleep(self.batch_wait)
+                while len(batch) < self.batch_size and not self._queue.empty():
+                    batch.append(self._queue.get_nowait())
+            except BaseException:
+                self._slots.release()
+                raise
+            # Held until done: the loop keeps only weak references to tasks
+            task = asyncio.create_task(self._dispatch(batch))
+            self._dispatches.add(task)
+            task.add_done_callback(self._dispatch_done)
+
+    def _dispatch_done(self, task: asyncio.Task):
+        self._dispatches.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"Scoring dispatch crashed: {task.exception()!r}")
+
+    async def _dispatch(self, batch: list):
+        dispatched = time.perf_counter()
+        try:
+            loop = asyncio.get_running_loop()
+            results = await loop.run_in_executor(self._pool, score_jobs, [job for job, _, _ in batch])
+        except Exception as e:
+            logger.error(f"Scoring batch of {len(batch)} failed: {e}")
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+        else:
+            for (_, future, submitted), result in zip(batch, results):
+                self._observe(submitted, dispatched)
+                if not future.done():
+                    future.set_result(result)
+        finally:
+            self.batches += 1
+            self._slots.release()
+
+    def stats(self) -> dict:
+        return {
+            "mode": self.mode,
+            "queue_depth": self._queue.qsize() if self._queue else 0,
+            "jobs": self.jobs,
+            "batches": self.batches,
+            "batches_in_flight": len(self._dispatches),
+            "queue_latency": self.queue_latency.snapshot(),
+            "total_latency": self.total_latency.snapshot(),
+        }
+
+
+scoring_executor = ScoringExecutor(
+    mode=settings.SCORING_EXECUTOR,
+    workers=settings.SCORING_WORKERS,
+    batch_size=settings.SCORING_BATCH_SIZE,
+    batch_wait_ms=settings.SCORING_BATCH_WAIT_MS,
+)
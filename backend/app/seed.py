@@ -2,14 +2,14 @@
 import asyncio
 from datetime import datetime, timezone, timedelta
 import random
-from app.database import engine, async_session, Base
+from app.database import async_session, create_tables
+from app.aggregates import rebuild
 from app.models import User, RiskScore, Alert, BehaviorLog
 from app.auth import hash_password
 
 
 async def seed():
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
+    await create_tables()
 
     async with async_session() as db:
         from sqlalchemy import select, func
@@ -82,9 +82,11 @@ async def seed():
         db.add(RiskScore(user_id=admin.id, current_score=0.0, risk_level="low"))
 
         await db.commit()
-        print("Seed data created successfully!")
-        print("  Admin: admin@sentinelai.com / admin123")
-        print("  Students: student1@university.edu ... student5@university.edu / student123")
+    # Seeded logs bypass ingest, so compute their per-user totals in one pass
+    await rebuild()
+    print("Seed data created successfully!")
+    print("  Admin: admin@sentinelai.com / admin123")
+    print("  Students: student1@university.edu ... student5@university.edu / student123")
 
 
 if __name__ == "__main__":
@@ -1,15 +1,30 @@
 import random
 import asyncio
 import logging
+import time
 from datetime import datetime, timezone
+from typing import Dict, List, NamedTuple, Optional
+from sqlalchemy import select, insert, update, bindparam
 from sqlalchemy.ext.asyncio import AsyncSession
+from app.config import get_settings
 from app.database import async_session
-from app.models import User, BehaviorLog, RiskScore, Alert, Device, BehaviorProfile, DataAccessLog
-from app.ai_engine import calculate_risk
+from app.models import User, BehaviorLog, RiskScore, Device, BehaviorProfile, DataAccessLog
 from app.websocket_manager import manager
-from sqlalchemy import select
+from app.rolling_window import rolling_windows
+from app.model_registry import model_registry
+from app.scoring_executor import scoring_executor
+from app.counters import admin_stats
+from app.rollups import record_rollups, rollup_row
+from app.aggregates import record_user_logs
+from app.leaderboard import leaderboard
+from app.alert_dedup import alert_aggregator, AlertCandidate, RaisedAlert, alert_message
+from app.ai_engine import HAS_NUMPY, FEATURE_FIELDS
+
+if HAS_NUMPY:
+    import numpy as np
 
 logger = logging.getLogger(__name__)
+settings = get_settings()
 
 APPS = [
     "WhatsApp", "Instagram", "Chrome", "TikTok", "Snapchat",
@@ -39,135 +54,274 @@ def generate_log(anomaly_chance: float = 0.2) -> dict:
     }
 
 
-async def simulate_for_device(db: AsyncSession, user_id: str, device_id: str, anomaly_chance: float = 0.2):
-    log_data = generate_log(anomaly_chance)
+def generate_logs(anomaly_chances: List[float]) -> List[dict]:
+    """One log per entry of `anomaly_chances`, drawn from the same distribution as `generate_log`."""
+    if not HAS_NUMPY:
+        return [generate_log(chance) for chance in anomaly_chances]
 
-    log_entry = BehaviorLog(
-        user_id=user_id,
-        device_id=device_id,
-        app_name=log_data["app_name"],
-        permission_requested=log_data["permission_requested"],
-        network_activity_level=log_data["network_activity_level"],
-        background_process_flag=log_data["background_process_flag"],
-        anomaly_flag=log_data["anomaly_flag"],
-        log_data=log_data,
-    )
-    db.add(log_entry)
-    await db.flush()
-
-    # Privacy Transparency: Log data access for simulator AI check
-    db.add(DataAccessLog(
-        user_id=user_id, 
-        data_type="Device Telemetry", 
-        purpose="Automated Background Anomaly Detection"
-    ))
-
-    # Fetch User Baseline
-    bp_result = await db.execute(select(BehaviorProfile).where(BehaviorProfile.user_id == user_id))
-    profile = bp_result.scalar_one_or_none()
-    baseline = profile.baseline_metrics if profile else None
-
-    # Get recent logs
-    result = await db.execute(
-        select(BehaviorLog)
-        .where(BehaviorLog.user_id == user_id)
-        .order_by(BehaviorLog.timestamp.desc())
-        .limit(50)
+    n = len(anomaly_chances)
+    rng = np.random.default_rng()
+    is_anomaly = rng.random(n) < np.asarray(anomaly_chances)
+    apps = np.where(
+        is_anomaly,
+        rng.choice(sorted(SUSPICIOUS_APPS), n),
+        rng.choice(APPS[:15], n),
     )
-    recent_logs = result.scalars().all()
-    logs_dicts = [
+    has_permission = is_anomaly | (rng.random(n) < 0.3)
+    permissions = np.where(has_permission, rng.choice(PERMISSIONS[1:], n), "none")
+    network = np.round(np.where(is_anomaly, rng.uniform(60, 100, n), rng.uniform(0, 40, n)), 1)
+    background = is_anomaly | (rng.random(n) < 0.1)
+
+    return [
         {
-            "permission_requested": l.permission_requested,
-            "network_activity_level": l.network_activity_level,
-            "background_process_flag": l.background_process_flag,
-            "anomaly_flag": l.anomaly_flag,
+            "app_name": app,
+            "permission_requested": permission,
+            "network_activity_level": level,
+            "background_process_flag": bg,
+            "anomaly_flag": anomaly,
         }
-        for l in recent_logs
+        for app, permission, level, bg, anomaly in zip(
+            apps.tolist(), permissions.tolist(), network.tolist(), background.tolist(), is_anomaly.tolist()
+        )
     ]
 
-    risk = calculate_risk(logs_dicts, baseline=baseline)
-    score = risk["score"]
-    level = risk["level"]
-    explanation = risk.get("explanation", "")
-    recommendation = risk.get("recommendation", "")
-    severity = risk.get("severity", "high")
 
-    rs_result = await db.execute(
-        select(RiskScore).where(RiskScore.user_id == user_id)
-    )
-    risk_score = rs_result.scalar_one_or_none()
-    if risk_score:
-        risk_score.current_score = score
-        risk_score.risk_level = level
-        risk_score.last_updated = datetime.now(timezone.utc)
-    else:
-        risk_score = RiskScore(user_id=user_id, current_score=score, risk_level=level)
-        db.add(risk_score)
-
-    if score > 70:
-        alert = Alert(
-            user_id=user_id,
-            alert_type="high_risk_behavior",
-            severity=severity,
-            message=f"Risk score {score}: suspicious activity from {log_data['app_name']}",
-            explanation_text=explanation or f"Anomalous app behavior in {log_data['app_name']}",
-            recommendation=recommendation or "Review device activity.",
-            confidence_score=0.9
-        )
-        db.add(alert)
-        await db.flush()
+class FleetStudent(NamedTuple):
+    user_id: str
+    college: Optional[str]
+    device_ids: List[str]
 
-        await manager.send_to_user(str(user_id), {
-            "type": "alert",
-            "alert_id": alert.id,
-            "alert_type": alert.alert_type,
-            "severity": alert.severity,
-            "message": alert.message,
-            "recommendation": alert.recommendation,
-            "timestamp": datetime.now(timezone.utc).isoformat(),
-            "risk_score": score,
-        })
 
-    await db.commit()
+class FleetSimulator:
+    """Generates one behavior log per consented student device every tick.
 
+    The fleet is loaded with a single join and split into chunks of
+    `chunk_size` students. Each chunk runs in its own session and transaction:
+    logs, audit entries and alerts are bulk-inserted, risk is rescored for the
+    whole chunk as one executor batch, and `RiskScore` rows are updated or
+    inserted in bulk. Up to `concurrency` chunks run at once.
+    """
 
-async def run_simulator(interval: int = 30):
-    logger.info(f"Device simulator started (interval={interval}s)")
-    while True:
-        try:
-            async with async_session() as db:
+    def __init__(self, chunk_size: int, concurrency: int):
+        self.chunk_size = chunk_size
+        # SQLite allows one writer at a time; parallel chunks would only contend for the lock
+        self.concurrency = 1 if settings.DATABASE_URL.startswith("sqlite") else concurrency
+        self.ticks = 0
+        self.overruns = 0
+        self.last_tick: Dict[str, float] = {}
+
+    async def load_fleet(self) -> List[FleetStudent]:
+        async with async_session() as db:
+            result = await db.execute(
+                select(User.id, User.college, Device.id.label("device_id"))
+                .outerjoin(Device, Device.user_id == User.id)
+                .where(User.role == "student", User.consent_given == True)
+                .order_by(User.id)
+            )
+            fleet: Dict[str, FleetStudent] = {}
+            for row in result.all():
+                student = fleet.setdefault(row.id, FleetStudent(row.id, row.college, []))
+                if row.device_id:
+                    student.device_ids.append(row.device_id)
+
+            # Auto register a default device for students that have none
+            missing = [s for s in fleet.values() if not s.device_ids]
+            if missing:
                 result = await db.execute(
-                    select(User).where(
-                        User.role == "student",
-                        User.consent_given == True,
-                    )
+                    insert(Device).returning(Device.id, sort_by_parameter_order=True),
+                    [{"user_id": s.user_id, "device_name": "Main Phone", "device_type": "smartphone"} for s in missing],
                 )
-                students = result.scalars().all()
-
-                devices_simulated = 0
-                for student in students:
-                    anomaly_chance = random.uniform(0.1, 0.35)
-                    
-                    # Fetch devices
-                    dev_res = await db.execute(select(Device).where(Device.user_id == student.id))
-                    devices = dev_res.scalars().all()
-                    
-                    if not devices:
-                        # Auto register default device if none exist
-                        main_device = Device(user_id=student.id, device_name="Main Phone", device_type="smartphone")
-                        db.add(main_device)
-                        await db.commit()
-                        await db.refresh(main_device)
-                        devices = [main_device]
-                        
-                    for d in devices:
-                        await simulate_for_device(db, student.id, d.id, anomaly_chance)
-                        devices_simulated += 1
-
-                if devices_simulated > 0:
-                    logger.info(f"Simulated logs for {devices_simulated} devices across {len(students)} students")
-
-        except Exception as e:
-            logger.error(f"Simulator error: {e}")
-
-        await asyncio.sleep(interval)
+                for student, device_id in zip(missing, result.scalars()):
+                    student.device_ids.append(device_id)
+                await db.commit()
+        return list(fleet.values())
+
+    async def simulate_chunk(self, db: AsyncSession, students: List[FleetStudent]) -> int:
+        """Simulate one tick for a chunk of students and commit. Returns the number of events written."""
+        targets = []
+        for student in students:
+            anomaly_chance = random.uniform(0.1, 0.35)
+            targets.extend((student, device_id, anomaly_chance) for device_id in student.device_ids)
+        generated = generate_logs([chance for _, _, chance in targets])
+
+        log_rows = [
+            {**log, "user_id": student.user_id, "device_id": device_id, "log_data": log}
+            for (student, device_id, _), log in zip(targets, generated)
+        ]
+        await db.execute(insert(BehaviorLog), log_rows)
+        # Privacy Transparency: Log data access for simulator AI check
+        await db.execute(insert(DataAccessLog), [
+            {"user_id": s.user_id, "data_type": "Device Telemetry", "purpose": "Automated Background Anomaly Detection"}
+            for s in students
+        ])
+
+        user_ids = [s.user_id for s in students]
+        result = await db.execute(
+            select(BehaviorProfile.user_id, BehaviorProfile.baseline_metrics)
+            .where(BehaviorProfile.user_id.in_(user_ids))
+        )
+        baselines = dict(result.all())
+
+        new_logs: Dict[str, List[dict]] = {}
+        last_source: Dict[str, tuple] = {}  # user_id -> (app_name, device_id) of their last event
+        anomalies: Dict[str, int] = {}
+        for (student, device_id, _), log in zip(targets, generated):
+            new_logs.setdefault(student.user_id, []).append({f: log[f] for f in FEATURE_FIELDS})
+            last_source[student.user_id] = (log["app_name"], device_id)
+            anomalies[student.user_id] = anomalies.get(student.user_id, 0) + int(log["anomaly_flag"])
+        # Staged on the session: the windows only take these logs if the commit below succeeds
+        windows = await rolling_windows.record_many(db, new_logs)
+
+        # Submitted together so the executor scores the chunk as micro-batches
+        entries = [model_registry.entry_for(s.user_id, s.college) for s in students]
+        risks = await asyncio.gather(*(
+            scoring_executor.score(windows[s.user_id].logs, baselines.get(s.user_id), windows[s.user_id].aggregate, entry)
+            for s, entry in zip(students, entries)
+        ))
+        risk_by_user = dict(zip(user_ids, risks))
+
+        await self._store_risk_scores(db, risk_by_user)
+        for student in students:
+            leaderboard.record(db.sync_session, student.user_id, student.college, risk_by_user[student.user_id]["score"])
+        alerts = await self._raise_alerts(db, risk_by_user, last_source)
+        new_alerts = {alert.candidate.user_id for alert in alerts if alert.new}
+        await record_user_logs(db, log_rows)
+        await record_rollups(db, [
+            rollup_row(
+                s.college,
+                log_count=len(s.device_ids),
+                anomaly_count=anomalies[s.user_id],
+                alert_count=int(s.user_id in new_alerts),
+                risk_sum=risk_by_user[s.user_id]["score"],
+                risk_samples=1,
+            )
+            for s in students
+        ])
+        await db.commit()
+        for student in students:
+            model_registry.record_logs(student.user_id, student.college, len(student.device_ids))
+
+        # Repeats folded into an open alert are reported once, when its window closes
+        timestamp = datetime.now(timezone.utc)
+        for alert in alerts:
+            if alert.new:
+                await manager.send_to_user(str(alert.candidate.user_id), alert_message(alert.id, alert.candidate, timestamp))
+        return len(targets)
+
+    async def _store_risk_scores(self, db: AsyncSession, risk_by_user: Dict[str, dict]):
+        result = await db.execute(
+            select(RiskScore.id, RiskScore.user_id, RiskScore.risk_level)
+            .where(RiskScore.user_id.in_(list(risk_by_user)))
+        )
+        existing = {}
+        for rs_id, user_id, old_level in result.all():
+            existing[user_id] = rs_id
+            admin_stats.record_change(db.sync_session, RiskScore, old_level, risk_by_user[user_id]["level"])
+        now = datetime.now(timezone.utc)
+        if existing:
+            await db.execute(
+                update(RiskScore.__table__)
+                .where(RiskScore.id == bindparam("b_id"))
+                .values(current_score=bindparam("b_score"), risk_level=bindparam("b_level"), last_updated=now),
+                [
+                    {"b_id": rs_id, "b_score": risk_by_user[user_id]["score"], "b_level": risk_by_user[user_id]["level"]}
+                    for user_id, rs_id in existing.items()
+                ],
+            )
+        missing = [user_id for user_id in risk_by_user if user_id not in existing]
+        if missing:
+            await db.execute(insert(RiskScore), [
+                {"user_id": user_id, "current_score": risk_by_user[user_id]["score"], "risk_level": risk_by_user[user_id]["level"]}
+                for user_id in missing
+            ])
+
+    async def _raise_alerts(self, db: AsyncSession, risk_by_user: Dict[str, dict], last_source: Dict[str, tuple]) -> List[RaisedAlert]:
+        candidates = []
+        for user_id, risk in risk_by_user.items():
+            if risk["score"] <= 70:
+                continue
+            app_name, device_id = last_source[user_id]
+            candidates.append(AlertCandidate(
+                user_id=user_id,
+                device_id=device_id,
+                app_name=app_name,
+                alert_type="high_risk_behavior",
+                severity=risk.get("severity", "high"),
+                message=f"Risk score {risk['score']}: suspicious activity from {app_name}",
+                explanation_text=risk.get("explanation") or f"Anomalous app behavior in {app_name}",
+                recommendation=risk.get("recommendation") or "Review device activity.",
+                confidence_score=0.9,
+                risk_score=risk["score"],
+            ))
+        return await alert_aggregator.raise_alerts(db, candidates)
+
+    async def _run_chunk(self, slots: asyncio.Semaphore, students: List[FleetStudent]) -> int:
+        async with slots:
+            try:
+                async with async_session() as db:
+                    try:
+                        return await self.simulate_chunk(db, students)
+                    except Exception:
+                        await db.rollback()  # drops the staged window appends with the transaction
+                        raise
+            except Exception as e:
+                logger.error(f"Simulator chunk of {len(students)} students failed: {e}")
+                return 0
+
+    async def tick(self, interval: int) -> dict:
+        started = time.perf_counter()
+        fleet = await self.load_fleet()
+        slots = asyncio.Semaphore(self.concurrency)
+        counts = await asyncio.gather(*(
+            self._run_chunk(slots, fleet[i:i + self.chunk_size])
+            for i in range(0, len(fleet), self.chunk_size)
+        ))
+        elapsed = time.perf_counter() - started
+        events = sum(counts)
+        self.ticks += 1
+        overrun = max(0.0, elapsed - interval)
+        if overrun:
+            self.overruns += 1
+        self.last_tick = {
+            "students": len(fleet),
+            "events": events,
+            "seconds": round(elapsed, 3),
+            "events_per_second": round(events / elapsed, 1) if elapsed else 0.0,
+            "overrun_seconds": round(overrun, 3),
+        }
+        return self.last_tick
+
+    async def run(self, interval: int):
+        logger.info(f"Device simulator started (interval={interval}s, chunk={self.chunk_size}, concurrency={self.concurrency})")
+        while True:
+            started = time.perf_counter()
+            try:
+                stats = await self.tick(interval)
+                if stats["events"]:
+                    logger.info(
+                        f"Simulated {stats['events']} events for {stats['students']} students in {stats['seconds']}s "
+                        f"({stats['events_per_second']}/s)"
+                    )
+                if stats["overrun_seconds"]:
+                    logger.warning(f"Simulator tick overran its {interval}s interval by {stats['overrun_seconds']}s")
+            except Exception as e:
+                logger.error(f"Simulator error: {e}")
+            await asyncio.sleep(max(0.0, interval - (time.perf_counter() - started)))
+
+    def stats(self) -> dict:
+        return {
+            "ticks": self.ticks,
+            "overruns": self.overruns,
+            "concurrency": self.concurrency,
+            "last_tick": self.last_tick,
+        }
+
+
+fleet_simulator = FleetSimulator(
+    chunk_size=settings.SIMULATOR_CHUNK_SIZE,
+    concurrency=settings.SIMULATOR_CONCURRENCY,
+)
+
+
+async def run_simulator(interval: int = 30):
+    await fleet_simulator.run(interval)
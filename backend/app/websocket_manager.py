@@ -1,51 +1,205 @@
+"""Per-user WebSocket connections with bounded send queues, fanned out across workers.
+
+Load test: python -m bench.websocket_fanout (from backend/).
+"""
 from fastapi import WebSocket
-from typing import Dict, List
+from collections import deque
+from typing import Deque, Dict, List, Optional
+import asyncio
 import json
 import logging
+from app.config import get_settings
+from app.pubsub import PubSubBackend, create_backend
 
 logger = logging.getLogger(__name__)
+settings = get_settings()
+
+SLOW_CONSUMER_POLICIES = ("drop_oldest", "coalesce", "disconnect")
+
+
+class Connection:
+    """One WebSocket with a bounded outbound queue drained by its own writer task.
+
+    Senders only enqueue, so a slow client never stalls delivery to anyone
+    else. When the queue is full the slow-consumer `policy` applies:
+    `drop_oldest` discards the oldest pending message, `coalesce` keeps only
+    the newest pending message of each type, and `disconnect` closes the socket.
+    """
+
+    def __init__(self, websocket: WebSocket, user_id: str, max_queue: int, policy: str, send_timeout: float):
+        self.websocket = websocket
+        self.user_id = user_id
+        self.max_queue = max_queue
+        self.policy = policy
+        self.send_timeout = send_timeout
+        self.dropped = 0
+        self.closed = False
+        self._pending: Deque[tuple] = deque()
+        self._ready = asyncio.Event()
+        self._writer = asyncio.create_task(self._write_loop())
+
+    def send(self, text: str, kind: str = "") -> bool:
+        """Queue a pre-serialized message. Returns False if the connection is (now) closed."""
+        if self.closed:
+            return False
+        if len(self._pending) >= self.max_queue:
+            if self.policy == "disconnect":
+                logger.warning(f"Disconnecting slow WebSocket consumer for user {self.user_id}")
+                self.close(code=1013)
+                return False
+            if self.policy == "coalesce":
+                latest = {}
+                for pending_kind, pending_text in self._pending:
+                    latest.pop(pending_kind, None)
+                    latest[pending_kind] = pending_text
+                latest.pop(kind, None)
+                self.dropped += len(self._pending) - len(latest)
+                self._pending = deque(latest.items())
+            if len(self._pending) >= self.max_queue:
+                self._pending.popleft()
+                self.dropped += 1
+        self._pending.append((kind, text))
+        self._ready.set()
+        return True
+
+    async def _write_loop(self):
+        try:
+            while True:
+                await self._ready.wait()
+                while self._pending:
+                    _, text = self._pending.popleft()
+                    await asyncio.wait_for(self.websocket.send_text(text), self.send_timeout)
+                self._ready.clear()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.info(f"WebSocket writer for user {self.user_id} stopped: {e}")
+            self.closed = True
+
+    def close(self, code: int = 1000):
+        if self.closed:
+            return
+        self.closed = True
+        self._writer.cancel()
+        asyncio.create_task(self._close_socket(code))
+
+    async def _close_socket(self, code: int):
+        try:
+            await self.websocket.close(code=code)
+        except Exception:
+            pass
+
+    def detach(self):
+        """Stop the writer without touching the socket (it is already gone)."""
+        self.closed = True
+        self._writer.cancel()
 
 
 class ConnectionManager:
-    """Manages WebSocket connections per user for real-time alerts."""
+    """Manages WebSocket connections per user for real-time alerts.
+
+    Sockets live in whichever worker accepted them, so outgoing messages are
+    published to a pub/sub backend and every worker delivers them to its own
+    local connections. Until `start` is called (scripts, seeding) messages are
+    delivered locally only. Each message is serialized once at the origin and
+    the same string is queued on every recipient's Connection.
+    """
+
+    def __init__(self, backend: Optional[PubSubBackend] = None):
+        self.active_connections: Dict[str, List[Connection]] = {}
+        self.backend = backend
+        self.max_queue = settings.WS_SEND_QUEUE_SIZE
+        self.policy = settings.WS_SLOW_CONSUMER_POLICY
+        if self.policy not in SLOW_CONSUMER_POLICIES:
+            raise ValueError(f"WS_SLOW_CONSUMER_POLICY must be one of {', '.join(SLOW_CONSUMER_POLICIES)}")
+        self.send_timeout = settings.WS_SEND_TIMEOUT_SECONDS
+        self._started = False
+        self.dropped_closed = 0
 
-    def __init__(self):
-        self.active_connections: Dict[str, List[WebSocket]] = {}
+    async def start(self):
+        if self.backend is None:
+            self.backend = create_backend(settings, channel="sentinelai:ws")
+        await self.backend.start(self._on_published)
+        self._started = True
+        logger.info(f"WebSocket fan-out started (backend={self.backend.name})")
 
-    async def connect(self, websocket: WebSocket, user_id: str):
+    async def stop(self):
+        if self._started:
+            await self.backend.stop()
+            self._started = False
+
+    async def connect(self, websocket: WebSocket, user_id: str) -> Connection:
         await websocket.accept()
+        connection = Connection(websocket, user_id, self.max_queue, self.policy, self.send_timeout)
         if user_id not in self.active_connections:
             self.active_connections[user_id] = []
-        self.active_connections[user_id].append(websocket)
+        self.active_connections[user_id].append(connection)
         logger.info(f"WebSocket connected for user {user_id}")
+        return connection
 
     def disconnect(self, websocket: WebSocket, user_id: str):
         if user_id in self.active_connections:
-            self.active_connections[user_id] = [
-                ws for ws in self.active_connections[user_id] if ws != websocket
-            ]
+            remaining = []
+            for conn in self.active_connections[user_id]:
+                if conn.websocket is websocket:
+                    conn.detach()
+                else:
+                    remaining.append(conn)
+            self.active_connections[user_id] = remaining
             if not self.active_connections[user_id]:
                 del self.active_connections[user_id]
         logger.info(f"WebSocket disconnected for user {user_id}")
 
+    async def _publish(self, user_id: Optional[str], message: dict):
+        text = json.dumps(message)
+        kind = message.get("type", "")
+        if not self._started:
+            self._deliver_local(user_id, text, kind)
+            return
+        try:
+            await self.backend.publish(json.dumps({"user_id": user_id, "kind": kind, "text": text}))
+        except Exception as e:
+            # Broker unavailable: still reach sockets held by this worker
+            logger.warning(f"WebSocket publish failed ({e}), delivering locally only")
+            self._deliver_local(user_id, text, kind)
+
+    async def _on_published(self, payload: str):
+        envelope = json.loads(payload)
+        self._deliver_local(envelope["user_id"], envelope["text"], envelope.get("kind", ""))
+
+    def _deliver_local(self, user_id: Optional[str], text: str, kind: str):
+        user_ids = list(self.active_connections.keys()) if user_id is None else [user_id]
+        for uid in user_ids:
+            connections = self.active_connections.get(uid)
+            if not connections:
+                continue
+            live = [conn for conn in connections if conn.send(text, kind)]
+            if len(live) != len(connections):
+                self.dropped_closed += len(connections) - len(live)
+                if live:
+                    self.active_connections[uid] = live
+                else:
+                    del self.active_connections[uid]
+
     async def send_to_user(self, user_id: str, message: dict):
-        if user_id in self.active_connections:
-            dead = []
-            for ws in self.active_connections[user_id]:
-                try:
-                    await ws.send_text(json.dumps(message))
-                except Exception:
-                    dead.append(ws)
-            for ws in dead:
-                self.active_connections[user_id].remove(ws)
+        await self._publish(user_id, message)
 
     async def broadcast(self, message: dict):
-        for user_id in list(self.active_connections.keys()):
-            await self.send_to_user(user_id, message)
+        await self._publish(None, message)
 
     @property
     def connected_count(self) -> int:
         return sum(len(conns) for conns in self.active_connections.values())
 
+    def stats(self) -> dict:
+        connections = [conn for conns in self.active_connections.values() for conn in conns]
+        return {
+            "connections": len(connections),
+            "queued": sum(len(conn._pending) for conn in connections),
+            "dropped_messages": sum(conn.dropped for conn in connections),
+            "closed_connections": self.dropped_closed,
+            "policy": self.policy,
+        }
+
 
 manager = ConnectionManager()
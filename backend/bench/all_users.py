@@ -0,0 +1,119 @@
+"""Benchmark the paged admin all-users list against the old unpaged one.
+
+Seeds its own users and alerts, so point it at an empty scratch database:
+
+    DATABASE_URL=sqlite+aiosqlite:////tmp/users-bench.db python -m bench.all_users --users 100000
+"""
+import argparse
+import asyncio
+import random
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import List
+from fastapi import Response
+from sqlalchemy import func, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database import async_session, create_tables, engine
+from app.models import Alert, RiskScore, User
+from app.routers.admin_router import get_all_users
+from app.schemas import UserListItem
+
+
+async def _unpaged_users(db: AsyncSession, search: str = "") -> List[UserListItem]:
+    """How all-users worked before paging: every matching user, one alert-count query each."""
+    query = select(User, RiskScore.current_score, RiskScore.risk_level).outerjoin(RiskScore, User.id == RiskScore.user_id)
+    if search:
+        query = query.where(User.name.ilike(f"%{search}%") | User.email.ilike(f"%{search}%"))
+    items = []
+    for user, score, level in (await db.execute(query.order_by(User.created_at.desc()))).all():
+        alert_count = (await db.execute(select(func.count(Alert.id)).where(Alert.user_id == user.id))).scalar() or 0
+        items.append(UserListItem(
+            id=user.id, name=user.name, email=user.email, college=user.college, role=user.role,
+            consent_given=user.consent_given, risk_score=round(float(score), 1) if score else None,
+            risk_level=level, alert_count=alert_count, created_at=user.created_at,
+        ))
+    return items
+
+
+async def benchmark(users: int, alerts: int, seed: int = 1) -> int:
+    """Seed `users` users, time the old full list against paging, and check a cursor walk returns the same users."""
+    await create_tables()
+    async with async_session() as db:
+        if (await db.execute(select(func.count(User.id)))).scalar():
+            print("The benchmark seeds its own users: point DATABASE_URL at an empty scratch database")
+            return 2
+    rnd = random.Random(seed)
+    base = datetime(2025, 1, 1)
+    rows = [
+        # Three users per second, so pages break inside runs of equal created_at
+        {"id": str(uuid.UUID(int=rnd.getrandbits(128))), "name": f"Name{i:06d}", "email": f"user{i}@uni{i % 50}.edu",
+         "hashed_password": "x", "role": "student", "college": f"College {i % 5}", "consent_given": True,
+         "created_at": base + timedelta(seconds=i // 3)}
+        for i in range(users)
+    ]
+    async with async_session() as db:
+        for start in range(0, users, 10000):
+            chunk = rows[start:start + 10000]
+            await db.execute(insert(User), chunk)
+            await db.execute(insert(RiskScore), [
+                {"user_id": row["id"], "current_score": rnd.uniform(0, 100), "risk_level": "low"} for row in chunk
+            ])
+        for start in range(0, alerts, 10000):
+            await db.execute(insert(Alert), [
+                {"user_id": rnd.choice(rows)["id"], "alert_type": "bench", "severity": "low", "message": "bench"}
+                for _ in range(min(10000, alerts - start))
+            ])
+        await db.commit()
+
+    def timed(label: str, started: float, detail: str):
+        print(f"  {label:38s} {(time.perf_counter() - started) * 1000:10.1f} ms  {detail}")
+
+    failures = 0
+    print(f"{users} users, {alerts} alerts")
+    async with async_session() as db:
+        started = time.perf_counter()
+        unpaged = await _unpaged_users(db)
+        timed("old: whole list", started, f"{len(unpaged)} rows")
+        started = time.perf_counter()
+        found = await _unpaged_users(db, "Name0999")
+        timed("old: substring search", started, f"{len(found)} rows")
+
+        started = time.perf_counter()
+        page = await get_all_users(Response(), db=db, admin=None, search="", match="substring", role_filter="all", limit=100, cursor=None)
+        timed("new: first page", started, f"{len(page)} rows")
+        walked, cursor, pages = [], None, 0
+        started = time.perf_counter()
+        while True:
+            response = Response()
+            walked += await get_all_users(response, db=db, admin=None, search="", match="substring", role_filter="all", limit=500, cursor=cursor)
+            pages += 1
+            cursor = response.headers.get("X-Next-Cursor")
+            if not cursor:
+                break
+        timed("new: cursor walk, pages of 500", started, f"{len(walked)} rows in {pages} pages")
+        for match in ("substring", "prefix"):
+            started = time.perf_counter()
+            hits = await get_all_users(Response(), db=db, admin=None, search="Name0999", match=match, role_filter="all", limit=100, cursor=None)
+            timed(f"new: {match} search, first page", started, f"{len(hits)} rows")
+            if {u.id for u in hits} != {u.id for u in found}:
+                failures += 1
+                print(f"  {match} search returned other users than the old search")
+
+    old = {u.id: (u.alert_count, u.risk_score) for u in unpaged}
+    new = {u.id: (u.alert_count, u.risk_score) for u in walked}
+    if old != new or len(walked) != len(new):
+        failures += 1
+        print(f"  cursor walk differs from the old list: {len(walked)} rows, {len(new)} distinct, {len(old)} expected")
+    print(f"  cursor walk matches the old list: {'yes' if old == new and len(walked) == len(new) else 'no'}")
+    await engine.dispose()
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Seed a scratch database and compare the all-users list with and without paging")
+    parser.add_argument("--users", type=int, default=100000)
+    parser.add_argument("--alerts", type=int, default=200000)
+    args = parser.parse_args()
+    sys.exit(asyncio.run(benchmark(args.users, args.alerts)))
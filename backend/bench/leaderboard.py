@@ -0,0 +1,117 @@
+"""Benchmark the Fenwick-tree leaderboard against the old full-scan ranking.
+
+Seeds its own students, so point it at an empty scratch database:
+
+    DATABASE_URL=sqlite+aiosqlite:////tmp/leaderboard-bench.db python -m bench.leaderboard --students 100000
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import sys
+import time
+from typing import Dict, Tuple
+from sqlalchemy import func, insert, select
+from app.database import async_session, create_tables, engine
+from app.leaderboard import Leaderboard
+from app.models import RiskScore, User
+
+
+async def _scan_rank(db, user_id: str) -> Tuple[int, int, float]:
+    """How the endpoint ranked before the trees: every student's score, sorted, walked in Python."""
+    result = await db.execute(
+        select(RiskScore.user_id, RiskScore.current_score)
+        .join(User, User.id == RiskScore.user_id)
+        .where(User.role == "student")
+        .order_by(RiskScore.current_score.asc())
+    )
+    scores = result.all()
+    rank = 1 + next((i for i, row in enumerate(scores) if row.user_id == user_id), len(scores))
+    return rank, len(scores), sum(row.current_score for row in scores) / max(len(scores), 1)
+
+
+async def benchmark(students: int, colleges: int, samples: int, seed: int = 7) -> int:
+    """Seed `students` scored students, check sampled ranks against brute force and time both paths."""
+    await create_tables()
+    async with async_session() as db:
+        if (await db.execute(select(func.count(User.id)))).scalar():
+            print("The benchmark seeds its own users: point DATABASE_URL at an empty scratch database")
+            return 2
+    rnd = random.Random(seed)
+    # Every 50th user is an admin, who must not be ranked
+    users = [
+        {"id": f"bench-{i:06d}", "name": f"Bench {i}", "email": f"bench{i}@example.edu", "hashed_password": "x",
+         "college": f"College {rnd.randrange(colleges)}", "role": "admin" if i % 50 == 0 else "student"}
+        for i in range(students)
+    ]
+    scores = {user["id"]: round(rnd.uniform(0, 100), 1) for user in users}
+    async with async_session() as db:
+        for start in range(0, students, 10000):
+            chunk = users[start:start + 10000]
+            await db.execute(insert(User), chunk)
+            await db.execute(insert(RiskScore), [
+                {"user_id": user["id"], "current_score": scores[user["id"]], "risk_level": "low"} for user in chunk
+            ])
+        await db.commit()
+
+    board = Leaderboard(resync_interval=0)
+    started = time.perf_counter()
+    await board.reload()
+    warm_ms = (time.perf_counter() - started) * 1000
+
+    ranked = [user for user in users if user["role"] == "student"]
+    campus = sorted(scores[user["id"]] for user in ranked)
+    by_college: Dict[str, list] = {}
+    for user in ranked:
+        by_college.setdefault(user["college"], []).append(scores[user["id"]])
+    sample = rnd.sample(ranked, min(samples, len(ranked)))
+    failures = 0
+    for user in sample:
+        score, own = scores[user["id"]], by_college[user["college"]]
+        expected = [
+            (1 + sum(1 for v in campus if v < score), len(campus), sum(campus) / len(campus)),
+            (1 + sum(1 for v in own if v < score), len(own), sum(own) / len(own)),
+        ]
+        for college, (rank, total, average) in zip((None, user["college"]), expected):
+            got = board.standing(user["id"], college)
+            if got["rank"] != rank or got["total"] != total or abs(got["average"] - average) > 1e-6:
+                failures += 1
+                print(f"  mismatch for {user['id']} ({college or 'campus'}): {got} != rank {rank}, total {total}")
+    if board.standing(users[0]["id"]) is not None:
+        failures += 1
+        print("  an admin was ranked")
+
+    tree_us = []
+    for user in sample:
+        started = time.perf_counter()
+        board.standing(user["id"])
+        board.standing(user["id"], user["college"])
+        board.summary()
+        tree_us.append((time.perf_counter() - started) * 1e6)
+    scan_ms = []
+    async with async_session() as db:
+        for user in sample[:10]:
+            started = time.perf_counter()
+            await _scan_rank(db, user["id"])
+            scan_ms.append((time.perf_counter() - started) * 1000)
+    started = time.perf_counter()
+    for user in sample:
+        board._set(user["id"], user["college"], round(rnd.uniform(0, 100), 1))
+    update_us = (time.perf_counter() - started) / len(sample) * 1e6
+
+    print(f"{len(ranked)} students in {colleges} colleges, trees loaded in {warm_ms:.0f} ms")
+    print(f"  {'full scan (old endpoint), per request:':44s} median {statistics.median(scan_ms) * 1000:10.1f} us")
+    print(f"  {'trees, campus + college rank and summary:':44s} median {statistics.median(tree_us):10.1f} us")
+    print(f"  {'trees, score update:':44s}        {update_us:10.1f} us")
+    print(f"  {len(sample)} sampled standings checked against brute force: {failures} mismatches")
+    await engine.dispose()
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Seed a scratch database and compare leaderboard ranking paths")
+    parser.add_argument("--students", type=int, default=100000)
+    parser.add_argument("--colleges", type=int, default=20)
+    parser.add_argument("--samples", type=int, default=200, help="standings checked and timed (10 for the full scan)")
+    args = parser.parse_args()
+    sys.exit(asyncio.run(benchmark(args.students, args.colleges, args.samples)))
@@ -0,0 +1,38 @@
+"""Load test: concurrent bcrypt verifications straight through the pool, per pool size.
+
+    python -m bench.password_hashing --workers 1,2,4 --requests 64
+"""
+import argparse
+import asyncio
+import os
+import time
+from app.auth import hash_password
+from app.config import get_settings
+from app.password_hasher import PasswordHasher
+
+settings = get_settings()
+
+
+async def load_test(mode: str, worker_counts, requests: int):
+    hashed = hash_password("load-test-password")
+    print(f"{requests} concurrent verifications per run, BCRYPT_ROUNDS={settings.BCRYPT_ROUNDS}, {os.cpu_count()} CPUs")
+    baseline = None
+    for workers in worker_counts:
+        hasher = PasswordHasher(mode, workers, max_queue=requests)
+        await hasher.start()
+        await hasher.verify("load-test-password", hashed)  # warm the pool (process mode spawns lazily)
+        started = time.perf_counter()
+        await asyncio.gather(*(hasher.verify("load-test-password", hashed) for _ in range(requests)))
+        rate = requests / (time.perf_counter() - started)
+        await hasher.stop()
+        baseline = baseline or rate
+        print(f"  {mode} x{workers}: {rate:7.1f} logins/s  ({rate / baseline:.2f}x)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure login hashing throughput per pool size")
+    parser.add_argument("--mode", choices=["thread", "process"], default=settings.PASSWORD_HASH_EXECUTOR)
+    parser.add_argument("--workers", default="1,2,4", help="comma-separated pool sizes to compare")
+    parser.add_argument("--requests", type=int, default=64)
+    args = parser.parse_args()
+    asyncio.run(load_test(args.mode, [int(n) for n in args.workers.split(",")], args.requests))
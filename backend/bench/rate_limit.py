@@ -0,0 +1,36 @@
+"""Micro-benchmark of the rate limiter's per-request overhead:
+
+    python -m bench.rate_limit
+"""
+import asyncio
+import time
+from app.auth import create_access_token
+from app.config import get_settings
+from app.rate_limiter import RateLimiter, RateLimitMiddleware, create_backend
+
+settings = get_settings()
+
+
+async def benchmark(requests: int = 200000):
+    """Per-request cost of the middleware in front of a no-op app, for a bearer-token client."""
+    async def noop(scope, receive, send):
+        pass
+
+    limiter = RateLimiter(create_backend(settings), {"api": f"{requests * 10}/second", "ingest": settings.RATE_LIMIT_INGEST})
+    middleware = RateLimitMiddleware(noop, limiter)
+    token = create_access_token({"sub": "benchmark-user", "role": "student"})
+    scope = {
+        "type": "http", "method": "GET", "path": "/api/alerts", "client": ("127.0.0.1", 5000),
+        "headers": [(b"host", b"localhost"), (b"authorization", f"Bearer {token}".encode())],
+    }
+    for _ in range(1000):
+        await middleware(scope, None, None)
+    started = time.perf_counter()
+    for _ in range(requests):
+        await middleware(scope, None, None)
+    elapsed = time.perf_counter() - started
+    print(f"{limiter.backend.name} backend: {elapsed / requests * 1e6:.1f} µs per request over {requests} requests")
+
+
+if __name__ == "__main__":
+    asyncio.run(benchmark())
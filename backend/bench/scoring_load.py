@@ -0,0 +1,113 @@
+"""Load test: `/api/health` latency (served on the same event loop) while
+concurrent ingest keeps the scorer saturated, per executor mode:
+
+    python -m bench.scoring_load --modes inline,thread,process --seconds 5
+"""
+import argparse
+import asyncio
+import multiprocessing
+import random
+import time
+from typing import List, NamedTuple
+from app.config import get_settings
+from app.scoring_executor import ScoringExecutor
+
+settings = get_settings()
+
+
+def _percentile(samples: List[float], q: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))] if ordered else 0.0
+
+
+async def _health_latencies(app, seconds: float) -> List[float]:
+    """Sequential GET /api/health through the ASGI app on this loop, in ms."""
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET", "scheme": "http",
+        "path": "/api/health", "raw_path": b"/api/health", "query_string": b"", "root_path": "",
+        "headers": [(b"host", b"bench")], "client": ("127.0.0.1", 1), "server": ("bench", 80),
+    }
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        pass
+
+    latencies, deadline = [], time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        await app(dict(scope), receive, send)
+        latencies.append((time.perf_counter() - started) * 1000)
+        await asyncio.sleep(0.005)
+    return latencies
+
+
+async def load_test(modes: List[str], seconds: float, ingesters: int, workers: int):
+    """p50/p99 of a health endpoint on the event loop, idle and with `ingesters` coroutines scoring nonstop."""
+    from fastapi import FastAPI
+    from app.ai_engine import HAS_SKLEARN, extract_features, fit_isolation_forest
+
+    rnd = random.Random(1)
+
+    def log() -> dict:
+        return {
+            "permission_requested": rnd.choice(("none", "camera", "sms")),
+            "network_activity_level": rnd.uniform(0, 100),
+            "background_process_flag": rnd.random() < 0.3,
+            "anomaly_flag": rnd.random() < 0.2,
+        }
+
+    windows = [[log() for _ in range(50)] for _ in range(64)]
+    model = fit_isolation_forest(extract_features([l for w in windows for l in w])) if HAS_SKLEARN else None
+    baseline = {"avg_permission_usage": 0.2, "avg_network_activity": 30.0}
+    print(f"{ingesters} ingest coroutines, windows of 50, {'Isolation Forest' if model else 'rule'} scoring, "
+          f"{workers} workers, {multiprocessing.cpu_count()} CPUs")
+
+    for mode in modes:
+        executor = ScoringExecutor(mode, workers, settings.SCORING_BATCH_SIZE, settings.SCORING_BATCH_WAIT_MS)
+        app = FastAPI()
+        app.get("/api/health")(lambda: {"status": "healthy", "scoring": executor.stats()})
+        await executor.start()
+        # Process workers load models from MODEL_DIR, which the benchmark leaves alone: they score with the rules
+        entry = _BenchEntry(model) if model is not None and mode != "process" else None
+        idle = await _health_latencies(app, seconds / 2)
+
+        scored = 0
+        stop = asyncio.Event()
+
+        async def ingest(i: int):
+            nonlocal scored
+            while not stop.is_set():
+                await executor.score(windows[i % len(windows)], baseline, model_entry=entry)
+                scored += 1
+                await asyncio.sleep(0)  # one request's worth of other work between scores
+
+        tasks = [asyncio.create_task(ingest(i)) for i in range(ingesters)]
+        started = time.perf_counter()
+        loaded = await _health_latencies(app, seconds)
+        elapsed = time.perf_counter() - started
+        stop.set()
+        await asyncio.gather(*tasks)
+        await executor.stop()
+        print(
+            f"  {mode:8s} health p50/p99 idle {_percentile(idle, 0.5):6.2f}/{_percentile(idle, 0.99):6.2f} ms, "
+            f"saturated {_percentile(loaded, 0.5):6.2f}/{_percentile(loaded, 0.99):6.2f} ms, "
+            f"{scored / elapsed:7.0f} scores/s{' (rules)' if model is not None and entry is None else ''}"
+        )
+
+
+class _BenchEntry(NamedTuple):
+    model: object
+    key: str = "bench"
+    version: int = 1
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure /api/health latency while scoring is saturated")
+    parser.add_argument("--modes", default="inline,thread,process")
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--ingesters", type=int, default=64, help="concurrent coroutines scoring nonstop")
+    parser.add_argument("--workers", type=int, default=settings.SCORING_WORKERS)
+    args = parser.parse_args()
+    asyncio.run(load_test(args.modes.split(","), args.seconds, args.ingesters, args.workers))
@@ -0,0 +1,74 @@
+"""Load test: broadcast latency to N idle sockets (in-process stand-ins for
+WebSocket, so it measures the manager, not the network) with one client that
+never reads, under each slow-consumer policy:
+
+    python -m bench.websocket_fanout --sockets 10000 --broadcasts 20
+"""
+import argparse
+import asyncio
+import logging
+import time
+from typing import Optional
+from app.websocket_manager import SLOW_CONSUMER_POLICIES, ConnectionManager
+
+
+class _IdleSocket:
+    """Stand-in WebSocket that counts messages; `stuck` ones never finish a send."""
+
+    def __init__(self, stuck: bool = False):
+        self.stuck = stuck
+        self.received = 0
+        self.target = 0
+        self.done: Optional[asyncio.Future] = None
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, text: str):
+        if self.stuck:
+            await asyncio.sleep(3600)
+        self.received += 1
+        if self.done is not None and self.received >= self.target and not self.done.done():
+            self.done.set_result(None)
+
+    async def close(self, code: int = 1000):
+        pass
+
+
+async def load_test(sockets: int, broadcasts: int, policy: str, queue_size: int):
+    manager = ConnectionManager()
+    manager.policy, manager.max_queue = policy, queue_size
+    clients = [_IdleSocket(stuck=(i == 0)) for i in range(sockets)]
+    for i, client in enumerate(clients):
+        await manager.connect(client, f"user-{i}")
+    loop = asyncio.get_running_loop()
+    latencies = []
+    for n in range(1, broadcasts + 1):
+        for client in clients[1:]:
+            client.target, client.done = n, loop.create_future()
+        started = time.perf_counter()
+        await manager.broadcast({"type": "alert", "sequence": n})
+        await asyncio.gather(*(client.done for client in clients[1:]))
+        latencies.append((time.perf_counter() - started) * 1000)
+    latencies.sort()
+    stats = manager.stats()
+    print(
+        f"  {policy:11s} broadcast to {sockets} sockets, all delivered: "
+        f"p50 {latencies[len(latencies) // 2]:7.1f} ms, max {latencies[-1]:7.1f} ms; "
+        f"stuck client: {stats['dropped_messages']} dropped, {stats['closed_connections']} closed"
+    )
+    for conns in list(manager.active_connections.values()):
+        for conn in conns:
+            conn.detach()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure broadcast latency to many idle WebSockets")
+    parser.add_argument("--sockets", type=int, default=10000)
+    parser.add_argument("--broadcasts", type=int, default=20)
+    parser.add_argument("--policies", default=",".join(SLOW_CONSUMER_POLICIES))
+    parser.add_argument("--queue-size", type=int, default=5, help="small, so the stuck client overflows quickly")
+    args = parser.parse_args()
+    logging.disable(logging.INFO)  # one connect log line per socket otherwise
+    for policy in args.policies.split(","):
+        asyncio.run(load_test(args.sockets, args.broadcasts, policy, args.queue_size))
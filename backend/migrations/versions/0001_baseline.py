@@ -0,0 +1,129 @@
+"""Baseline: the schema as originally created by Base.metadata.create_all
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "users",
+        sa.Column("id", sa.String(36), primary_key=True),
+        sa.Column("name", sa.String(100), nullable=False),
+        sa.Column("email", sa.String(255), nullable=False),
+        sa.Column("college", sa.String(255), nullable=False),
+        sa.Column("role", sa.String(20), nullable=False),
+        sa.Column("hashed_password", sa.String(255), nullable=False),
+        sa.Column("consent_given", sa.Boolean()),
+        sa.Column("created_at", sa.DateTime()),
+    )
+    op.create_index("ix_users_email", "users", ["email"], unique=True)
+
+    op.create_table(
+        "devices",
+        sa.Column("id", sa.String(36), primary_key=True),
+        sa.Column("user_id", sa.String(36), sa.ForeignKey("users.id", ondelete="CASCADE"), nullable=False),
+        sa.Column("device_name", sa.String(255), nullable=False),
+        sa.Column("device_type", sa.String(100), nullable=False),
+        sa.Column("last_active", sa.DateTime()),
+        sa.Column("risk_score", sa.Float()),
+    )
+    op.create_index("ix_devices_user_id", "devices", ["user_id"])
+
+    op.create_table(
+        "behavior_profiles",
+        sa.Column("user_id", sa.String(36), sa.ForeignKey("users.id", ondelete="CASCADE"), primary_key=True),
+        sa.Column("baseline_metrics", sa.JSON()),
+        sa.Column("last_updated", sa.DateTime()),
+    )
+
+    op.create_table(
+        "risk_scores",
+        sa.Column("id", sa.Integer(), primary_key=True, autoincrement=True),
+        sa.Column("user_id", sa.String(36), sa.ForeignKey("users.id", ondelete="CASCADE"), nullable=False),
+        sa.Column("current_score", sa.Float()),
+        sa.Column("risk_level", sa.String(20)),
+        sa.Column("last_updated", sa.DateTime()),
+    )
+    op.create_index("ix_risk_scores_user_id", "risk_scores", ["user_id"])
+
+    op.create_table(
+        "alerts",
+        sa.Column("id", sa.Integer(), primary_key=True, autoincrement=True),
+        sa.Column("user_id", sa.String(36), sa.ForeignKey("users.id", ondelete="CASCADE"), nullable=False),
+        sa.Column("alert_type", sa.String(100), nullable=False),
+        sa.Column("severity", sa.String(20), nullable=False),
+        sa.Column("message", sa.Text(), nullable=False),
+        sa.Column("explanation_text", sa.Text()),
+        sa.Column("recommendation", sa.Text()),
+        sa.Column("confidence_score", sa.Float()),
+        sa.Column("created_at", sa.DateTime()),
+        sa.Column("resolved", sa.Boolean()),
+    )
+    op.create_index("ix_alerts_user_id", "alerts", ["user_id"])
+
+    op.create_table(
+        "incidents",
+        sa.Column("id", sa.Integer(), primary_key=True, autoincrement=True),
+        sa.Column("alert_id", sa.Integer(), sa.ForeignKey("alerts.id", ondelete="CASCADE"), nullable=False),
+        sa.Column("user_id", sa.String(36), sa.ForeignKey("users.id", ondelete="CASCADE"), nullable=False),
+        sa.Column("report_type", sa.String(100), nullable=False),
+        sa.Column("description", sa.Text()),
+        sa.Column("status", sa.String(50)),
+        sa.Column("created_at", sa.DateTime()),
+    )
+    op.create_index("ix_incidents_alert_id", "incidents", ["alert_id"])
+    op.create_index("ix_incidents_user_id", "incidents", ["user_id"])
+
+    op.create_table(
+        "data_access_logs",
+        sa.Column("id", sa.Integer(), primary_key=True, autoincrement=True),
+        sa.Column("user_id", sa.String(36), sa.ForeignKey("users.id", ondelete="CASCADE"), nullable=False),
+        sa.Column("data_type", sa.String(100), nullable=False),
+        sa.Column("purpose", sa.String(255), nullable=False),
+        sa.Column("timestamp", sa.DateTime()),
+    )
+    op.create_index("ix_data_access_logs_user_id", "data_access_logs", ["user_id"])
+
+    op.create_table(
+        "integration_configs",
+        sa.Column("id", sa.Integer(), primary_key=True, autoincrement=True),
+        sa.Column("integration_type", sa.String(100), nullable=False),
+        sa.Column("endpoint", sa.String(255), nullable=False),
+        sa.Column("status", sa.String(50)),
+    )
+
+    op.create_table(
+        "behavior_logs",
+        sa.Column("id", sa.Integer(), primary_key=True, autoincrement=True),
+        sa.Column("user_id", sa.String(36), sa.ForeignKey("users.id", ondelete="CASCADE"), nullable=False),
+        sa.Column("device_id", sa.String(36), sa.ForeignKey("devices.id", ondelete="CASCADE")),
+        sa.Column("timestamp", sa.DateTime()),
+        sa.Column("app_name", sa.String(255)),
+        sa.Column("permission_requested", sa.String(255)),
+        sa.Column("network_activity_level", sa.Float()),
+        sa.Column("background_process_flag", sa.Boolean()),
+        sa.Column("anomaly_flag", sa.Boolean()),
+        sa.Column("anomaly_type", sa.String(100)),
+        sa.Column("severity", sa.String(20)),
+        sa.Column("anomaly_score", sa.Float()),
+        sa.Column("log_data", sa.JSON()),
+    )
+    op.create_index("ix_behavior_logs_user_id", "behavior_logs", ["user_id"])
+    op.create_index("ix_behavior_logs_device_id", "behavior_logs", ["device_id"])
+
+
+def downgrade():
+    for table in (
+        "behavior_logs", "integration_configs", "data_access_logs", "incidents",
+        "alerts", "risk_scores", "behavior_profiles", "devices", "users",
+    ):
+        op.drop_table(table)
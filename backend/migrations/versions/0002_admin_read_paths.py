@@ -0,0 +1,60 @@
+"""Admin read paths: user list keyset/search indexes, time indexes, daily rollups
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17
+
+Uses IF NOT EXISTS throughout: databases created by create_all before
+migrations existed already have some of these objects.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+
+def _has_pg_trgm(bind) -> bool:
+    # Managed Postgres without contrib: skip the trigram indexes, search falls back to a scan
+    return bind.exec_driver_sql("SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'").first() is not None
+
+
+def upgrade():
+    bind = op.get_bind()
+    op.create_index("ix_users_created_at_id", "users", ["created_at", "id"], if_not_exists=True)
+    if bind.dialect.name == "postgresql" and _has_pg_trgm(bind):
+        op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        for column in ("name", "email"):
+            op.create_index(
+                f"ix_users_{column}_trgm", "users", [column], if_not_exists=True,
+                postgresql_using="gin", postgresql_ops={column: "gin_trgm_ops"},
+            )
+    elif bind.dialect.name == "sqlite":
+        for column in ("name", "email"):
+            op.create_index(f"ix_users_{column}_nocase", "users", [sa.text(f"{column} COLLATE NOCASE")], if_not_exists=True)
+
+    op.create_index("ix_alerts_created_at", "alerts", ["created_at"], if_not_exists=True)
+    op.create_index("ix_behavior_logs_timestamp", "behavior_logs", ["timestamp"], if_not_exists=True)
+
+    op.create_table(
+        "daily_rollups",
+        sa.Column("day", sa.Date(), primary_key=True),
+        sa.Column("college", sa.String(255), primary_key=True),
+        sa.Column("log_count", sa.Integer(), nullable=False),
+        sa.Column("anomaly_count", sa.Integer(), nullable=False),
+        sa.Column("alert_count", sa.Integer(), nullable=False),
+        sa.Column("risk_sum", sa.Float(), nullable=False),
+        sa.Column("risk_samples", sa.Integer(), nullable=False),
+        if_not_exists=True,
+    )
+
+
+def downgrade():
+    op.drop_table("daily_rollups")
+    op.drop_index("ix_behavior_logs_timestamp", "behavior_logs")
+    op.drop_index("ix_alerts_created_at", "alerts")
+    for suffix in ("name_trgm", "email_trgm", "name_nocase", "email_nocase"):
+        op.drop_index(f"ix_users_{suffix}", "users", if_exists=True)
+    op.drop_index("ix_users_created_at_id", "users")
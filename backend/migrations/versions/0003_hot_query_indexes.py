@@ -0,0 +1,36 @@
+"""Composite and partial indexes for per-user log and alert reads
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-17
+
+The composites lead with user_id, so they replace the single-column
+user_id indexes (one less index to maintain on every log insert).
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index("ix_behavior_logs_user_id_timestamp", "behavior_logs", ["user_id", "timestamp"], if_not_exists=True)
+    anomalies = sa.column("anomaly_flag", sa.Boolean()) == True
+    op.create_index(
+        "ix_behavior_logs_anomalies", "behavior_logs", ["user_id", "timestamp"], if_not_exists=True,
+        postgresql_where=anomalies, sqlite_where=anomalies,
+    )
+    op.create_index("ix_alerts_user_id_created_at", "alerts", ["user_id", "created_at"], if_not_exists=True)
+    op.drop_index("ix_behavior_logs_user_id", "behavior_logs", if_exists=True)
+    op.drop_index("ix_alerts_user_id", "alerts", if_exists=True)
+
+
+def downgrade():
+    op.create_index("ix_alerts_user_id", "alerts", ["user_id"])
+    op.create_index("ix_behavior_logs_user_id", "behavior_logs", ["user_id"])
+    op.drop_index("ix_alerts_user_id_created_at", "alerts")
+    op.drop_index("ix_behavior_logs_anomalies", "behavior_logs")
+    op.drop_index("ix_behavior_logs_user_id_timestamp", "behavior_logs")
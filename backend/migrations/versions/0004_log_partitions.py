@@ -0,0 +1,143 @@
+"""Hourly behavior log summaries; monthly range partitions for behavior_logs on Postgres
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-17
+
+On Postgres the existing table is copied into a new table partitioned by
+month on timestamp. The primary key becomes (id, timestamp), because a
+partitioned table's keys must include the partition column. A DEFAULT
+partition catches rows that have no monthly partition yet.
+app/retention.py creates later months and drops expired ones.
+SQLite keeps a single table; retention deletes expired months from it.
+"""
+from datetime import date, datetime
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+LOG_COLUMNS = (
+    "id, user_id, device_id, timestamp, app_name, permission_requested, network_activity_level, "
+    "background_process_flag, anomaly_flag, anomaly_type, severity, anomaly_score, log_data"
+)
+
+
+def _log_columns(id_column):
+    return [
+        id_column,
+        sa.Column("user_id", sa.String(36), sa.ForeignKey("users.id", ondelete="CASCADE"), nullable=False),
+        sa.Column("device_id", sa.String(36), sa.ForeignKey("devices.id", ondelete="CASCADE")),
+        sa.Column("timestamp", sa.DateTime(), nullable=False),
+        sa.Column("app_name", sa.String(255)),
+        sa.Column("permission_requested", sa.String(255)),
+        sa.Column("network_activity_level", sa.Float()),
+        sa.Column("background_process_flag", sa.Boolean()),
+        sa.Column("anomaly_flag", sa.Boolean()),
+        sa.Column("anomaly_type", sa.String(100)),
+        sa.Column("severity", sa.String(20)),
+        sa.Column("anomaly_score", sa.Float()),
+        sa.Column("log_data", sa.JSON()),
+    ]
+
+
+def _create_log_indexes():
+    anomalies = sa.column("anomaly_flag", sa.Boolean()) == True
+    op.create_index("ix_behavior_logs_user_id_timestamp", "behavior_logs", ["user_id", "timestamp"])
+    op.create_index(
+        "ix_behavior_logs_anomalies", "behavior_logs", ["user_id", "timestamp"], postgresql_where=anomalies,
+    )
+    op.create_index("ix_behavior_logs_timestamp", "behavior_logs", ["timestamp"])
+    op.create_index("ix_behavior_logs_device_id", "behavior_logs", ["device_id"])
+
+
+def _drop_log_indexes():
+    for name in ("ix_behavior_logs_user_id_timestamp", "ix_behavior_logs_anomalies",
+                 "ix_behavior_logs_timestamp", "ix_behavior_logs_device_id"):
+        op.drop_index(name, "behavior_logs")
+
+
+def _add_months(day: date, months: int) -> date:
+    month = day.month - 1 + months
+    return date(day.year + month // 12, month % 12 + 1, 1)
+
+
+def _partition_logs():
+    bind = op.get_bind()
+    op.execute("UPDATE behavior_logs SET timestamp = now() AT TIME ZONE 'utc' WHERE timestamp IS NULL")
+    oldest = bind.exec_driver_sql("SELECT min(timestamp) FROM behavior_logs").scalar()
+
+    # Index and primary key names are schema-wide in Postgres, so free them up
+    _drop_log_indexes()
+    op.rename_table("behavior_logs", "behavior_logs_unpartitioned")
+    op.execute("ALTER TABLE behavior_logs_unpartitioned RENAME CONSTRAINT behavior_logs_pkey TO behavior_logs_unpartitioned_pkey")
+
+    op.create_table(
+        "behavior_logs",
+        *_log_columns(sa.Column(
+            "id", sa.Integer(), autoincrement=False, nullable=False,
+            server_default=sa.text("nextval('behavior_logs_id_seq')"),
+        )),
+        sa.PrimaryKeyConstraint("id", "timestamp", name="behavior_logs_pkey"),
+        postgresql_partition_by="RANGE (timestamp)",
+    )
+    op.execute("ALTER SEQUENCE behavior_logs_id_seq OWNED BY behavior_logs.id")
+
+    this_month = datetime.utcnow().date().replace(day=1)
+    month = (oldest.date() if oldest else this_month).replace(day=1)
+    while month <= _add_months(this_month, 2):
+        upper = _add_months(month, 1)
+        op.execute(
+            f"CREATE TABLE behavior_logs_p{month:%Y%m} PARTITION OF behavior_logs "
+            f"FOR VALUES FROM ('{month.isoformat()}') TO ('{upper.isoformat()}')"
+        )
+        month = upper
+    op.execute("CREATE TABLE behavior_logs_default PARTITION OF behavior_logs DEFAULT")
+    _create_log_indexes()
+
+    op.execute(f"INSERT INTO behavior_logs ({LOG_COLUMNS}) SELECT {LOG_COLUMNS} FROM behavior_logs_unpartitioned")
+    op.drop_table("behavior_logs_unpartitioned")
+
+
+def _unpartition_logs():
+    _drop_log_indexes()
+    op.rename_table("behavior_logs", "behavior_logs_partitioned")
+    op.execute("ALTER TABLE behavior_logs_partitioned RENAME CONSTRAINT behavior_logs_pkey TO behavior_logs_partitioned_pkey")
+    op.create_table(
+        "behavior_logs",
+        *_log_columns(sa.Column(
+            "id", sa.Integer(), primary_key=True, autoincrement=False,
+            server_default=sa.text("nextval('behavior_logs_id_seq')"),
+        )),
+    )
+    op.execute("ALTER SEQUENCE behavior_logs_id_seq OWNED BY behavior_logs.id")
+    _create_log_indexes()
+    op.execute(f"INSERT INTO behavior_logs ({LOG_COLUMNS}) SELECT {LOG_COLUMNS} FROM behavior_logs_partitioned")
+    op.drop_table("behavior_logs_partitioned")  # drops its partitions too
+
+
+def upgrade():
+    op.create_table(
+        "behavior_log_hourly",
+        sa.Column("user_id", sa.String(36), sa.ForeignKey("users.id", ondelete="CASCADE"), primary_key=True),
+        sa.Column("hour", sa.DateTime(), primary_key=True),
+        sa.Column("app_name", sa.String(255), primary_key=True),
+        sa.Column("permission_requested", sa.String(255), primary_key=True),
+        sa.Column("log_count", sa.Integer(), nullable=False),
+        sa.Column("anomaly_count", sa.Integer(), nullable=False),
+        sa.Column("high_severity_count", sa.Integer(), nullable=False),
+        sa.Column("network_sum", sa.Float(), nullable=False),
+        sa.Column("anomaly_score_sum", sa.Float(), nullable=False),
+    )
+    op.create_index("ix_behavior_log_hourly_hour", "behavior_log_hourly", ["hour"])
+    if op.get_bind().dialect.name == "postgresql":
+        _partition_logs()
+
+
+def downgrade():
+    if op.get_bind().dialect.name == "postgresql":
+        _unpartition_logs()
+    op.drop_table("behavior_log_hourly")
@@ -0,0 +1,66 @@
+"""Per-user log aggregates behind the wellbeing and permission-audit endpoints
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-17
+
+Backfilled from the hourly summaries plus the raw logs they do not cover
+yet, the same sources `python -m app.aggregates rebuild` reads.
+"""
+from datetime import timedelta
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    aggregates = op.create_table(
+        "user_log_aggregates",
+        sa.Column("user_id", sa.String(36), sa.ForeignKey("users.id", ondelete="CASCADE"), primary_key=True),
+        sa.Column("app_name", sa.String(255), primary_key=True),
+        sa.Column("permission_requested", sa.String(255), primary_key=True),
+        sa.Column("log_count", sa.Integer(), nullable=False),
+        sa.Column("anomaly_count", sa.Integer(), nullable=False),
+        sa.Column("network_sum", sa.Float(), nullable=False),
+    )
+
+    hourly = sa.table(
+        "behavior_log_hourly",
+        sa.column("user_id"), sa.column("hour", sa.DateTime()), sa.column("app_name"), sa.column("permission_requested"),
+        sa.column("log_count"), sa.column("anomaly_count"), sa.column("network_sum"),
+    )
+    logs = sa.table(
+        "behavior_logs",
+        sa.column("user_id"), sa.column("timestamp", sa.DateTime()), sa.column("app_name"),
+        sa.column("permission_requested"), sa.column("anomaly_flag", sa.Boolean()), sa.column("network_activity_level"),
+    )
+    last_hour = op.get_bind().execute(sa.select(sa.func.max(hourly.c.hour))).scalar()
+    tail = sa.select(
+        logs.c.user_id,
+        sa.func.coalesce(logs.c.app_name, "").label("app_name"),
+        sa.func.coalesce(logs.c.permission_requested, "").label("permission_requested"),
+        sa.literal(1).label("log_count"),
+        sa.case((logs.c.anomaly_flag == True, 1), else_=0).label("anomaly_count"),
+        sa.func.coalesce(logs.c.network_activity_level, 0.0).label("network_sum"),
+    )
+    if last_hour is not None:
+        tail = tail.where(logs.c.timestamp >= last_hour + timedelta(hours=1))
+    sources = sa.union_all(
+        sa.select(hourly.c.user_id, hourly.c.app_name, hourly.c.permission_requested,
+                  hourly.c.log_count, hourly.c.anomaly_count, hourly.c.network_sum),
+        tail,
+    ).subquery()
+    keys = [sources.c.user_id, sources.c.app_name, sources.c.permission_requested]
+    op.execute(aggregates.insert().from_select(
+        ["user_id", "app_name", "permission_requested", "log_count", "anomaly_count", "network_sum"],
+        sa.select(*keys, sa.func.sum(sources.c.log_count), sa.func.sum(sources.c.anomaly_count),
+                  sa.func.sum(sources.c.network_sum)).group_by(*keys),
+    ))
+
+
+def downgrade():
+    op.drop_table("user_log_aggregates")
@@ -0,0 +1,34 @@
+"""Alert deduplication: key columns, occurrence counter and last-seen time
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-17
+
+Existing alerts have no device or app recorded, so they never absorb new
+repeats; they keep one occurrence, last seen when they were created. The
+dedup lookup is served by ix_alerts_user_id_created_at, so no index is added.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0006"
+down_revision = "0005"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column("alerts", sa.Column("device_id", sa.String(36), nullable=True))
+    op.add_column("alerts", sa.Column("app_name", sa.String(255), nullable=True))
+    op.add_column("alerts", sa.Column("occurrences", sa.Integer(), nullable=False, server_default="1"))
+    op.add_column("alerts", sa.Column("last_seen_at", sa.DateTime(), nullable=True))
+    alerts = sa.table("alerts", sa.column("created_at", sa.DateTime()), sa.column("last_seen_at", sa.DateTime()))
+    op.execute(alerts.update().values(last_seen_at=alerts.c.created_at))
+
+
+def downgrade():
+    with op.batch_alter_table("alerts") as batch:
+        batch.drop_column("last_seen_at")
+        batch.drop_column("occurrences")
+        batch.drop_column("app_name")
+        batch.drop_column("device_id")
@@ -0,0 +1,29 @@
+"""Shared retrain counters for the model registry
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-17
+
+Starts empty: counts kept in worker memory before this revision are not
+carried over, so each cohort refits after its next MODEL_RETRAIN_AFTER_LOGS
+logs (or the next interval retrain).
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0007"
+down_revision = "0006"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "model_retrain_counts",
+        sa.Column("key", sa.String(300), primary_key=True),
+        sa.Column("pending", sa.Integer(), nullable=False),
+    )
+
+
+def downgrade():
+    op.drop_table("model_retrain_counts")
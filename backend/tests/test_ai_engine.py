@@ -0,0 +1,140 @@
+"""The incremental LogAggregate scorer against a full rescan of each window.
+
+Run from backend/: python -m pytest tests
+"""
+import random
+from collections import deque
+from typing import Dict, Optional
+
+import pytest
+
+from app.ai_engine import (
+    LogAggregate, calculate_risk, calculate_risk_batch, calculate_risk_score_rules, extract_features,
+    fit_isolation_forest, generate_explanation,
+)
+
+
+def rescan_rules(logs: list[dict], baseline: Optional[Dict[str, float]]) -> float:
+    """The rule scorer as it was before LogAggregate: a rescan with a float running sum."""
+    if not logs:
+        return 0.0
+    n = len(logs)
+    perm_count = sum(1 for l in logs if l.get("permission_requested", "none") != "none")
+    net_avg = sum(float(l.get("network_activity_level", 0.0)) for l in logs) / n
+    bg_count = sum(1 for l in logs if l.get("background_process_flag", False))
+    anomaly_count = sum(1 for l in logs if l.get("anomaly_flag", False))
+    risk = (
+        min(100, (perm_count / n) * 100) * 0.3 +
+        min(100, net_avg) * 0.3 +
+        min(100, (bg_count / n) * 100) * 0.2 +
+        min(100, (anomaly_count / n) * 100) * 0.2
+    )
+    if baseline:
+        perm_diff = max(0, perm_count / n - baseline.get("avg_permission_usage", 0.0))
+        net_diff = max(0, net_avg - baseline.get("avg_network_activity", 0.0))
+        risk = min(100, risk + ((perm_diff * 10) + (net_diff / 5)))
+    return round(max(0, min(100, risk)), 1)
+
+
+def rescan_explanation(logs: list[dict], risk_score: float) -> str:
+    """generate_explanation as it was before LogAggregate."""
+    if not logs:
+        return "No recent activity logs available to explain."
+    explanations = []
+    n = len(logs)
+    perm_count = sum(1 for l in logs if l.get("permission_requested", "none") != "none")
+    net_avg = sum(float(l.get("network_activity_level", 0.0)) for l in logs) / n
+    bg_count = sum(1 for l in logs if l.get("background_process_flag", False))
+    anomaly_count = sum(1 for l in logs if l.get("anomaly_flag", False))
+    if anomaly_count > 0:
+        explanations.append(f"Detected {anomaly_count} known suspicious activities or domains.")
+    if perm_count > (n * 0.5):
+        explanations.append("Unusually high rate of sensitive permission requests.")
+    if net_avg > 60:
+        explanations.append(f"Heavy network utilization detected (avg {net_avg:.1f}%).")
+    if bg_count > (n * 0.4):
+        explanations.append("Excessive background processes running stealthily.")
+    if not explanations:
+        if risk_score > 70:
+            return "Risk increased due to aggregate subtle deviations from baseline behavior."
+        return "Activity appears normal."
+    return " ".join(explanations)
+
+
+def random_log(rnd: random.Random) -> dict:
+    return {
+        "permission_requested": rnd.choice(("none", "camera", "sms")),
+        # Unrounded levels make float sums depend on order; 60.0 sits on the explanation threshold
+        "network_activity_level": rnd.choice((round(rnd.uniform(0, 100), 1), rnd.uniform(0, 100), 60.0)),
+        "background_process_flag": rnd.random() < 0.3,
+        "anomaly_flag": rnd.random() < 0.2,
+    }
+
+
+@pytest.mark.parametrize("window_size", [5, 50])
+def test_sliding_aggregate_matches_rescan(window_size):
+    rnd = random.Random(window_size)
+    logs: deque = deque(maxlen=window_size)
+    agg = LogAggregate()
+    for _ in range(20000):
+        for _ in range(rnd.choice((1, 1, 1, 3))):
+            if len(logs) == logs.maxlen:
+                agg.remove(logs[0])
+            log = random_log(rnd)
+            logs.append(log)
+            agg.add(log)
+        window = list(logs)
+        baseline = rnd.choice((None, {"avg_permission_usage": 0.2, "avg_network_activity": 30.0}))
+
+        score = calculate_risk_score_rules(agg, baseline)
+        assert score == rescan_rules(window, baseline)
+        assert generate_explanation(agg, score) == rescan_explanation(window, score)
+        # A copied aggregate (rolling window snapshots) scores the same
+        assert calculate_risk_score_rules(agg.copy(), baseline) == score
+
+
+def test_aggregate_and_log_list_give_the_same_result():
+    rnd = random.Random(3)
+    for size in range(0, 60):
+        logs = [random_log(rnd) for _ in range(size)]
+        assert calculate_risk(logs, aggregate=LogAggregate.from_logs(logs)) == calculate_risk(logs)
+
+
+def test_network_average_sums_floats_in_window_order():
+    # Summed left to right these floats come to 360.00000000000006, so the
+    # rescan reports heavy network use (avg > 60); an exact sum would not
+    levels = [43.6, 79.7, 75.0, 79.9, 59.6, 22.2]
+    logs = [{"network_activity_level": level} for level in levels]
+    agg = LogAggregate()
+    for log in [{"network_activity_level": 99.9}] + logs:
+        agg.add(log)
+    agg.remove({"network_activity_level": 99.9})
+    score = calculate_risk_score_rules(agg, None)
+    assert score == rescan_rules(logs, None)
+    assert generate_explanation(agg, score) == rescan_explanation(logs, score)
+    assert "Heavy network utilization" in generate_explanation(agg, score)
+
+
+def test_batch_results_do_not_depend_on_batch_size():
+    np = pytest.importorskip("numpy")
+    pytest.importorskip("sklearn")
+    rnd = random.Random(5)
+    models = [fit_isolation_forest(extract_features([random_log(rnd) for _ in range(300)])) for _ in range(2)]
+    windows = [[random_log(rnd) for _ in range(rnd.randint(0, 50))] for _ in range(200)]
+    baselines = [rnd.choice((None, {"avg_permission_usage": 0.2, "avg_network_activity": 30.0})) for _ in windows]
+    window_models = [rnd.choice(models + [None]) for _ in windows]
+    aggregates = [rnd.choice((None, LogAggregate.from_logs(logs))) for logs in windows]
+
+    batched = calculate_risk_batch(windows, baselines, aggregates, window_models)
+    for logs, baseline, agg, model, result in zip(windows, baselines, aggregates, window_models, batched):
+        assert calculate_risk(logs, baseline, aggregate=agg, model=model) == result
+        if model is not None and len(logs) >= 5:
+            # The Isolation Forest layer as it scored one window before batching
+            risk = max(0, min(100, (0.5 - float(np.mean(model.score_samples(np.array(extract_features(logs)))))) * 100))
+            if baseline:
+                perm_diff = max(0, sum(1 for l in logs if l["permission_requested"] != "none") / len(logs) - 0.2)
+                net_diff = max(0, sum(float(l["network_activity_level"]) for l in logs) / len(logs) - 30.0)
+                risk = min(100, risk + (perm_diff * 10) + (net_diff / 10))
+            assert result["score"] == round(risk, 1)
+        else:
+            assert result["score"] == rescan_rules(logs, baseline)
@@ -0,0 +1,28 @@
+"""Which address an anonymous request is rate-limited under.
+
+Run from backend/: python -m pytest tests
+"""
+from app.rate_limiter import client_identity
+
+
+def scope(client: str, forwarded: str = None) -> dict:
+    headers = [(b"x-forwarded-for", forwarded.encode())] if forwarded is not None else []
+    return {"type": "http", "client": (client, 50000), "headers": headers}
+
+
+def test_forwarded_header_ignored_from_untrusted_peer():
+    # A client reaching a worker directly cannot pick a fresh bucket per request
+    assert client_identity(scope("203.0.113.7", "198.51.100.1")) == "ip:203.0.113.7"
+    assert client_identity(scope("203.0.113.7", "198.51.100.2")) == "ip:203.0.113.7"
+
+
+def test_forwarded_header_honoured_from_trusted_proxy():
+    assert client_identity(scope("127.0.0.1", "198.51.100.1")) == "ip:198.51.100.1"
+    assert client_identity(scope("127.0.0.1")) == "ip:127.0.0.1"
+
+
+def test_spoofed_hops_left_of_the_proxy_are_skipped():
+    # nginx appends the address it saw; anything before that came from the client
+    assert client_identity(scope("127.0.0.1", "10.9.9.9, 198.51.100.1")) == "ip:198.51.100.1"
+    assert client_identity(scope("127.0.0.1", "198.51.100.1, 127.0.0.1")) == "ip:198.51.100.1"
+    assert client_identity(scope("127.0.0.1", "::1, 127.0.0.1")) == "ip:::1"
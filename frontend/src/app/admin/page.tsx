@@ -37,6 +37,8 @@ export default function AdminDashboard() {
     const [trends, setTrends] = useState<any[]>([]);
     const [colleges, setColleges] = useState<any[]>([]);
     const [allUsers, setAllUsers] = useState<any[]>([]);
+    const [usersCursor, setUsersCursor] = useState<string | undefined>();
+    const [loadingMoreUsers, setLoadingMoreUsers] = useState(false);
     const [searchQuery, setSearchQuery] = useState("");
     const [roleFilter, setRoleFilter] = useState("all");
 
@@ -57,7 +59,7 @@ export default function AdminDashboard() {
                 adminAPI.activityFeed().catch(() => ({ data: [] })),
                 adminAPI.trends().catch(() => ({ data: [] })),
                 adminAPI.collegeBreakdown().catch(() => ({ data: [] })),
-                adminAPI.allUsers().catch(() => ({ data: [] })),
+                adminAPI.allUsers().catch(() => ({ data: [], headers: {} as Record<string, string> })),
             ]);
             setStats(statsRes.data);
             setHighRisk(hrRes.data);
@@ -65,6 +67,7 @@ export default function AdminDashboard() {
             setTrends(trendsRes.data);
             setColleges(collegeRes.data);
             setAllUsers(usersRes.data);
+            setUsersCursor(usersRes.headers["x-next-cursor"]);
         } catch (err) {
             console.error("Failed to load admin data", err);
         } finally {
@@ -95,11 +98,26 @@ export default function AdminDashboard() {
         try {
             const res = await adminAPI.allUsers(searchQuery, roleFilter);
             setAllUsers(res.data);
+            setUsersCursor(res.headers["x-next-cursor"]);
         } catch (err) {
             console.error(err);
         }
     };
 
+    const handleLoadMoreUsers = async () => {
+        if (!usersCursor || loadingMoreUsers) return;
+        setLoadingMoreUsers(true);
+        try {
+            const res = await adminAPI.allUsers(searchQuery, roleFilter, usersCursor);
+            setAllUsers((prev) => [...prev, ...res.data]);
+            setUsersCursor(res.headers["x-next-cursor"]);
+        } catch (err) {
+            console.error(err);
+        } finally {
+            setLoadingMoreUsers(false);
+        }
+    };
+
     useEffect(() => {
         if (!loading) {
             const timer = setTimeout(handleSearchUsers, 300);
@@ -463,6 +481,17 @@ export default function AdminDashboard() {
                     {allUsers.length === 0 && (
                         <p className="text-sm text-sentinel-text-muted text-center py-6">No users found.</p>
                     )}
+                    {usersCursor && (
+                        <div className="flex justify-center pt-4">
+                            <button
+                                onClick={handleLoadMoreUsers}
+                                disabled={loadingMoreUsers}
+                                className="px-4 py-2 rounded-lg bg-sentinel-card border border-sentinel-border text-sm text-sentinel-text hover:border-sentinel-accent transition-colors disabled:opacity-50"
+                            >
+                                {loadingMoreUsers ? "Loading..." : "Load more"}
+                            </button>
+                        </div>
+                    )}
                 </motion.div>
             </main>
         </div>
@@ -70,7 +70,9 @@ export const adminAPI = {
     activityFeed: () => api.get("/admin/activity-feed"),
     trends: (days: number = 14) => api.get(`/admin/trends?days=${days}`),
     collegeBreakdown: () => api.get("/admin/college-breakdown"),
-    allUsers: (search: string = "", role: string = "all") => api.get(`/admin/all-users?search=${search}&role_filter=${role}`),
+    // One page per call; pass the previous response's X-Next-Cursor header to get the next page
+    allUsers: (search: string = "", role: string = "all", cursor?: string) =>
+        api.get("/admin/all-users", { params: { search, role_filter: role, limit: 100, cursor } }),
 };
 
 // ──── Devices ────